@@ -0,0 +1,50 @@
+"""Alembic environment: the app's own engine and models.
+
+The app passes its connection in ``config.attributes["connection"]`` when it
+upgrades on start. From the command line, the writer engine from
+``app.database`` is used, so the SQLite pragmas and DATABASE_URL apply too.
+"""
+from alembic import context
+
+from app import models  # noqa: F401  (register tables)
+from app.database import Base, engine
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline():
+    context.configure(
+        url=str(engine.url),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=engine.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connection = context.config.attributes.get("connection")
+    if connection is not None:
+        _run(connection)
+        return
+    with engine.connect() as connection:
+        _run(connection)
+
+
+def _run(connection):
+    # SQLite cannot ALTER most things in place; batch mode copies the table instead
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,239 @@
+"""baseline: the schema as of the switch from create_all to Alembic
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 05:15:39.419497
+
+Databases created by create_all before this revision are adopted by
+app/migrations.py and stamped at it instead of running it.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app import rules
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    alert_rules = op.create_table('alert_rules',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('metric', sa.String(), nullable=False),
+    sa.Column('region', sa.String(), nullable=True),
+    sa.Column('bands', sa.JSON(), nullable=False),
+    sa.Column('conditions', sa.JSON(), nullable=True),
+    sa.Column('enabled', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_alert_rules_id', 'alert_rules', ['id'])
+    op.create_index('ix_alert_rules_metric', 'alert_rules', ['metric'])
+
+    op.create_table('alerts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('metric', sa.String(), nullable=True),
+    sa.Column('value', sa.Float(), nullable=True),
+    sa.Column('threshold', sa.Float(), nullable=True),
+    sa.Column('message', sa.String(), nullable=True),
+    sa.Column('sent', sa.Boolean(), nullable=True),
+    sa.Column('severity', sa.String(), nullable=True),
+    sa.Column('suppressed', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_alerts_created_at_id', 'alerts', ['created_at', 'id'])
+    op.create_index('ix_alerts_id', 'alerts', ['id'])
+    op.create_index('ix_alerts_metric_created_at_id', 'alerts', ['metric', 'created_at', 'id'])
+
+    op.create_table('leader_leases',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('holder', sa.String(), nullable=False),
+    sa.Column('expires_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('reading_rollups',
+    sa.Column('resolution', sa.Integer(), nullable=False),
+    sa.Column('metric', sa.String(), nullable=False),
+    sa.Column('start', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('min_value', sa.Float(), nullable=False),
+    sa.Column('max_value', sa.Float(), nullable=False),
+    sa.Column('sum_value', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('resolution', 'metric', 'start')
+    )
+    op.create_table('readings',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('metric', sa.String(), nullable=False),
+    sa.Column('value', sa.Float(), nullable=False),
+    sa.Column('location', sa.String(), nullable=True),
+    sa.Column('ts', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_readings_bucket', 'readings', ['bucket'])
+    op.create_index('ix_readings_metric_ts', 'readings', ['metric', 'ts'])
+
+    op.create_table('shared_state',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('stat_counters',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('stream_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('type', sa.String(), nullable=False),
+    sa.Column('data', sa.String(), nullable=False),
+    sa.Column('created_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('suppression_windows',
+    sa.Column('metric', sa.String(), nullable=False),
+    sa.Column('region', sa.String(), nullable=False),
+    sa.Column('severity', sa.String(), nullable=False),
+    sa.Column('notified_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('metric', 'region', 'severity')
+    )
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('hashed_password', sa.String(), nullable=False),
+    sa.Column('phone', sa.String(), nullable=True),
+    sa.Column('region', sa.String(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('is_admin', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    op.create_index('ix_users_id', 'users', ['id'])
+
+    op.create_table('alert_messages',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('alert_id', sa.Integer(), nullable=False),
+    sa.Column('channel', sa.String(), nullable=False),
+    sa.Column('template_id', sa.String(), nullable=False),
+    sa.Column('subject', sa.String(), nullable=True),
+    sa.Column('body', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['alert_id'], ['alerts.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_alert_messages_alert_id', 'alert_messages', ['alert_id'])
+
+    op.create_table('contacts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('phone', sa.String(), nullable=True),
+    sa.Column('email', sa.String(), nullable=True),
+    sa.Column('region', sa.String(), nullable=True),
+    sa.Column('latitude', sa.Float(), nullable=True),
+    sa.Column('longitude', sa.Float(), nullable=True),
+    sa.Column('geohash', sa.String(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_contacts_created_at_id', 'contacts', ['created_at', 'id'])
+    op.create_index('ix_contacts_email', 'contacts', ['email'], unique=True)
+    op.create_index('ix_contacts_geohash', 'contacts', ['geohash'])
+    op.create_index('ix_contacts_id', 'contacts', ['id'])
+    op.create_index('ix_contacts_phone', 'contacts', ['phone'], unique=True)
+
+    op.create_table('contact_regions',
+    sa.Column('contact_id', sa.Integer(), nullable=False),
+    sa.Column('token', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['contact_id'], ['contacts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('contact_id', 'token')
+    )
+    op.create_index('ix_contact_regions_token', 'contact_regions', ['token', 'contact_id'])
+
+    op.create_table('deliveries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('alert_id', sa.Integer(), nullable=False),
+    sa.Column('contact_id', sa.Integer(), nullable=True),
+    sa.Column('channel', sa.String(), nullable=False),
+    sa.Column('recipient', sa.String(), nullable=False),
+    sa.Column('subject', sa.String(), nullable=True),
+    sa.Column('message', sa.String(), nullable=False),
+    sa.Column('message_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('idempotency_key', sa.String(), nullable=True),
+    sa.Column('provider_id', sa.String(), nullable=True),
+    sa.Column('latency_ms', sa.Integer(), nullable=True),
+    sa.Column('last_error', sa.String(), nullable=True),
+    sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('claimed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['alert_id'], ['alerts.id'], ),
+    sa.ForeignKeyConstraint(['message_id'], ['alert_messages.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_deliveries_alert_id', 'deliveries', ['alert_id'])
+    op.create_index('ix_deliveries_id', 'deliveries', ['id'])
+    op.create_index('ix_deliveries_status_id', 'deliveries', ['status', 'id'])
+    op.create_index('ix_deliveries_status_next_attempt', 'deliveries', ['status', 'next_attempt_at'])
+    op.create_index('ux_deliveries_idempotency_key', 'deliveries', ['idempotency_key'], unique=True)
+
+    # Default alert rules, so a fresh install alerts out of the box
+    op.bulk_insert(alert_rules, rules.default_rules())
+
+
+
+def downgrade() -> None:
+    op.drop_index('ux_deliveries_idempotency_key', table_name='deliveries')
+    op.drop_index('ix_deliveries_status_next_attempt', table_name='deliveries')
+    op.drop_index('ix_deliveries_status_id', table_name='deliveries')
+    op.drop_index('ix_deliveries_id', table_name='deliveries')
+    op.drop_index('ix_deliveries_alert_id', table_name='deliveries')
+
+    op.drop_table('deliveries')
+    op.drop_index('ix_contact_regions_token', table_name='contact_regions')
+
+    op.drop_table('contact_regions')
+    op.drop_index('ix_contacts_phone', table_name='contacts')
+    op.drop_index('ix_contacts_id', table_name='contacts')
+    op.drop_index('ix_contacts_geohash', table_name='contacts')
+    op.drop_index('ix_contacts_email', table_name='contacts')
+    op.drop_index('ix_contacts_created_at_id', table_name='contacts')
+
+    op.drop_table('contacts')
+    op.drop_index('ix_alert_messages_alert_id', table_name='alert_messages')
+
+    op.drop_table('alert_messages')
+    op.drop_index('ix_users_id', table_name='users')
+    op.drop_index('ix_users_email', table_name='users')
+
+    op.drop_table('users')
+    op.drop_table('suppression_windows')
+    op.drop_table('stream_events')
+    op.drop_table('stat_counters')
+    op.drop_table('shared_state')
+    op.drop_index('ix_readings_metric_ts', table_name='readings')
+    op.drop_index('ix_readings_bucket', table_name='readings')
+
+    op.drop_table('readings')
+    op.drop_table('reading_rollups')
+    op.drop_table('leader_leases')
+    op.drop_index('ix_alerts_metric_created_at_id', table_name='alerts')
+    op.drop_index('ix_alerts_id', table_name='alerts')
+    op.drop_index('ix_alerts_created_at_id', table_name='alerts')
+
+    op.drop_table('alerts')
+    op.drop_index('ix_alert_rules_metric', table_name='alert_rules')
+    op.drop_index('ix_alert_rules_id', table_name='alert_rules')
+
+    op.drop_table('alert_rules')
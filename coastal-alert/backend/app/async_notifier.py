@@ -0,0 +1,312 @@
+"""
+Event-loop native notification backend.
+
+AsyncNotifier mirrors Notifier but never blocks a thread: SMS goes through a
+shared ``httpx.AsyncClient`` and email through a pool of ``aiosmtplib``
+sessions, so the dispatcher can keep thousands of deliveries in flight on a
+single event loop. Rate limiting and retry policy are the same as the
+threaded SMSSender. Like aiosmtplib, httpx is imported on first use, so it
+does not slow down the app's import; ``warm`` does that at start-up instead.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, Optional, Set
+
+from .config import settings
+from .logs import get_logger
+from .notifier import DEMO_PROVIDER_ID, build_email
+from .smtp_pool import SendUncertain, envelope
+from .sms import SMSError, TokenBucket, backoff_delay, status_error
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = get_logger("notifier")
+
+
+class AsyncSMTPPool:
+    """Async counterpart of SMTPPool: bounded, reused, idle-checked sessions.
+
+    As in SMTPPool, a reaper task started with the first session closes the ones
+    left idle past ``idle_timeout``. ``close`` stops it and waits for every QUIT.
+    """
+
+    def __init__(self, max_size: int, idle_timeout: float, max_messages: int, check_after: float = 5.0):
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.max_messages = max(1, max_messages)
+        self.check_after = check_after
+        self._idle: Deque[list] = deque()  # [smtp, last_used, messages], least recently used first
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._reaper: Optional[asyncio.Task] = None
+        self._quitting: Set[asyncio.Task] = set()
+        self._closed = False
+        self._stats = {
+            "opened": 0,
+            "reused": 0,
+            "reconnects": 0,
+            "closed_idle": 0,
+            "closed_recycled": 0,
+            "closed_broken": 0,
+            "messages_sent": 0,
+            "errors": 0,
+        }
+
+    async def send(self, msg):
+        """Send one message; the envelope is retried once on a fresh session, DATA never is."""
+        import aiosmtplib
+
+        dropped = (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPTimeoutError, asyncio.TimeoutError, OSError)
+        sender, recipients = envelope(msg)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_size)
+        async with self._slots:
+            for attempt in range(2):
+                session = await self._acquire()
+                smtp = session[0]
+                try:
+                    await smtp.mail(sender)
+                    for recipient in recipients:
+                        await smtp.rcpt(recipient)
+                except dropped:
+                    await self._discard(session)
+                    self._stats["reconnects"] += 1
+                    if attempt:
+                        self._stats["errors"] += 1
+                        raise
+                    continue
+                except Exception:
+                    await self._reject(session)
+                    raise
+                try:
+                    await smtp.data(msg.as_bytes())
+                except aiosmtplib.SMTPResponseException:
+                    await self._reject(session)
+                    raise
+                except dropped as e:
+                    await self._discard(session)
+                    self._stats["errors"] += 1
+                    raise SendUncertain(f"connection lost during DATA: {e}") from e
+                session[2] += 1
+                self._stats["messages_sent"] += 1
+                self._release(session)
+                return
+
+    async def _reject(self, session: list):
+        # The server refused this message; reset the transaction and keep the session
+        self._stats["errors"] += 1
+        try:
+            await session[0].rset()
+        except Exception:
+            await self._discard(session)
+        else:
+            self._release(session)
+
+    def stats(self) -> Dict:
+        opened = self._stats["opened"]
+        return dict(
+            self._stats,
+            idle=len(self._idle),
+            max_size=self.max_size,
+            messages_per_session=round(self._stats["messages_sent"] / opened, 2) if opened else 0.0,
+        )
+
+    async def warm(self):
+        """Open one session ahead of the first send."""
+        self._release(await self._open())
+
+    async def close(self):
+        self._closed = True
+        if self._reaper is not None:
+            self._reaper.cancel()
+            await asyncio.gather(self._reaper, return_exceptions=True)
+            self._reaper = None
+        while self._idle:
+            await self._quit(self._idle.pop())
+        if self._quitting:
+            await asyncio.gather(*self._quitting, return_exceptions=True)
+
+    async def _acquire(self) -> list:
+        while self._idle:
+            session = self._idle.pop()
+            idle_for = time.monotonic() - session[1]
+            if idle_for > self.idle_timeout:
+                await self._quit(session)
+                self._stats["closed_idle"] += 1
+                continue
+            if idle_for > self.check_after and not await self._alive(session):
+                await self._discard(session)
+                continue
+            self._stats["reused"] += 1
+            return session
+        return await self._open()
+
+    def _release(self, session: list):
+        session[1] = time.monotonic()
+        if session[2] >= self.max_messages or self._closed:
+            self._stats["closed_recycled"] += 1
+            # Kept until done, so the task is not collected mid-QUIT and close can wait for it
+            task = asyncio.ensure_future(self._quit(session))
+            self._quitting.add(task)
+            task.add_done_callback(self._quitting.discard)
+        else:
+            self._idle.append(session)
+
+    async def _discard(self, session: list):
+        await self._quit(session)
+        self._stats["closed_broken"] += 1
+
+    async def _open(self) -> list:
+        import aiosmtplib
+
+        smtp = aiosmtplib.SMTP(
+            hostname=settings.smtp_host,
+            port=settings.smtp_port or 587,
+            username=settings.smtp_username,
+            password=settings.smtp_password,
+            start_tls=settings.smtp_starttls,
+            timeout=settings.smtp_timeout,
+        )
+        await smtp.connect()
+        self._stats["opened"] += 1
+        if self._reaper is None and not self._closed:
+            self._reaper = asyncio.create_task(self._reap())
+        return [smtp, time.monotonic(), 0]
+
+    async def _reap(self):
+        # Close sessions the server would otherwise drop on us while idle
+        while True:
+            await asyncio.sleep(max(1.0, self.idle_timeout / 2))
+            now = time.monotonic()
+            while self._idle and now - self._idle[0][1] > self.idle_timeout:
+                await self._quit(self._idle.popleft())
+                self._stats["closed_idle"] += 1
+
+    @staticmethod
+    async def _alive(session: list) -> bool:
+        try:
+            return (await session[0].noop()).code == 250
+        except Exception:
+            return False
+
+    @staticmethod
+    async def _quit(session: list):
+        try:
+            await session[0].quit()
+        except Exception:
+            session[0].close()
+
+
+class AsyncNotifier:
+    def __init__(self):
+        self.smtp_pool = AsyncSMTPPool(
+            max_size=settings.smtp_pool_size,
+            idle_timeout=settings.smtp_idle_timeout,
+            max_messages=settings.smtp_max_messages_per_session,
+        )
+        self.bucket = TokenBucket(settings.sms_rate_per_second, settings.sms_burst)
+        self._http: Optional["httpx.AsyncClient"] = None
+        self._sms_stats = {"sent": 0, "failed": 0, "retries": 0, "throttled": 0}
+
+    @property
+    def http(self) -> "httpx.AsyncClient":
+        # Created on first use so it binds to the running event loop
+        if self._http is None:
+            import httpx
+
+            self._http = httpx.AsyncClient(
+                base_url=settings.twilio_api_base,
+                auth=(settings.twilio_account_sid or "", settings.twilio_auth_token or ""),
+                timeout=settings.sms_timeout,
+                limits=httpx.Limits(
+                    max_connections=settings.sms_concurrency,
+                    max_keepalive_connections=settings.sms_concurrency,
+                ),
+            )
+        return self._http
+
+    async def deliver_sms(self, to: str, message: str) -> str:
+        """Send one SMS and return the provider's message id; raises SMSError on failure."""
+        sid = settings.twilio_account_sid
+        token = settings.twilio_auth_token
+        from_num = settings.twilio_phone_number
+
+        if not (sid and token and from_num):
+            logger.info("sms.demo", sample=True, to=to, body=message)
+            return DEMO_PROVIDER_ID
+
+        attempt = 0
+        while True:
+            await self.bucket.acquire_async()
+            try:
+                msg_sid = await self._post_sms(sid, from_num, to, message)
+            except SMSError as e:
+                if e.status == 429:
+                    self._sms_stats["throttled"] += 1
+                if not e.retryable or attempt >= settings.sms_max_retries:
+                    self._sms_stats["failed"] += 1
+                    logger.warning("sms.failed", sample=True, to=to, error=str(e))
+                    raise
+                await asyncio.sleep(max(backoff_delay(attempt, 0.5, 20.0), e.retry_after))
+                attempt += 1
+                self._sms_stats["retries"] += 1
+                continue
+            self._sms_stats["sent"] += 1
+            logger.info("sms.sent", sample=True, to=to, sid=msg_sid)
+            return msg_sid
+
+    async def deliver_email(self, to_email: str, subject: str, body: str, idempotency_key: Optional[str] = None) -> str:
+        """Send one email and return its Message-ID; raises on failure."""
+        if settings.smtp_host and settings.smtp_username and settings.smtp_password:
+            msg = build_email(to_email, subject, body, idempotency_key)
+            try:
+                await self.smtp_pool.send(msg)
+            except Exception as e:
+                logger.warning("email.failed", sample=True, to=to_email, error=str(e))
+                raise
+            logger.info("email.sent", sample=True, to=to_email, message_id=msg['Message-ID'])
+            return msg['Message-ID']
+        else:
+            logger.info("email.demo", sample=True, to=to_email, subject=subject, body=body)
+            return DEMO_PROVIDER_ID
+
+    async def warm(self):
+        """Connect to the configured providers before the first alert needs them."""
+        if settings.smtp_host and settings.smtp_username and settings.smtp_password:
+            await self.smtp_pool.warm()
+        if settings.twilio_account_sid and settings.twilio_auth_token and settings.twilio_phone_number:
+            # Any response will do: it leaves a connection in the keep-alive pool
+            await self.http.get("/")
+
+    def stats(self):
+        return {
+            "smtp": self.smtp_pool.stats(),
+            "sms": dict(self._sms_stats, rate_per_second=self.bucket.rate),
+        }
+
+    async def aclose(self):
+        await self.smtp_pool.close()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _post_sms(self, sid: str, from_num: str, to: str, message: str) -> str:
+        import httpx
+
+        try:
+            resp = await self.http.post(
+                f"/2010-04-01/Accounts/{sid}/Messages.json",
+                data={"To": to, "From": from_num, "Body": message},
+            )
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            # The request never left this process
+            raise SMSError(f"Twilio request failed: {e}", retryable=True)
+        except httpx.HTTPError as e:
+            raise SMSError(f"Twilio request failed: {e}", uncertain=True)
+        if resp.status_code >= 400:
+            raise status_error(resp)
+        return resp.json().get("sid", "")
+
+
+async_notifier = AsyncNotifier()
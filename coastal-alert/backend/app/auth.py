@@ -0,0 +1,184 @@
+"""
+Admin authentication: bearer JWTs issued by /api/auth/login.
+
+Checking a token means verifying its signature and loading its user, so every
+authenticated request would cost a JWT decode and a ``users`` query.
+``token_cache`` instead remembers the user behind each verified token, as a
+detached snapshot, for ``AUTH_TOKEN_CACHE_TTL`` seconds (never past the
+token's own expiry). It keeps the ``AUTH_TOKEN_CACHE_SIZE`` most recently
+used tokens. A hit needs neither a decode nor a query, nor a threadpool hop.
+
+Flushing any change to a user row (deactivation, a new password, a new role)
+drops that user's tokens from the cache of this process. With SHARED_STATE it
+also bumps the "users" version, and the other processes clear their caches
+on their next poll. Password checks at login run in the process pool of
+passwords.py. python-jose is imported on first use.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Set, Tuple
+
+from fastapi import Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import metrics, models
+from .config import settings
+from .database import ReadSessionLocal
+from .passwords import hash_password, password_hasher
+
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
+SECRET_KEY = settings.secret_key or secrets.token_urlsafe(32)
+USER_COLUMNS = tuple(column.key for column in models.User.__table__.columns)
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+
+
+class TokenCache:
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        # token -> (expires at, user snapshot), least recently used first
+        self._entries: "OrderedDict[str, Tuple[float, models.User]]" = OrderedDict()
+        self._by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a lookup that raced one is not cached
+        self.generation = 0
+
+    def get(self, token: str) -> Optional[models.User]:
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                self._drop(token)
+                return None
+            self._entries.move_to_end(token)
+            return entry[1]
+
+    def put(self, token: str, user: models.User, expires_at: float, generation: int):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            if token in self._entries:
+                self._drop(token)
+            self._entries[token] = (min(time.time() + self.ttl, expires_at), user)
+            self._by_user.setdefault(user.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            self.generation += 1
+            for token in list(self._by_user.get(user_id, ())):
+                self._drop(token)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._by_user.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, token: str):
+        _, user = self._entries.pop(token)
+        tokens = self._by_user.get(user.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[user.id]
+
+
+token_cache = TokenCache(settings.auth_token_cache_ttl, settings.auth_token_cache_size)
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def forget_user(mapper, connection, user: models.User):
+    token_cache.invalidate_user(user.id)
+    from .shared import coordinator  # shared imports this module
+    coordinator.bump(connection, "users")
+
+
+def get_password_hash(password: str) -> str:
+    return hash_password(password)
+
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    from jose import jwt
+
+    claims = dict(data)
+    claims["exp"] = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def get_user(db: Session, email: str) -> Optional[models.User]:
+    return db.query(models.User).filter(models.User.email == email).first()
+
+
+async def authenticate_user(db: Session, email: str, password: str) -> Optional[models.User]:
+    user = await run_in_threadpool(get_user, db, email)
+    # An unknown email costs a full check too, so response times do not reveal which emails exist
+    if not await password_hasher.verify(password, user.hashed_password if user else None):
+        return None
+    return user
+
+
+def snapshot(user: models.User) -> models.User:
+    """A copy of the user's columns that belongs to no session."""
+    return models.User(**{key: getattr(user, key) for key in USER_COLUMNS})
+
+
+def verify_token(token: str) -> Tuple[Optional[models.User], float]:
+    """The user a token names and the token's expiry, or (None, 0) if it is not valid."""
+    from jose import JWTError, jwt
+
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None, 0.0
+    email, expires_at = claims.get("sub"), claims.get("exp")
+    if not email or expires_at is None:
+        return None, 0.0
+    db = ReadSessionLocal()
+    try:
+        user = get_user(db, email)
+        return (snapshot(user) if user else None), float(expires_at)
+    finally:
+        db.close()
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> models.User:
+    user = token_cache.get(token)
+    if user is not None:
+        metrics.AUTH_TOKEN_CACHE.inc("hit")
+        return user
+    metrics.AUTH_TOKEN_CACHE.inc("miss")
+    generation = token_cache.generation
+    user, expires_at = await run_in_threadpool(verify_token, token)
+    if user is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    token_cache.put(token, user, expires_at, generation)
+    return user
+
+
+async def get_current_active_user(current_user: models.User = Depends(get_current_user)) -> models.User:
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
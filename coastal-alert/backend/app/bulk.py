@@ -0,0 +1,171 @@
+"""
+Bulk contact import and export.
+
+Imports are parsed row by row from the uploaded file (CSV with a header row,
+or NDJSON with one object per line) and written in chunks. Each chunk is
+checked against the unique email/phone indexes with two IN queries and
+inserted with one executemany and one commit. Bad or duplicate rows are
+reported by line number and do not stop the import. Exports page through the
+table by id, so memory stays flat however many contacts there are.
+"""
+import csv
+import io
+import json
+from typing import IO, Dict, Iterator, List, Optional
+
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from . import geo, models, regions, schemas
+from .counters import counters, CONTACTS_TOTAL
+from .recipient_index import recipient_index
+from .shared import coordinator
+
+EXPORT_FIELDS = ["id", "name", "phone", "email", "region", "latitude", "longitude", "created_at"]
+IMPORT_FIELDS = ("name", "phone", "email", "region", "latitude", "longitude")
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    name = (filename or "").lower()
+    content_type = (content_type or "").lower()
+    if name.endswith(".csv") or "csv" in content_type:
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in content_type or "jsonl" in content_type:
+        return "ndjson"
+    return None
+
+
+def _parse(stream: IO[bytes], fmt: str) -> Iterator[tuple]:
+    """Yield (line number, row dict or error message)."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, {k.strip().lower(): (v.strip() if v else None) for k, v in row.items() if k}
+    else:
+        for line_num, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_num, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield line_num, "Expected a JSON object"
+                continue
+            yield line_num, row
+
+
+def import_contacts(db: Session, stream: IO[bytes], fmt: str, chunk_size: int = 1000, max_errors: int = 1000) -> Dict:
+    report = {"rows": 0, "inserted": 0, "duplicates": 0, "invalid": 0, "errors": []}
+    seen_emails = set()
+    seen_phones = set()
+    chunk: List[tuple] = []
+
+    def error(line: int, message: str, kind: str):
+        report[kind] += 1
+        if len(report["errors"]) < max_errors:
+            report["errors"].append({"line": line, "error": message})
+
+    for line, row in _parse(stream, fmt):
+        report["rows"] += 1
+        if isinstance(row, str):
+            error(line, row, "invalid")
+            continue
+        try:
+            # Empty CSV cells are missing values; a coordinate of 0 is not
+            contact = schemas.ContactCreate(**{k: None if row.get(k) in (None, "") else row[k] for k in IMPORT_FIELDS})
+        except ValidationError as e:
+            error(line, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()), "invalid")
+            continue
+        if not contact.email and not contact.phone:
+            error(line, "At least one contact method (email or phone) is required", "invalid")
+            continue
+        # Duplicates inside the file itself
+        if contact.email and contact.email in seen_emails:
+            error(line, f"Duplicate email '{contact.email}' earlier in file", "duplicates")
+            continue
+        if contact.phone and contact.phone in seen_phones:
+            error(line, f"Duplicate phone number '{contact.phone}' earlier in file", "duplicates")
+            continue
+        if contact.email:
+            seen_emails.add(contact.email)
+        if contact.phone:
+            seen_phones.add(contact.phone)
+        chunk.append((line, contact))
+        if len(chunk) >= chunk_size:
+            _flush(db, chunk, error, report)
+            chunk = []
+    if chunk:
+        _flush(db, chunk, error, report)
+    report["errors_truncated"] = report["duplicates"] + report["invalid"] > len(report["errors"])
+    return report
+
+
+def _flush(db: Session, chunk: List[tuple], error, report: Dict):
+    emails = [c.email for _, c in chunk if c.email]
+    phones = [c.phone for _, c in chunk if c.phone]
+    existing_emails = {e for (e,) in db.query(models.Contact.email).filter(models.Contact.email.in_(emails))} if emails else set()
+    existing_phones = {p for (p,) in db.query(models.Contact.phone).filter(models.Contact.phone.in_(phones))} if phones else set()
+
+    rows = []
+    for line, contact in chunk:
+        if contact.email and contact.email in existing_emails:
+            error(line, f"Contact with email '{contact.email}' already exists", "duplicates")
+        elif contact.phone and contact.phone in existing_phones:
+            error(line, f"Contact with phone number '{contact.phone}' already exists", "duplicates")
+        else:
+            row = contact.dict()
+            row["geohash"] = geo.point_hash(contact.latitude, contact.longitude)
+            rows.append(row)
+    if not rows:
+        return
+
+    result = db.execute(
+        insert(models.Contact).returning(models.Contact.id, sort_by_parameter_order=True),
+        rows,
+    )
+    ids = [contact_id for (contact_id,) in result]
+    regions.insert_tokens(db, [(contact_id, row["region"]) for contact_id, row in zip(ids, rows)])
+    counters.add(db, {CONTACTS_TOTAL: len(ids)})
+    coordinator.bump(db, "contacts")
+    db.commit()
+    for contact_id, row in zip(ids, rows):
+        recipient_index.upsert(contact_id, row["phone"], row["email"], row["region"], row["latitude"], row["longitude"])
+    report["inserted"] += len(rows)
+
+
+def export_contacts(session_factory, fmt: str, page_size: int = 1000) -> Iterator[str]:
+    """Yield the contacts table as CSV or NDJSON text, one page at a time."""
+    columns = [getattr(models.Contact, field) for field in EXPORT_FIELDS]
+    if fmt == "csv":
+        yield ",".join(EXPORT_FIELDS) + "\r\n"
+    last_id = 0
+    while True:
+        db = session_factory()
+        try:
+            page = (
+                db.query(*columns)
+                .filter(models.Contact.id > last_id)
+                .order_by(models.Contact.id)
+                .limit(page_size)
+                .all()
+            )
+        finally:
+            db.close()
+        if not page:
+            return
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == "csv" else None
+        for row in page:
+            values = [v.isoformat() if hasattr(v, "isoformat") else v for v in row]
+            if writer:
+                writer.writerow(["" if v is None else v for v in values])
+            else:
+                buffer.write(orjson.dumps(dict(zip(EXPORT_FIELDS, values))).decode())
+                buffer.write("\n")
+        yield buffer.getvalue()
+        last_id = page[-1][0]
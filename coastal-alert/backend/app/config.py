@@ -4,14 +4,116 @@ from typing import Optional
 
 class Settings(BaseSettings):
     database_url: str = "sqlite:///./alerts.db"
+    # Optional read replica for the read-only endpoints (PostgreSQL); SQLite gets its own reader pool
+    database_read_url: Optional[str] = None
+    # Connection pools (ignored for SQLite except read_pool_size)
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_read_pool_size: int = 8
+    # SQLite tuning: WAL lets readers run alongside the single writer
+    sqlite_wal: bool = True
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 268435456  # 256 MB
     twilio_account_sid: Optional[str] = Field(None, alias="TWILIO_ACCOUNT_SID")
     twilio_auth_token: Optional[str] = Field(None, alias="TWILIO_AUTH_TOKEN")
     twilio_phone_number: Optional[str] = Field(None, alias="TWILIO_PHONE_NUMBER")
+    twilio_api_base: str = "https://api.twilio.com"
+    sms_rate_per_second: float = 10.0
+    sms_burst: int = 10
+    sms_concurrency: int = 8
+    sms_max_retries: int = 4
+    sms_timeout: float = 10.0
+    sms_max_segments: int = 1  # longer SMS bodies are cut to fit
     smtp_host: Optional[str] = None
     smtp_port: Optional[int] = 587
     smtp_username: Optional[str] = None
     smtp_password: Optional[str] = None
     smtp_from: Optional[str] = None
+    smtp_timeout: float = 30.0
+    smtp_starttls: bool = True  # off only for local test servers
+    smtp_pool_size: int = 4
+    smtp_idle_timeout: float = 60.0
+    smtp_max_messages_per_session: int = 100
+
+    # Seconds between full recounts of the /api/stats counters (0 disables)
+    counters_reconcile_interval: float = 300.0
+
+    # Bulk contact import
+    bulk_import_chunk_size: int = 1000
+    bulk_import_max_errors: int = 1000
+
+    # Rendered alert message templates kept in memory
+    template_cache_size: int = 1024
+
+    # Alert rules: how recent (seconds) another metric's reading must be to satisfy a compound condition
+    rule_condition_window: float = 900.0
+
+    # Repeat alerts for the same metric, region and severity within the cooldown are
+    # logged but not sent (0 disables); state older than the TTL is forgotten
+    alert_cooldown_seconds: float = 600.0
+    suppression_ttl_seconds: float = 3600.0
+
+    # Live event stream (GET /api/stream): frames buffered per client before the
+    # oldest are dropped, open streams allowed, and seconds between keep-alives
+    stream_queue_size: int = 256
+    stream_max_subscribers: int = 10000
+    stream_keepalive: float = 15.0
+
+    # Batch sensor ingestion (POST /api/readings/batch)
+    readings_batch_max: int = 10000
+    readings_batch_max_errors: int = 1000
+
+    # Largest page GET /api/contacts and /api/alerts/logs serve; pages are streamed, so this bounds time, not memory
+    list_max_limit: int = 100000
+
+    # Readings time series: seconds between rollup passes, and days of raw readings kept (0 keeps all)
+    readings_rollup_interval: float = 60.0
+    readings_retention_days: int = 30
+
+    # Background notification dispatch
+    notifier_backend: str = "async"  # "async" (event loop) or "threads" (blocking Notifier)
+    dispatch_concurrency: int = 500
+    dispatch_workers: int = 8  # executor size for the "threads" backend
+    dispatch_batch_size: int = 200
+    dispatch_poll_interval: float = 1.0
+    # Failed deliveries are retried with exponential backoff until this many attempts
+    delivery_max_attempts: int = 5
+    delivery_retry_base: float = 30.0  # seconds before the first retry
+    delivery_retry_cap: float = 1800.0
+
+    # Dry runs (POST /api/alerts?dry_run=true): assumed provider round trip per message for send-time estimates
+    plan_provider_latency_ms: float = 250.0
+
+    # Authentication: JWT signing key and token lifetime. Unset means a random per-process
+    # key, so tokens die with the process; the API refuses to start that way with SHARED_STATE.
+    secret_key: Optional[str] = None
+    access_token_expire_minutes: int = 30
+    # Verified tokens are remembered for this many seconds (0 disables), up to this many
+    auth_token_cache_ttl: float = 60.0
+    auth_token_cache_size: int = 10000
+    # Processes that check passwords at login (bcrypt); 0 checks them on the threadpool
+    auth_hash_workers: int = 2
+
+    # Multi-process mode: API workers and dispatcher processes share state through the
+    # database. Changes made by other processes are picked up every poll interval, and
+    # scheduled jobs run only in the process holding the leader lease.
+    shared_state: bool = False
+    run_dispatcher: bool = True  # off in API workers when dispatcher processes are separate
+    shared_state_poll_interval: float = 1.0
+    leader_lease_seconds: float = 15.0
+    # An in_progress delivery claimed longer ago than this is assumed lost and marked unknown
+    dispatch_lease_seconds: float = 300.0
+
+    # Observability: /metrics (off by default) and structured logs ("text" or "json");
+    # per-message log events are kept at LOG_SAMPLE_RATE
+    metrics_enabled: bool = False
+    log_level: str = "INFO"
+    log_format: str = "text"
+    log_sample_rate: float = 1.0
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,176 @@
+"""
+Incrementally maintained counters behind /api/stats.
+
+Write paths call ``counters.add(db, {...})`` inside their own transaction.
+That issues ``UPDATE stat_counters SET value = value + n`` in the same
+transaction, and the in-memory copy changes only after the session commits
+(a rollback discards the deltas). /api/stats then reads a dict instead of
+running COUNT(*) over the alerts table. ``reconcile`` recounts everything
+from the source tables. It runs at startup when the table is empty and then
+periodically in the background, and it logs any drift it corrects. In
+multi-process mode only the leader reconciles, and every process calls
+``refresh`` each poll to pick up the other processes' writes.
+"""
+import asyncio
+import threading
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import event, func, insert, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .events import bus
+from .logs import get_logger
+
+logger = get_logger("counters")
+
+CONTACTS_TOTAL = "contacts.total"
+ALERTS_TOTAL = "alerts.total"
+ALERTS_SENT = "alerts.sent"
+ALERTS_SUPPRESSED = "alerts.suppressed"
+METRIC_PREFIX = "alerts.metric."
+SEVERITY_PREFIX = "alerts.severity."
+
+
+def alert_deltas(metric: str, severity: str) -> Dict[str, int]:
+    """The counter changes for one new AlertLog row."""
+    return {ALERTS_TOTAL: 1, METRIC_PREFIX + metric: 1, SEVERITY_PREFIX + severity: 1}
+
+
+class Counters:
+    def __init__(self):
+        self._values: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._task = None
+
+    def add(self, db: Session, deltas: Dict[str, int]):
+        for name, delta in deltas.items():
+            if not delta:
+                continue
+            result = db.execute(
+                update(models.StatCounter)
+                .where(models.StatCounter.name == name)
+                .values(value=models.StatCounter.value + delta)
+            )
+            if result.rowcount == 0:
+                db.execute(insert(models.StatCounter).values(name=name, value=delta))
+            pending = db.info.setdefault("counter_deltas", {})
+            pending[name] = pending.get(name, 0) + delta
+
+    def get(self, name: str) -> int:
+        return self._values.get(name, 0)
+
+    def snapshot(self) -> Dict:
+        """The counter part of /api/stats, also pushed to /api/stream on every change."""
+        return {
+            "total_contacts": self.get(CONTACTS_TOTAL),
+            "total_alerts": self.get(ALERTS_TOTAL),
+            "alerts_sent": self.get(ALERTS_SENT),
+            "alerts_suppressed": self.get(ALERTS_SUPPRESSED),
+            "alerts_by_metric": self.with_prefix(METRIC_PREFIX),
+            "alerts_by_severity": self.with_prefix(SEVERITY_PREFIX),
+        }
+
+    def with_prefix(self, prefix: str) -> Dict[str, int]:
+        with self._lock:
+            return {name[len(prefix):]: value for name, value in self._values.items() if name.startswith(prefix) and value}
+
+    def load(self, db: Session):
+        rows = db.query(models.StatCounter.name, models.StatCounter.value).all()
+        if not rows:
+            self.reconcile(db)
+            return
+        with self._lock:
+            self._values = dict(rows)
+
+    def refresh(self, db: Session) -> bool:
+        """Re-read the stored totals, which other processes also update. Returns whether anything changed."""
+        values = {name: value for name, value in db.query(models.StatCounter.name, models.StatCounter.value)}
+        with self._lock:
+            if values == self._values:
+                return False
+            self._values = values
+        bus.publish("stats", self.snapshot())
+        return True
+
+    def reconcile(self, db: Session) -> int:
+        """Recount from the source tables, store the result and return how many counters drifted."""
+        counts = {
+            CONTACTS_TOTAL: db.query(func.count(models.Contact.id)).scalar() or 0,
+            ALERTS_TOTAL: db.query(func.count(models.AlertLog.id)).scalar() or 0,
+            ALERTS_SENT: db.query(func.count(models.AlertLog.id)).filter(models.AlertLog.sent == True).scalar() or 0,
+            ALERTS_SUPPRESSED: db.query(func.count(models.AlertLog.id)).filter(models.AlertLog.suppressed == True).scalar() or 0,
+        }
+        for metric, count in db.query(models.AlertLog.metric, func.count(models.AlertLog.id)).group_by(models.AlertLog.metric):
+            counts[METRIC_PREFIX + str(metric)] = count
+        for severity, count in db.query(models.AlertLog.severity, func.count(models.AlertLog.id)).group_by(models.AlertLog.severity):
+            counts[SEVERITY_PREFIX + str(severity)] = count
+
+        stored = dict(db.query(models.StatCounter.name, models.StatCounter.value).all())
+        drift = 0
+        for name in stored.keys() | counts.keys():
+            value = counts.get(name, 0)
+            if stored.get(name) == value:
+                continue
+            drift += 1
+            if name in stored:
+                db.execute(update(models.StatCounter).where(models.StatCounter.name == name).values(value=value))
+            else:
+                db.execute(insert(models.StatCounter).values(name=name, value=value))
+        db.info.pop("counter_deltas", None)
+        db.commit()
+        with self._lock:
+            self._values = counts
+        if drift:
+            bus.publish("stats", self.snapshot())
+            logger.info("counters.reconciled", corrected=drift)
+        return drift
+
+    def start_reconciler(self, interval: float, when: Optional[Callable[[], bool]] = None):
+        """Reconcile every ``interval`` seconds, skipping rounds where ``when()`` is false."""
+        if self._task is None and interval > 0:
+            self._task = asyncio.create_task(self._reconcile_forever(interval, when))
+
+    def stop_reconciler(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _reconcile_forever(self, interval: float, when: Optional[Callable[[], bool]]):
+        while True:
+            await asyncio.sleep(interval)
+            if when is not None and not when():
+                continue
+            try:
+                await asyncio.to_thread(self._reconcile_once)
+            except Exception as e:
+                logger.error("counters.reconcile_failed", error=str(e))
+
+    def _reconcile_once(self):
+        db = SessionLocal()
+        try:
+            self.reconcile(db)
+        finally:
+            db.close()
+
+    def _apply(self, deltas: Dict[str, int]):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._values[name] = self._values.get(name, 0) + delta
+        bus.publish("stats", self.snapshot())
+
+
+counters = Counters()
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _apply_committed_deltas(session):
+    deltas = session.info.pop("counter_deltas", None)
+    if deltas:
+        counters._apply(deltas)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _drop_rolled_back_deltas(session):
+    session.info.pop("counter_deltas", None)
@@ -1,7 +1,142 @@
-from sqlalchemy import create_engine
+"""
+Database engines and sessions.
+
+``SessionLocal`` is bound to the writer engine and ``ReadSessionLocal`` to a
+reader engine, which the read-only endpoints use through ``get_read_db``.
+
+SQLite runs in WAL mode with ``synchronous=NORMAL``, a busy timeout and
+memory-mapped reads. Readers then never block the writer or each other, and
+a writer waits for the lock instead of failing with "database is locked".
+Writer transactions start with ``BEGIN IMMEDIATE``: a deferred transaction
+that reads first and then writes cannot wait for the lock, because SQLite
+would rather fail it than risk a deadlock. Such a session holds the write lock
+until it ends, so hot paths that only query, like login and token checks, use
+the reader engine rather than queue behind writers. The reader engine is a
+separate pool of ``query_only`` connections to the same file. In-memory
+databases share one engine.
+
+Other databases get a sized ``QueuePool`` with pre-ping and recycling from
+``Settings``. They read from ``DATABASE_READ_URL`` when it is set, else from
+the writer pool. ``pool_stats`` reports both pools for /api/db/stats.
+"""
+import threading
+from typing import Dict
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 from .config import settings
 
-engine = create_engine(settings.database_url, connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {})
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def is_memory(url: str) -> bool:
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+
+def sqlite_pragmas(read_only: bool):
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(settings.sqlite_busy_timeout_ms)}",
+        f"PRAGMA synchronous = {settings.sqlite_synchronous}",
+        f"PRAGMA mmap_size = {int(settings.sqlite_mmap_size)}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only = ON")
+    elif settings.sqlite_wal:
+        # Persistent: stored in the database file, so readers opened later see it too
+        pragmas.insert(0, "PRAGMA journal_mode = WAL")
+    return pragmas
+
+
+def create_sqlite_engine(url: str, read_only: bool = False):
+    kwargs = {"connect_args": {"check_same_thread": False}}
+    if read_only:
+        kwargs.update(pool_size=settings.db_read_pool_size, max_overflow=settings.db_read_pool_size)
+    engine = create_engine(url, **kwargs)
+    pragmas = sqlite_pragmas(read_only)
+
+    @event.listens_for(engine, "connect")
+    def _configure(dbapi_connection, connection_record):
+        # Let SQLAlchemy issue BEGIN itself (see below) instead of pysqlite's implicit one
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN" if read_only else "BEGIN IMMEDIATE")
+
+    return engine
+
+
+def create_server_engine(url: str):
+    return create_engine(
+        url,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+    )
+
+
+class PoolMetrics:
+    """Connection and checkout counts for one engine, collected from pool events."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._stats = {"connects": 0, "checkouts": 0, "invalidated": 0}
+        event.listen(engine, "connect", lambda *args: self._count("connects"))
+        event.listen(engine, "checkout", lambda *args: self._count("checkouts"))
+        event.listen(engine, "invalidate", lambda *args: self._count("invalidated"))
+
+    def stats(self) -> Dict:
+        pool = self.engine.pool
+        with self._lock:
+            stats = dict(self._stats)
+        stats["pool"] = type(pool).__name__
+        for key in ("size", "checkedin", "checkedout", "overflow"):
+            method = getattr(pool, key, None)
+            if callable(method):
+                stats[key] = method()
+        return stats
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+
+if is_sqlite(settings.database_url):
+    if is_memory(settings.database_url):
+        engine = create_engine(settings.database_url, connect_args={"check_same_thread": False})
+        read_engine = engine
+    else:
+        engine = create_sqlite_engine(settings.database_url)
+        read_engine = create_sqlite_engine(settings.database_url, read_only=True)
+else:
+    engine = create_server_engine(settings.database_url)
+    read_engine = create_server_engine(settings.database_read_url) if settings.database_read_url else engine
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+Base = declarative_base()
+
+pool_metrics = {"writer": PoolMetrics(engine)}
+if read_engine is not engine:
+    pool_metrics["reader"] = PoolMetrics(read_engine)
+
+
+def pool_stats() -> Dict:
+    stats = {
+        "dialect": engine.dialect.name,
+        "separate_reader": read_engine is not engine,
+        **{name: metrics.stats() for name, metrics in pool_metrics.items()},
+    }
+    if is_sqlite(settings.database_url) and not is_memory(settings.database_url):
+        with read_engine.connect() as conn:
+            stats["journal_mode"] = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+    return stats
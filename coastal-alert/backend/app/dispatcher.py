@@ -0,0 +1,459 @@
+"""
+Background fan-out of alert notifications.
+
+trigger_alert writes one Delivery row per contact/channel and returns straight
+away. The Dispatcher runs on the application's event loop: it claims pending
+rows in batches and sends each batch with ``asyncio.gather``, with a semaphore
+capping how many deliveries are in flight at once. With the default "async"
+backend the sends are coroutines on AsyncNotifier, so thousands of deliveries
+need no extra threads. The "threads" backend runs the blocking Notifier in a
+small executor instead. Because the queue lives in the database, jobs still
+pending when the process stopped are sent after the next start.
+
+Every delivery carries an idempotency key (alert, channel, recipient), and
+enqueue skips keys that already exist. Neither Twilio nor SMTP servers drop a
+repeated send, so a row is committed ``in_progress`` before it is sent and
+never goes back to ``pending`` on its own. A send that may have reached the
+provider (a timeout, a dropped connection, a 5xx after the request went out)
+and a row found still in flight after a crash become ``unknown``. Those wait
+for an operator to check and re-queue them with ``retry_unknown``. Failed
+sends that provably did not go out record the error and are retried with
+exponential backoff (status "retry" until ``next_attempt_at``) up to
+``max_attempts``. Errors the provider marks as permanent, such as an invalid
+number, fail at once. Results are written back one batch at a time, along
+with the provider's message id and the send latency. If that write fails,
+it is retried with capped backoff while the rows stay claimed. A send is
+never repeated because of it. An alert is marked ``sent`` once at least one
+of its deliveries has succeeded.
+
+Several dispatcher processes can share the queue (``SHARED_STATE``). Claims
+lock their rows with ``FOR UPDATE SKIP LOCKED`` where the database has it;
+SQLite serialises them with ``BEGIN IMMEDIATE``. A process restarting then
+must not touch rows that another process is still sending, so in shared mode
+in_progress rows are only marked ``unknown`` once their claim is older than
+``dispatch_lease_seconds``, by the leader (see shared.py).
+"""
+import asyncio
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import and_, func, insert, or_, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .async_notifier import async_notifier
+from .config import settings
+from .counters import ALERTS_SENT, counters
+from .database import ReadSessionLocal, SessionLocal
+from .events import bus
+from .logs import get_logger
+from .metrics import SEND_LATENCY
+from .notifier import notifier
+
+logger = get_logger("dispatcher")
+
+STATUSES = ("pending", "in_progress", "retry", "sent", "failed", "unknown")
+# Not finished: still to be sent, being sent, or waiting on an operator
+OPEN_STATUSES = ("pending", "in_progress", "retry", "unknown")
+
+Job = namedtuple("Job", ["id", "alert_id", "channel", "recipient", "subject", "message", "idempotency_key", "attempts"])
+Result = namedtuple("Result", ["id", "provider_id", "error", "latency_ms", "retryable", "uncertain"])
+
+
+def idempotency_key(alert_id: int, channel: str, recipient: str) -> str:
+    return f"{alert_id}:{channel}:{recipient}"
+
+
+def retry_delay(attempts: int, base: float, cap: float) -> float:
+    # Exponential, with jitter so a failed burst does not retry in lockstep
+    return min(cap, base * 2 ** max(0, attempts - 1)) * random.uniform(0.5, 1.0)
+
+
+class Dispatcher:
+    def __init__(self, concurrency: int, batch_size: int, poll_interval: float, backend: str, thread_workers: int,
+                 max_attempts: int = 5, retry_base: float = 30.0, retry_cap: float = 1800.0, shared: bool = False):
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+        self.backend = backend
+        self.thread_workers = max(1, thread_workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+        self.shared = shared
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batches: Set[asyncio.Task] = set()
+        self._claimed = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def enqueue(self, db: Session, alert_id: int, jobs: Iterable[dict]) -> int:
+        """Add delivery jobs for an alert, skipping any already queued. The caller commits the session."""
+        seen = {
+            key for key, in db.query(models.Delivery.idempotency_key).filter(models.Delivery.alert_id == alert_id)
+        }
+        rows = []
+        for job in jobs:
+            key = idempotency_key(alert_id, job["channel"], job["recipient"])
+            if key in seen:
+                continue
+            seen.add(key)
+            rows.append({
+                "alert_id": alert_id,
+                "contact_id": job.get("contact_id"),
+                "channel": job["channel"],
+                "recipient": job["recipient"],
+                "subject": job.get("subject"),
+                "message": job.get("message", ""),
+                "message_id": job.get("message_id"),
+                "idempotency_key": key,
+                "status": "pending",
+                "attempts": 0,
+            })
+        if rows:
+            db.execute(insert(models.Delivery), rows)
+        return len(rows)
+
+    def wake(self):
+        """Tell the feeder there is new work instead of waiting for the next poll.
+
+        Safe to call from the request threadpool.
+        """
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        if self.backend == "threads":
+            self._executor = ThreadPoolExecutor(max_workers=self.thread_workers, thread_name_prefix="dispatch")
+        if not self.shared:
+            await asyncio.to_thread(self.recover)
+        self._task = asyncio.create_task(self._run())
+        logger.info("dispatch.started", backend=self.backend, concurrency=self.concurrency)
+
+    async def warm(self):
+        """Connect this backend's notifier to the providers before the first delivery."""
+        if self.backend == "threads":
+            await asyncio.to_thread(notifier.warm)
+        else:
+            await async_notifier.warm()
+
+    async def stop(self, timeout: float = 5.0):
+        if self._task is None:
+            return
+        self._task.cancel()
+        if self._batches:
+            # Let in-flight batches record their results; the rest are marked unknown on restart
+            await asyncio.wait(self._batches, timeout=timeout)
+        for task in list(self._batches):
+            task.cancel()
+        self._task = None
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def progress(self, db: Session, alert_id: int) -> Dict:
+        """Per-channel and overall delivery counts for one alert."""
+        rows = (
+            db.query(models.Delivery.channel, models.Delivery.status, func.count(models.Delivery.id))
+            .filter(models.Delivery.alert_id == alert_id)
+            .group_by(models.Delivery.channel, models.Delivery.status)
+            .all()
+        )
+        totals = dict.fromkeys(STATUSES, 0)
+        channels: Dict[str, Dict[str, int]] = {}
+        for channel, status, count in rows:
+            totals[status] = totals.get(status, 0) + count
+            channels.setdefault(channel, dict.fromkeys(STATUSES, 0))
+            channels[channel][status] = count
+        total = sum(totals.values())
+        return {
+            "alert_id": alert_id,
+            "total": total,
+            **totals,
+            "done": totals["pending"] == 0 and totals["in_progress"] == 0 and totals["retry"] == 0,
+            "needs_review": totals["unknown"],
+            "channels": channels,
+        }
+
+    def summary(self, db: Session, alert_id: int) -> Dict:
+        """Delivery outcomes for one alert: progress plus attempts, latency and the failures."""
+        delivery = models.Delivery
+        result = self.progress(db, alert_id)
+        attempts, avg_latency, max_latency, next_retry = (
+            db.query(
+                func.coalesce(func.sum(delivery.attempts), 0),
+                func.avg(delivery.latency_ms),
+                func.max(delivery.latency_ms),
+                func.min(delivery.next_attempt_at),
+            )
+            .filter(delivery.alert_id == alert_id)
+            .one()
+        )
+        errors = (
+            db.query(delivery.last_error, func.count(delivery.id))
+            .filter(delivery.alert_id == alert_id, delivery.status.in_(("retry", "failed", "unknown")))
+            .group_by(delivery.last_error)
+            .order_by(func.count(delivery.id).desc())
+            .limit(10)
+            .all()
+        )
+        failed, unknown = (
+            db.query(delivery.contact_id, delivery.channel, delivery.recipient, delivery.attempts, delivery.last_error)
+            .filter(delivery.alert_id == alert_id, delivery.status == status)
+            .order_by(delivery.id)
+            .limit(100)
+            .all()
+            for status in ("failed", "unknown")
+        )
+        result.update(
+            attempts=attempts,
+            latency_ms={"avg": round(avg_latency) if avg_latency is not None else None, "max": max_latency},
+            next_retry_at=next_retry,
+            errors=[{"error": error, "count": count} for error, count in errors],
+            failed_recipients=[
+                {"contact_id": contact_id, "channel": channel, "recipient": recipient, "attempts": tries, "error": error}
+                for contact_id, channel, recipient, tries, error in failed
+            ],
+            unknown_recipients=[
+                {"contact_id": contact_id, "channel": channel, "recipient": recipient, "attempts": tries, "error": error}
+                for contact_id, channel, recipient, tries, error in unknown
+            ],
+        )
+        return result
+
+    def queue_depth(self) -> Dict[str, int]:
+        """Deliveries not yet finished, by status (scraped by /metrics)."""
+        db = ReadSessionLocal()
+        try:
+            rows = (
+                db.query(models.Delivery.status, func.count(models.Delivery.id))
+                .filter(models.Delivery.status.in_(OPEN_STATUSES))
+                .group_by(models.Delivery.status)
+                .all()
+            )
+        finally:
+            db.close()
+        depth = dict.fromkeys(OPEN_STATUSES, 0)
+        depth.update(rows)
+        return depth
+
+    def recover(self, older_than: Optional[float] = None) -> int:
+        """Mark in_progress rows lost with a stopped process as unknown; all of them, or claims older than ``older_than`` seconds."""
+        delivery = models.Delivery
+        db = SessionLocal()
+        try:
+            query = update(delivery).where(delivery.status == "in_progress")
+            if older_than is not None:
+                cutoff = datetime.now(timezone.utc) - timedelta(seconds=older_than)
+                query = query.where(or_(delivery.claimed_at == None, delivery.claimed_at < cutoff))
+            # The provider may have accepted them before the process stopped, so they are not sent again
+            now = datetime.now(timezone.utc)
+            result = db.execute(query.values(
+                status="unknown", claimed_at=None, completed_at=now, last_error="interrupted while sending",
+            ))
+            db.commit()
+            if result.rowcount:
+                logger.warning("dispatch.recovered", deliveries=result.rowcount, status="unknown")
+            return result.rowcount
+        finally:
+            db.close()
+
+    def retry_unknown(self, db: Session, alert_id: int) -> int:
+        """Queue an alert's unknown deliveries to be sent again; the caller has checked they did not arrive."""
+        delivery = models.Delivery
+        result = db.execute(
+            update(delivery)
+            .where(delivery.alert_id == alert_id, delivery.status == "unknown")
+            .values(status="pending", completed_at=None, next_attempt_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return result.rowcount
+
+    def _claim(self, limit: int) -> List[Job]:
+        delivery = models.Delivery
+        now = datetime.now(timezone.utc)
+        db = SessionLocal()
+        try:
+            # The text comes from the alert's shared message row; older rows carry their own copy.
+            # Other dispatcher processes skip the rows locked here instead of waiting for them.
+            rows = (
+                db.query(
+                    delivery.id,
+                    delivery.alert_id,
+                    delivery.channel,
+                    delivery.recipient,
+                    func.coalesce(models.AlertMessage.subject, delivery.subject),
+                    func.coalesce(models.AlertMessage.body, delivery.message),
+                    delivery.idempotency_key,
+                    delivery.attempts,
+                )
+                .outerjoin(models.AlertMessage, models.AlertMessage.id == delivery.message_id)
+                .filter(or_(
+                    delivery.status == "pending",
+                    and_(delivery.status == "retry", delivery.next_attempt_at <= now),
+                ))
+                .order_by(delivery.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True, of=delivery)
+                .all()
+            )
+            if not rows:
+                return []
+            db.execute(
+                update(delivery)
+                .where(delivery.id.in_([row[0] for row in rows]))
+                .where(delivery.status.in_(("pending", "retry")))
+                .values(status="in_progress", attempts=delivery.attempts + 1, claimed_at=now)
+            )
+            db.commit()
+            return [Job(*row[:7], attempts=row[7] + 1) for row in rows]
+        finally:
+            db.close()
+
+    async def _run(self):
+        # Keep up to two rounds of work claimed so the semaphore never starves
+        max_claimed = self.concurrency * 2
+        while True:
+            room = min(self.batch_size, max_claimed - self._claimed)
+            batch = []
+            if room > 0:
+                try:
+                    batch = await asyncio.to_thread(self._claim, room)
+                except Exception as e:
+                    logger.error("dispatch.claim_failed", error=str(e))
+            if not batch:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+            self._claimed += len(batch)
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[Job]):
+        try:
+            results = await asyncio.gather(*(self._deliver(job) for job in batch))
+            rows = await self._record(batch, results)
+            self._publish_progress(batch, rows)
+        except Exception as e:
+            logger.error("dispatch.batch_failed", deliveries=len(batch), error=str(e))
+        finally:
+            self._claimed -= len(batch)
+            self._wake.set()
+
+    async def _deliver(self, job: Job) -> Result:
+        async with self._slots:
+            started = time.monotonic()
+            try:
+                provider_id = await self._send(job)
+                error, retryable, uncertain = None, True, False
+            except Exception as e:
+                logger.warning("dispatch.send_failed", sample=True, delivery=job.id, channel=job.channel, error=str(e))
+                provider_id, error = None, str(e)[:500] or type(e).__name__
+                retryable = getattr(e, "retryable", True)
+                uncertain = getattr(e, "uncertain", False)
+            elapsed = time.monotonic() - started
+            SEND_LATENCY.observe(elapsed, job.channel, "error" if error else "ok")
+            return Result(job.id, provider_id, error, int(elapsed * 1000), retryable, uncertain)
+
+    async def _send(self, job: Job) -> str:
+        """Send one delivery and return the provider's message id; raises on failure."""
+        subject = job.subject or ""
+        if self._executor is not None:
+            if job.channel == "sms":
+                call = (notifier.deliver_sms, job.recipient, job.message)
+            else:
+                call = (notifier.deliver_email, job.recipient, subject, job.message, job.idempotency_key)
+            return await self._loop.run_in_executor(self._executor, *call)
+        if job.channel == "sms":
+            return await async_notifier.deliver_sms(job.recipient, job.message)
+        return await async_notifier.deliver_email(job.recipient, subject, job.message, job.idempotency_key)
+
+    async def _record(self, batch: List[Job], results: List[Result]) -> List[Dict]:
+        """Write a batch's results, retrying until the database takes them.
+
+        The sends are done, so the rows must not be claimed again. They stay
+        in_progress until the write succeeds; if the process stops first,
+        recovery marks them unknown.
+        """
+        failures = 0
+        while True:
+            try:
+                return await asyncio.to_thread(self._finish, batch, results)
+            except Exception as e:
+                failures += 1
+                logger.error("dispatch.finish_failed", deliveries=len(batch), attempt=failures, error=str(e))
+                await asyncio.sleep(min(self.poll_interval * 2 ** failures, 60.0))
+
+    def _outcome(self, job: Job, result: Result, now: datetime) -> Dict:
+        row = {"id": job.id, "provider_id": result.provider_id, "latency_ms": result.latency_ms, "last_error": result.error}
+        if result.error is None:
+            row.update(status="sent", completed_at=now, next_attempt_at=None)
+        elif result.uncertain:
+            # It may have gone out; sending it again could alert the recipient twice
+            row.update(status="unknown", completed_at=now, next_attempt_at=None)
+        elif result.retryable and job.attempts < self.max_attempts:
+            delay = retry_delay(job.attempts, self.retry_base, self.retry_cap)
+            row.update(status="retry", completed_at=None, next_attempt_at=now + timedelta(seconds=delay))
+        else:
+            row.update(status="failed", completed_at=now, next_attempt_at=None)
+        return row
+
+    def _finish(self, batch: List[Job], results: List[Result]) -> List[Dict]:
+        """Record a batch's results in one bulk update; returns the rows written."""
+        now = datetime.now(timezone.utc)
+        rows = [self._outcome(job, result, now) for job, result in zip(batch, results)]
+        delivered = {job.alert_id for job, row in zip(batch, rows) if row["status"] == "sent"}
+        db = SessionLocal()
+        try:
+            db.execute(update(models.Delivery), rows)
+            if delivered:
+                # The first successful delivery marks the alert as sent
+                marked = db.execute(
+                    update(models.AlertLog)
+                    .where(models.AlertLog.id.in_(delivered), models.AlertLog.sent == False)
+                    .values(sent=True)
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                counters.add(db, {ALERTS_SENT: marked})
+            db.commit()
+        finally:
+            db.close()
+        return rows
+
+    def _publish_progress(self, batch: List[Job], rows: List[Dict]):
+        # Per-alert increments for /api/stream; clients fetch the full status when they need it
+        changes: Dict[int, Dict[str, int]] = {}
+        for job, row in zip(batch, rows):
+            counts = changes.setdefault(job.alert_id, {"sent": 0, "failed": 0, "retry": 0, "unknown": 0})
+            counts[row["status"]] += 1
+        for alert_id, counts in changes.items():
+            bus.publish("delivery", {"alert_id": alert_id, **counts})
+
+
+dispatcher = Dispatcher(
+    concurrency=settings.dispatch_concurrency,
+    batch_size=settings.dispatch_batch_size,
+    poll_interval=settings.dispatch_poll_interval,
+    backend=settings.notifier_backend,
+    thread_workers=settings.dispatch_workers,
+    max_attempts=settings.delivery_max_attempts,
+    retry_base=settings.delivery_retry_base,
+    retry_cap=settings.delivery_retry_cap,
+    shared=settings.shared_state,
+)
@@ -0,0 +1,161 @@
+"""
+In-process pub/sub bus behind the /api/stream Server-Sent Events endpoint.
+
+Write paths call ``bus.publish(type, data)`` after they commit. That is safe
+from the request threadpool: the event is handed to the event loop and
+encoded once as an SSE frame, and the same frame is appended to every
+interested subscriber. An idle subscriber is only a deque and an
+asyncio.Event, so thousands of open dashboards cost little. Each queue is
+bounded. A client that reads too slowly loses its oldest frames and is told
+how many it missed, so it can refetch instead of holding up everyone else.
+Bursty event types such as ``stats`` are coalesced to the latest value.
+
+In multi-process mode a subscriber may be connected to a different worker
+than the one that published. ``publish`` then only appends the event to an
+outbox. The coordinator in shared.py writes the outbox to the
+``stream_events`` table and hands every process the new rows through
+``deliver``. ``stats`` stays local, because each process refreshes its
+counters from the database and publishes its own.
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .config import settings
+
+EVENT_TYPES = ("alert", "stats", "delivery", "contact")
+
+# Types where only the latest value matters; flushed at most this often (seconds)
+COALESCE = {"stats": 0.25}
+
+# Types never relayed between processes
+LOCAL_TYPES = ("stats",)
+
+
+def frame(event_type: str, data, event_id: Optional[int] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class Subscription:
+    def __init__(self, types: Set[str], maxsize: int):
+        self.types = types
+        self._frames = deque(maxlen=maxsize)
+        self._ready = asyncio.Event()
+        self.dropped = 0
+
+    def push(self, data: str):
+        if len(self._frames) == self._frames.maxlen:
+            self.dropped += 1
+        self._frames.append(data)
+        self._ready.set()
+
+    async def next(self, timeout: float) -> List[str]:
+        """Frames queued since the last call; empty after ``timeout`` seconds of silence."""
+        if not self._frames:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._ready.clear()
+        frames = list(self._frames)
+        self._frames.clear()
+        if self.dropped:
+            frames.insert(0, frame("dropped", {"count": self.dropped}))
+            self.dropped = 0
+        return frames
+
+
+class EventBus:
+    def __init__(self, queue_size: int, max_subscribers: int):
+        self.queue_size = max(1, queue_size)
+        self.max_subscribers = max_subscribers
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Set[Subscription] = set()
+        self._next_id = 0
+        self._published = 0
+        self._pending: Dict[str, object] = {}
+        self._outbox: Optional[List[Tuple[str, object]]] = None
+        self._outbox_lock = threading.Lock()
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def use_outbox(self):
+        """Relay published events through the coordinator instead of dispatching them here."""
+        self._outbox = []
+
+    def drain(self) -> List[Tuple[str, object]]:
+        """Events published since the last call, oldest first."""
+        with self._outbox_lock:
+            events, self._outbox = self._outbox or [], []
+        return events
+
+    def subscribe(self, types: Iterable[str]) -> Subscription:
+        if len(self._subscribers) >= self.max_subscribers:
+            raise OverflowError("Too many stream subscribers")
+        subscription = Subscription(set(types), self.queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def publish(self, event_type: str, data):
+        """Queue an event for every subscriber of its type. Callable from any thread."""
+        if self._outbox is not None and event_type not in LOCAL_TYPES:
+            with self._outbox_lock:
+                self._outbox.append((event_type, data))
+            return
+        self.deliver(event_type, data)
+
+    def deliver(self, event_type: str, data):
+        """Hand an event to this process's subscribers."""
+        loop = self._loop
+        if loop is None or not self._subscribers or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._dispatch(event_type, data)
+        else:
+            loop.call_soon_threadsafe(self._dispatch, event_type, data)
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self._published,
+            "queue_size": self.queue_size,
+        }
+
+    def _dispatch(self, event_type: str, data):
+        delay = COALESCE.get(event_type)
+        if delay is None:
+            self._fanout(event_type, data)
+            return
+        first = event_type not in self._pending
+        self._pending[event_type] = data
+        if first:
+            self._loop.call_later(delay, self._flush, event_type)
+
+    def _flush(self, event_type: str):
+        data = self._pending.pop(event_type, None)
+        if data is not None:
+            self._fanout(event_type, data)
+
+    def _fanout(self, event_type: str, data):
+        self._next_id += 1
+        self._published += 1
+        encoded = None
+        for subscription in self._subscribers:
+            if event_type in subscription.types:
+                if encoded is None:
+                    encoded = frame(event_type, data, self._next_id)
+                subscription.push(encoded)
+
+
+bus = EventBus(settings.stream_queue_size, settings.stream_max_subscribers)
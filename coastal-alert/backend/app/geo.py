@@ -0,0 +1,297 @@
+"""
+Geographic alert targeting: a radius or a polygon instead of region names.
+
+Contacts with coordinates also store a geohash, a base-32 string whose
+prefixes name ever smaller grid cells. Every contact inside a cell shares
+that cell's prefix. An alert area is resolved in two steps:
+
+1. ``cover`` picks the finest precision at which at most ``MAX_COVER_CELLS``
+   cells cover the area's bounding box, and lists those cells. Each one is a
+   prefix scan: a range on the ``contacts.geohash`` index, or a bisect over
+   the sorted cell keys of the in-memory recipient index.
+2. The candidates are tested exactly with numpy, ``BATCH_SIZE`` points at a
+   time: haversine distance for a radius, ray casting against every ring for
+   a polygon. Cells that lie wholly inside a radius skip the test.
+
+Polygons are GeoJSON ``Polygon`` or ``MultiPolygon`` geometries with
+[longitude, latitude] positions, and may have holes. Edges are straight in
+longitude/latitude, which is close enough at the size of a storm footprint.
+Areas that cross the antimeridian are not supported. Contacts without
+coordinates are never matched by an area. numpy is imported by the first
+area alert rather than with the app, to keep start-up fast.
+"""
+import hashlib
+import math
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from . import models
+
+if TYPE_CHECKING:
+    import numpy as np
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+PRECISION = 9  # stored on contacts: cells of about 5 x 5 m
+MAX_COVER_CELLS = 32
+BATCH_SIZE = 65536
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+Rect = Tuple[float, float, float, float]  # south, west, north, east
+
+
+def encode(latitude: float, longitude: float, precision: int = PRECISION) -> str:
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    chars = []
+    value = bits = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                value, lon_lo = value * 2 + 1, mid
+            else:
+                value, lon_hi = value * 2, mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                value, lat_lo = value * 2 + 1, mid
+            else:
+                value, lat_hi = value * 2, mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            value = bits = 0
+    return "".join(chars)
+
+
+def point_hash(latitude: Optional[float], longitude: Optional[float]) -> Optional[str]:
+    if latitude is None or longitude is None:
+        return None
+    return encode(latitude, longitude)
+
+
+def assign(contact: models.Contact):
+    """Bring a contact's geohash in line with its coordinates; flushed with the contact."""
+    contact.geohash = point_hash(contact.latitude, contact.longitude)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(height, width) in degrees of a cell at this precision."""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def cover(area: "Area", max_precision: int = PRECISION) -> List[Tuple[str, Rect]]:
+    """The geohash cells, with their bounds, that cover the area's bounding box."""
+    south, west, north, east = area.bbox
+    for precision in range(max_precision, 0, -1):
+        height, width = cell_size(precision)
+        rows = range(int((south + 90) // height), int(min(north + 90, 180 - 1e-9) // height) + 1)
+        cols = range(int((west + 180) // width), int(min(east + 180, 360 - 1e-9) // width) + 1)
+        if len(rows) * len(cols) <= MAX_COVER_CELLS or precision == 1:
+            break
+    cells = []
+    for row in rows:
+        cell_south = row * height - 90
+        for col in cols:
+            cell_west = col * width - 180
+            rect = (cell_south, cell_west, cell_south + height, cell_west + width)
+            if area.intersects_rect(rect):
+                cells.append((encode(cell_south + height / 2, cell_west + width / 2, precision), rect))
+    return cells
+
+
+class Area:
+    key: str
+    label: str
+    bbox: Rect
+
+    def contains(self, lats: "np.ndarray", lons: "np.ndarray") -> "np.ndarray":
+        raise NotImplementedError
+
+    def covers_rect(self, rect: Rect) -> bool:
+        """True only if every point of the rectangle is inside; may be conservatively False."""
+        return False
+
+    def intersects_rect(self, rect: Rect) -> bool:
+        south, west, north, east = self.bbox
+        return rect[0] <= north and rect[2] >= south and rect[1] <= east and rect[3] >= west
+
+
+class Circle(Area):
+    def __init__(self, latitude: float, longitude: float, radius_km: float):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.radius_km = radius_km
+        dlat = radius_km / KM_PER_DEGREE
+        widest = min(abs(latitude) + dlat, 89.9)
+        dlon = min(180.0, dlat / math.cos(math.radians(widest)))
+        self.bbox = (max(-90.0, latitude - dlat), max(-180.0, longitude - dlon),
+                     min(90.0, latitude + dlat), min(180.0, longitude + dlon))
+        self.key = f"radius:{latitude:.5f},{longitude:.5f},{radius_km:g}"
+        self.label = f"{radius_km:g} km around {latitude:.4f}, {longitude:.4f}"
+
+    def contains(self, lats, lons):
+        import numpy as np
+
+        lat1, lon1 = math.radians(self.latitude), math.radians(self.longitude)
+        lat2, lon2 = np.radians(lats), np.radians(lons)
+        a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0))) <= self.radius_km
+
+    def intersects_rect(self, rect):
+        import numpy as np
+
+        # Distance from the centre to the nearest point of the rectangle
+        south, west, north, east = rect
+        nearest_lat = min(max(self.latitude, south), north)
+        nearest_lon = min(max(self.longitude, west), east)
+        return bool(self.contains(np.array([nearest_lat]), np.array([nearest_lon]))[0])
+
+    def covers_rect(self, rect):
+        import numpy as np
+
+        # A circle is convex, so it holds the rectangle if it holds all four corners
+        south, west, north, east = rect
+        corners = self.contains(np.array([south, south, north, north]), np.array([west, east, west, east]))
+        return bool(corners.all())
+
+
+class Polygons(Area):
+    def __init__(self, polygons: Sequence[Sequence["np.ndarray"]]):
+        import numpy as np
+
+        # Each polygon is a list of rings (outer first, then holes), each an (n, 2) array of lon, lat
+        self.polygons = polygons
+        outer = np.concatenate([rings[0] for rings in polygons])
+        self.bbox = (float(outer[:, 1].min()), float(outer[:, 0].min()), float(outer[:, 1].max()), float(outer[:, 0].max()))
+        digest = hashlib.sha1(b"".join(ring.tobytes() for rings in polygons for ring in rings)).hexdigest()
+        self.key = f"polygon:{digest[:12]}"
+        self.label = "the marked area"
+
+    def contains(self, lats, lons):
+        import numpy as np
+
+        south, west, north, east = self.bbox
+        result = np.zeros(len(lats), dtype=bool)
+        candidates = np.flatnonzero((lats >= south) & (lats <= north) & (lons >= west) & (lons <= east))
+        if not len(candidates):
+            return result
+        x, y = lons[candidates], lats[candidates]
+        inside = np.zeros(len(candidates), dtype=bool)
+        for rings in self.polygons:
+            hit = _in_ring(rings[0], x, y)
+            for hole in rings[1:]:
+                hit &= ~_in_ring(hole, x, y)
+            inside |= hit
+        result[candidates] = inside
+        return result
+
+
+def _in_ring(ring: "np.ndarray", x: "np.ndarray", y: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+
+    # Even-odd ray casting: count the edges crossed by a ray running east from each point
+    inside = np.zeros(len(x), dtype=bool)
+    xs, ys = ring[:, 0], ring[:, 1]
+    for x1, y1, x2, y2 in zip(xs, ys, np.roll(xs, -1), np.roll(ys, -1)):
+        if y1 == y2:
+            continue
+        straddles = (y1 > y) != (y2 > y)
+        inside ^= straddles & (x < x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+    return inside
+
+
+def parse_geometry(geometry: dict) -> Polygons:
+    """A GeoJSON Polygon or MultiPolygon geometry as Polygons; raises ValueError if malformed."""
+    import numpy as np
+
+    kind = geometry.get("type")
+    if kind == "Polygon":
+        polygons = [geometry.get("coordinates")]
+    elif kind == "MultiPolygon":
+        polygons = geometry.get("coordinates")
+    else:
+        raise ValueError("type must be Polygon or MultiPolygon")
+    if not isinstance(polygons, list) or not polygons:
+        raise ValueError("coordinates must be a non-empty list")
+    parsed = []
+    for rings in polygons:
+        if not isinstance(rings, list) or not rings:
+            raise ValueError("each polygon needs at least an outer ring")
+        parsed_rings = []
+        for ring in rings:
+            try:
+                points = np.asarray(ring, dtype=float)
+            except (TypeError, ValueError):
+                raise ValueError("positions must be [longitude, latitude] pairs")
+            if points.ndim != 2 or points.shape[1] < 2 or len(points) < 4:
+                raise ValueError("each ring needs at least four [longitude, latitude] positions")
+            points = points[:, :2]
+            if (np.abs(points[:, 0]) > 180).any() or (np.abs(points[:, 1]) > 90).any():
+                raise ValueError("positions must be [longitude, latitude] within range")
+            parsed_rings.append(points)
+        parsed.append(parsed_rings)
+    return Polygons(parsed)
+
+
+def area_from(alert) -> Optional[Area]:
+    """The target area of an AlertIn, if it has one."""
+    if alert.radius is not None:
+        return Circle(alert.radius.latitude, alert.radius.longitude, alert.radius.radius_km)
+    if alert.polygon is not None:
+        return parse_geometry({"type": alert.polygon.type, "coordinates": alert.polygon.coordinates})
+    return None
+
+
+def select(area: Area, points: Sequence[Tuple[float, float]]) -> "np.ndarray":
+    """Positions of the (latitude, longitude) points that lie inside the area."""
+    import numpy as np
+
+    if not len(points):
+        return np.empty(0, dtype=np.intp)
+    coords = np.asarray(points, dtype=float)
+    matches = []
+    for start in range(0, len(coords), BATCH_SIZE):
+        block = coords[start:start + BATCH_SIZE]
+        matches.append(np.flatnonzero(area.contains(block[:, 0], block[:, 1])) + start)
+    return np.concatenate(matches)
+
+
+def contacts_in_area(db: Session, area: Area) -> list:
+    """Contacts inside the area, by geohash range scans; the fallback when the recipient index is not loaded."""
+    contact = models.Contact
+    cells = cover(area)
+    if not cells:
+        return []
+    rows = (
+        db.query(contact.id, contact.phone, contact.email, contact.latitude, contact.longitude)
+        .filter(or_(*(and_(contact.geohash >= prefix, contact.geohash < prefix + "{") for prefix, _ in cells)))
+        .all()
+    )
+    return [rows[i] for i in select(area, [(row.latitude, row.longitude) for row in rows])]
+
+
+def backfill(db: Session, batch_size: int = 1000) -> int:
+    """Geohash contacts that have coordinates but no hash yet."""
+    contact = models.Contact
+    updated = 0
+    while True:
+        rows = (
+            db.query(contact.id, contact.latitude, contact.longitude)
+            .filter(contact.geohash == None, contact.latitude != None, contact.longitude != None)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        db.bulk_update_mappings(contact, [
+            {"id": contact_id, "geohash": encode(latitude, longitude)} for contact_id, latitude, longitude in rows
+        ])
+        db.commit()
+        updated += len(rows)
+    return updated
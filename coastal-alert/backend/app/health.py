@@ -0,0 +1,80 @@
+"""
+Liveness and readiness probes.
+
+``/api/health/live`` answers as soon as the process serves HTTP. Restarts
+should key on it. ``/api/health/ready`` answers 503 until every start-up step
+below has finished and both database pools answer a ping, and load balancers
+should route traffic on it. The slow steps (loading the recipient index,
+connecting to the SMS and email providers, starting the password-check
+processes) run in a background task once the server is up. A restarted
+container is therefore live within a second and ready as soon as its caches
+are warm.
+
+A step that fails is logged and still counts as finished. The app works
+without it: the recipient index falls back to the database, a provider that
+cannot be reached is retried by the dispatcher, and the password pool starts
+on the first login.
+
+The import time of the app (measured from the top of main.py) and the time
+from start-up to ready are reported here, and in /metrics as
+``app_startup_seconds{phase}``.
+"""
+import time
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+
+STEPS = ("schema", "rules", "counters", "recipient_index", "providers", "password_pool")
+
+
+class Readiness:
+    def __init__(self, steps: Iterable[str]):
+        self.steps = tuple(steps)
+        self.import_seconds: Optional[float] = None
+        self._started = time.monotonic()
+        self._finished: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+        self._ready_at: Optional[float] = None
+
+    def starting(self):
+        """Mark the start of start-up; durations are measured from here."""
+        self._started = time.monotonic()
+
+    def done(self, step: str, error: Optional[str] = None):
+        self._finished[step] = round(time.monotonic() - self._started, 3)
+        if error:
+            self._errors[step] = error
+        if self._ready_at is None and not self.pending():
+            self._ready_at = time.monotonic() - self._started
+
+    def pending(self) -> List[str]:
+        return [step for step in self.steps if step not in self._finished]
+
+    def check(self, engines) -> Dict:
+        """The readiness report; ``ready`` also needs every engine to answer."""
+        pending = self.pending()
+        unreachable = []
+        for name, engine in engines:
+            try:
+                with engine.connect() as connection:
+                    connection.execute(text("SELECT 1"))
+            except Exception as e:
+                unreachable.append(f"{name}: {e}")
+        return {
+            "ready": not pending and not unreachable,
+            "pending": pending,
+            "database_errors": unreachable,
+            "step_errors": self._errors,
+            "finished_after_seconds": self._finished,
+        }
+
+    def timings(self) -> Dict[str, float]:
+        phases = {}
+        if self.import_seconds is not None:
+            phases["import"] = round(self.import_seconds, 3)
+        if self._ready_at is not None:
+            phases["ready"] = round(self._ready_at, 3)
+        return phases
+
+
+readiness = Readiness(STEPS)
@@ -0,0 +1,91 @@
+"""
+Structured, sampled logging.
+
+``get_logger("notifier").info("sms.sent", to=to, sid=sid)`` logs an event name
+plus key/value fields. The fields are rendered as ``key=value`` text, or as
+one JSON object per line when ``LOG_FORMAT=json``. Events that fire once per
+message on the hot paths pass ``sample=True``, and only a ``LOG_SAMPLE_RATE``
+fraction of them is written. Warnings are sampled only when the caller asks,
+for failures that come once per message: a provider outage fails every send.
+Errors are never sampled.
+"""
+import json
+import logging
+import random
+import sys
+from datetime import datetime, timezone
+
+from .config import settings
+
+ROOT = "coastal_alert"
+
+
+class StructuredFormatter(logging.Formatter):
+    def __init__(self, fmt: str):
+        super().__init__()
+        self.json = fmt == "json"
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", {})
+        if self.json:
+            entry = {
+                "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+                "level": record.levelname.lower(),
+                "logger": record.name[len(ROOT) + 1:] or record.name,
+                "event": record.getMessage(),
+                **fields,
+            }
+            return json.dumps(entry, default=str)
+        parts = [
+            self.formatTime(record, "%Y-%m-%d %H:%M:%S"),
+            record.levelname,
+            record.name[len(ROOT) + 1:] or record.name,
+            record.getMessage(),
+        ]
+        parts.extend(f"{key}={_text(value)}" for key, value in fields.items())
+        return " ".join(parts)
+
+
+def _text(value) -> str:
+    value = value if isinstance(value, str) else str(value)
+    if not value or any(ch.isspace() or ch in '"=' for ch in value):
+        return json.dumps(value)
+    return value
+
+
+class EventLogger:
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(f"{ROOT}.{name}")
+
+    def debug(self, event: str, sample: bool = False, **fields):
+        self._log(logging.DEBUG, event, fields, sample)
+
+    def info(self, event: str, sample: bool = False, **fields):
+        self._log(logging.INFO, event, fields, sample)
+
+    def warning(self, event: str, sample: bool = False, **fields):
+        self._log(logging.WARNING, event, fields, sample)
+
+    def error(self, event: str, **fields):
+        self._log(logging.ERROR, event, fields, False)
+
+    def _log(self, level: int, event: str, fields, sample: bool):
+        if sample and settings.log_sample_rate < 1.0 and random.random() >= settings.log_sample_rate:
+            return
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, event, extra={"fields": fields})
+
+
+def get_logger(name: str) -> EventLogger:
+    return EventLogger(name)
+
+
+def configure_logging():
+    logger = logging.getLogger(ROOT)
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(StructuredFormatter(settings.log_format))
+    logger.addHandler(handler)
+    logger.setLevel(settings.log_level.upper())
+    logger.propagate = False
@@ -0,0 +1,257 @@
+"""
+Prometheus-style metrics, served at /metrics in the text exposition format.
+
+The instruments are small in-process counters and histograms, so there is no
+client library to install. With ``METRICS_ENABLED`` off (the default) every
+``observe``/``inc`` returns after one flag check, and ``time()`` hands back a
+shared no-op context. ``install`` then adds neither the request middleware
+nor the SQLAlchemy query hook, and /metrics answers 404. Gauges such as the
+delivery queue depth are computed from a callback only when /metrics is
+scraped.
+
+What is measured:
+
+- ``http_request_duration_seconds{method,route,status}``: per route template
+- ``http_request_db_queries{route}``: SQL statements run while serving a request
+- ``alert_stage_duration_seconds{stage}``: where trigger_alert spends its time
+- ``alert_fanout_deliveries``: deliveries queued per alert
+- ``notification_send_duration_seconds{channel,outcome}``: provider latency
+- ``dispatch_queue_depth{status}``: deliveries waiting, in flight or due for retry
+- ``auth_token_cache_total{result}``: bearer tokens found in the verified-token cache (hit) or checked in full (miss)
+- ``app_startup_seconds{phase}``: how long the last start took to import and to become ready
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+from .config import settings
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+FANOUT_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+INF_LABEL = 'le="+Inf"'
+
+# SQL statements run by the current request; None outside a request
+_request_queries: ContextVar[Optional[List[int]]] = ContextVar("request_queries", default=None)
+
+
+class Registry:
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._metrics: List["Metric"] = []
+
+    def register(self, metric: "Metric") -> "Metric":
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, registry: Registry, name: str, help: str, labels: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _label_text(self, values: Tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> Iterable[str]:
+        return ()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._label_text(labels)} {_number(value)}" for labels, value in items]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, registry: Registry, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(registry, name, help, labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, list] = {}  # labels -> [count per bucket..., sum, count]
+
+    def observe(self, value: float, *labels):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, *labels):
+        """Context manager that observes the seconds spent inside it."""
+        if not self.registry.enabled:
+            return _NOOP
+        return self._timer(labels)
+
+    @contextmanager
+    def _timer(self, labels: Tuple):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        lines = []
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{self._label_text(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{self._label_text(labels, INF_LABEL)} {series[-1]}")
+            lines.append(f"{self.name}_sum{self._label_text(labels)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{self._label_text(labels)} {series[-1]}")
+        return lines
+
+
+class Gauge(Metric):
+    """A value read from a callback at scrape time: a number, or {label values: number}."""
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._function: Optional[Callable] = None
+
+    def set_function(self, function: Callable):
+        self._function = function
+
+    def samples(self):
+        if self._function is None:
+            return []
+        try:
+            value = self._function()
+        except Exception:
+            return []
+        if not isinstance(value, dict):
+            return [f"{self.name} {_number(value)}"]
+        return [
+            f"{self.name}{self._label_text(labels if isinstance(labels, tuple) else (labels,))} {_number(v)}"
+            for labels, v in value.items()
+        ]
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+registry = Registry(settings.metrics_enabled)
+
+HTTP_LATENCY = Histogram(registry, "http_request_duration_seconds", "HTTP request latency by route template.",
+                         ("method", "route", "status"))
+DB_QUERIES = Histogram(registry, "http_request_db_queries", "SQL statements executed per HTTP request.",
+                       ("route",), COUNT_BUCKETS)
+ALERT_STAGE = Histogram(registry, "alert_stage_duration_seconds", "Time spent in each stage of trigger_alert.",
+                        ("stage",))
+FANOUT_SIZE = Histogram(registry, "alert_fanout_deliveries", "Deliveries queued per alert.", (), FANOUT_BUCKETS)
+SEND_LATENCY = Histogram(registry, "notification_send_duration_seconds", "Provider send latency per channel.",
+                         ("channel", "outcome"))
+QUEUE_DEPTH = Gauge(registry, "dispatch_queue_depth", "Deliveries by queue status.", ("status",))
+AUTH_TOKEN_CACHE = Counter(registry, "auth_token_cache_total", "Bearer token lookups by verified-token cache result.",
+                           ("result",))
+STARTUP_SECONDS = Gauge(registry, "app_startup_seconds", "Import time of the app, and seconds from start-up to ready.",
+                        ("phase",))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and SQL statement count per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        queries = [0]
+        token = _request_queries.set(queries)
+        status = [500]
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _request_queries.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_LATENCY.observe(time.perf_counter() - started, scope["method"], route, str(status[0]))
+            DB_QUERIES.observe(queries[0], route)
+
+
+def _count_query(*args):
+    queries = _request_queries.get()
+    if queries is not None:
+        queries[0] += 1
+
+
+def install(app, engines: Iterable):
+    """Attach the middleware and query hook; does nothing when metrics are disabled."""
+    if not registry.enabled:
+        return
+    app.add_middleware(MetricsMiddleware)
+    for engine in set(engines):
+        event.listen(engine, "before_cursor_execute", _count_query)
@@ -0,0 +1,178 @@
+"""
+Schema migrations, checked on every start.
+
+The schema is managed by Alembic (``backend/alembic``). Start-up reads the
+stamp in ``alembic_version`` and compares it with the newest revision file.
+A database that is already current therefore costs one query, and Alembic
+itself is never imported. Otherwise the pending revisions are applied with
+``upgrade head``, holding the write lock so that concurrent workers apply
+them once.
+
+Databases created by ``create_all`` before the switch have tables but no
+stamp. They are adopted once: the repair steps below add the missing
+tables, columns and indexes and backfill data, and the result is stamped at
+the head. Run ``python -m app.migrations`` to apply everything by hand, or
+use the ``alembic`` command from the backend directory.
+"""
+import os
+from typing import Optional
+
+from sqlalchemy import inspect, text
+
+from .database import Base, SessionLocal
+from . import geo, regions, rules
+from .logs import configure_logging, get_logger
+
+logger = get_logger("migrations")
+
+ALEMBIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic")
+VERSIONS_DIR = os.path.join(ALEMBIC_DIR, "versions")
+# Any key works; it only has to be the same in every process
+PG_LOCK_KEY = 7244105
+
+
+def head_revision() -> str:
+    # Revision ids are zero-padded sequence numbers that prefix the file names (see alembic.ini)
+    return max(name.split("_", 1)[0] for name in os.listdir(VERSIONS_DIR) if name.endswith(".py"))
+
+
+def current_revision(db) -> Optional[str]:
+    if not inspect(db.connection()).has_table("alembic_version"):
+        return None
+    return db.execute(text("SELECT version_num FROM alembic_version")).scalar()
+
+
+def create_missing_tables(db) -> int:
+    connection = db.connection()
+    inspector = inspect(connection)
+    missing = [t for t in Base.metadata.sorted_tables if not inspector.has_table(t.name)]
+    Base.metadata.create_all(bind=connection, tables=missing)
+    db.commit()
+    return len(missing)
+
+
+def add_missing_columns(db) -> int:
+    # create_all does not ALTER existing tables; new columns are nullable so this is safe
+    bind = db.get_bind()
+    # Inspect on the session's own connection: after the first ALTER it holds the SQLite
+    # write lock, and a second connection would wait on it until the busy timeout
+    inspector = inspect(db.connection())
+    added = 0
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {col["name"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_type = column.type.compile(dialect=bind.dialect)
+                db.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                added += 1
+    db.commit()
+    return added
+
+
+def create_missing_indexes(db) -> int:
+    # create_all skips new indexes on tables that already exist
+    connection = db.connection()
+    inspector = inspect(connection)
+    created = 0
+    for table in Base.metadata.sorted_tables:
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(connection)
+                created += 1
+    db.commit()
+    return created
+
+
+def backfill_region_tokens(db) -> int:
+    return regions.backfill(db)
+
+
+def backfill_contact_geohashes(db) -> int:
+    return geo.backfill(db)
+
+
+def backfill_alert_severity(db) -> int:
+    result = db.execute(text(
+        "UPDATE alerts SET severity = CASE "
+        "WHEN value > threshold * 1.5 THEN 'CRITICAL' "
+        "WHEN value > threshold THEN 'HIGH' ELSE 'NORMAL' END "
+        "WHERE severity IS NULL"
+    ))
+    db.commit()
+    return result.rowcount
+
+
+def backfill_alert_suppressed(db) -> int:
+    result = db.execute(text("UPDATE alerts SET suppressed = :no WHERE suppressed IS NULL"), {"no": False})
+    db.commit()
+    return result.rowcount
+
+
+def seed_alert_rules(db) -> int:
+    return rules.seed_default_rules(db)
+
+
+# Brings a pre-Alembic database up to the current models
+LEGACY_STEPS = [
+    ("tables", create_missing_tables),
+    ("columns", add_missing_columns),
+    ("indexes", create_missing_indexes),
+    ("alert severity", backfill_alert_severity),
+    ("alert suppressed flag", backfill_alert_suppressed),
+    ("region tokens", backfill_region_tokens),
+    ("contact geohashes", backfill_contact_geohashes),
+    ("default alert rules", seed_alert_rules),
+]
+
+
+def upgrade(db):
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config()
+    config.set_main_option("script_location", ALEMBIC_DIR)
+    config.attributes["connection"] = db.connection()
+    command.upgrade(config, "head")
+    db.commit()
+
+
+def stamp(db, revision: str):
+    db.execute(text("CREATE TABLE IF NOT EXISTS alembic_version (version_num VARCHAR(32) NOT NULL PRIMARY KEY)"))
+    db.execute(text("DELETE FROM alembic_version"))
+    db.execute(text("INSERT INTO alembic_version (version_num) VALUES (:revision)"), {"revision": revision})
+    db.commit()
+
+
+def run_migrations() -> Optional[str]:
+    """Bring the schema to the head revision; returns the revision it started from."""
+    head = head_revision()
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            # SQLite's BEGIN IMMEDIATE already serialises this; PostgreSQL needs a lock of its own
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PG_LOCK_KEY})
+        current = current_revision(db)
+        if current == head:
+            db.rollback()
+            return current
+        if current is None and inspect(db.connection()).has_table("contacts"):
+            for name, step in LEGACY_STEPS:
+                changed = step(db)
+                if changed:
+                    logger.info("migrations.legacy_step", step=name, changes=changed)
+            stamp(db, head)
+            logger.info("migrations.adopted", revision=head)
+        else:
+            upgrade(db)
+            logger.info("migrations.upgraded", from_revision=current or "empty", to_revision=head)
+        return current
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    configure_logging()
+    run_migrations()
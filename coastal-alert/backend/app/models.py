@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Index, JSON
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from .database import Base
@@ -25,11 +25,32 @@ class Contact(Base):
     phone = Column(String, unique=True, nullable=True, index=True)
     email = Column(String, unique=True, nullable=True, index=True)
     region = Column(String, nullable=True)
+    # Optional position for radius and polygon alerts; geohash is derived from it (see geo.py)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    geohash = Column(String, nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationship to user
     user = relationship("User", back_populates="contacts")
+    # Normalised region tokens used for alert routing (see regions.py)
+    region_tokens = relationship("ContactRegion", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Keyset pagination walks (created_at, id) newest first
+        Index("ix_contacts_created_at_id", "created_at", "id"),
+        # Area alerts scan geohash prefixes
+        Index("ix_contacts_geohash", "geohash"),
+    )
+
+class ContactRegion(Base):
+    __tablename__ = "contact_regions"
+    contact_id = Column(Integer, ForeignKey("contacts.id", ondelete="CASCADE"), primary_key=True)
+    token = Column(String, primary_key=True)
+
+    # Alert routing looks contacts up by token
+    __table_args__ = (Index("ix_contact_regions_token", "token", "contact_id"),)
 
 class AlertLog(Base):
     __tablename__ = "alerts"
@@ -39,4 +60,133 @@ class AlertLog(Base):
     threshold = Column(Float)
     message = Column(String)
     sent = Column(Boolean, default=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    severity = Column(String, nullable=True)
+    # Over threshold, but inside the cooldown of an earlier alert (see suppression.py)
+    suppressed = Column(Boolean, nullable=True, default=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_alerts_created_at_id", "created_at", "id"),
+        # /api/alerts/logs?metric= pages within one metric
+        Index("ix_alerts_metric_created_at_id", "metric", "created_at", "id"),
+    )
+
+class AlertRule(Base):
+    """Severity bands for a metric, optionally limited to one region (see rules.py)."""
+    __tablename__ = "alert_rules"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=True)
+    metric = Column(String, nullable=False, index=True)
+    region = Column(String, nullable=True)  # None applies everywhere
+    bands = Column(JSON, nullable=False)  # [{"severity": "HIGH", "above": 3.5}, ...]
+    conditions = Column(JSON, nullable=True)  # [{"metric": "wave_height", "above": 4.0}, ...]
+    enabled = Column(Boolean, default=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class AlertMessage(Base):
+    """An alert's rendered text for one channel, shared by all of its deliveries (see templates.py)."""
+    __tablename__ = "alert_messages"
+    id = Column(Integer, primary_key=True)
+    alert_id = Column(Integer, ForeignKey("alerts.id"), nullable=False, index=True)
+    channel = Column(String, nullable=False)
+    template_id = Column(String, nullable=False)
+    subject = Column(String, nullable=True)
+    body = Column(String, nullable=False)
+
+class Delivery(Base):
+    """One notification to one contact over one channel, queued by trigger_alert."""
+    __tablename__ = "deliveries"
+    id = Column(Integer, primary_key=True, index=True)
+    alert_id = Column(Integer, ForeignKey("alerts.id"), nullable=False, index=True)
+    contact_id = Column(Integer, nullable=True)
+    channel = Column(String, nullable=False)  # "sms" or "email"
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=True)
+    message = Column(String, nullable=False)  # "" when message_id is set
+    message_id = Column(Integer, ForeignKey("alert_messages.id"), nullable=True)
+    status = Column(String, nullable=False, default="pending")  # pending, in_progress, retry, sent, failed, unknown
+    attempts = Column(Integer, nullable=False, default=0)
+    idempotency_key = Column(String, nullable=True)  # alert:channel:recipient
+    provider_id = Column(String, nullable=True)  # Twilio SID or email Message-ID
+    latency_ms = Column(Integer, nullable=True)  # of the last attempt
+    last_error = Column(String, nullable=True)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=True)  # when a "retry" row is due
+    claimed_at = Column(DateTime(timezone=True), nullable=True)  # when a dispatcher took it in_progress
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+    # The dispatcher claims work with "WHERE status = 'pending' ORDER BY id"
+    __table_args__ = (
+        Index("ix_deliveries_status_id", "status", "id"),
+        Index("ix_deliveries_status_next_attempt", "status", "next_attempt_at"),
+        Index("ux_deliveries_idempotency_key", "idempotency_key", unique=True),
+    )
+
+
+class Reading(Base):
+    """One raw sensor reading (see timeseries.py)."""
+    __tablename__ = "readings"
+    id = Column(Integer, primary_key=True)
+    metric = Column(String, nullable=False)
+    value = Column(Float, nullable=False)
+    location = Column(String, nullable=True)  # normalised, see regions.location_key
+    ts = Column(Integer, nullable=False)  # unix seconds
+    bucket = Column(Integer, nullable=False)  # ts // 86400; retention drops whole days
+
+    __table_args__ = (
+        Index("ix_readings_metric_ts", "metric", "ts"),
+        Index("ix_readings_bucket", "bucket"),
+    )
+
+
+class ReadingRollup(Base):
+    """Aggregate of one metric over one minute or hour."""
+    __tablename__ = "reading_rollups"
+    resolution = Column(Integer, primary_key=True)  # bucket width in seconds
+    metric = Column(String, primary_key=True)
+    start = Column(Integer, primary_key=True)  # unix seconds
+    count = Column(Integer, nullable=False)
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+    sum_value = Column(Float, nullable=False)
+
+
+class StatCounter(Base):
+    """Running totals for /api/stats, maintained by the write paths (see counters.py)."""
+    __tablename__ = "stat_counters"
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+class SharedState(Base):
+    """Named values shared by every process in multi-worker mode (see shared.py)."""
+    __tablename__ = "shared_state"
+    name = Column(String, primary_key=True)  # e.g. "version.rules", "readings.dirty.<minute>"
+    value = Column(Integer, nullable=True)
+
+
+class LeaderLease(Base):
+    """Which process runs the scheduled jobs; taken over once it expires."""
+    __tablename__ = "leader_leases"
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)  # host:pid
+    expires_at = Column(Float, nullable=False)  # unix seconds
+
+
+class SuppressionWindow(Base):
+    """When a (metric, region, severity) last notified, for the shared suppressor."""
+    __tablename__ = "suppression_windows"
+    metric = Column(String, primary_key=True)
+    region = Column(String, primary_key=True)
+    severity = Column(String, primary_key=True)
+    notified_at = Column(Float, nullable=False)  # unix seconds
+
+
+class StreamEvent(Base):
+    """An /api/stream event relayed between processes; pruned after a minute."""
+    __tablename__ = "stream_events"
+    id = Column(Integer, primary_key=True)
+    type = Column(String, nullable=False)
+    data = Column(String, nullable=False)  # JSON text, encoded as events.frame does
+    created_at = Column(Float, nullable=False)  # unix seconds
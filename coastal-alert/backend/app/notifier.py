@@ -1,55 +1,124 @@
+import hashlib
 import os
 import smtplib
+import threading
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import List
+from email.utils import make_msgid
+from typing import List, Optional
 from .config import settings
+from .logs import get_logger
+from .smtp_pool import SMTPPool
+from .sms import SMSError, SMSSender, TwilioClient
+
+logger = get_logger("notifier")
+
+# Provider id recorded for sends that only printed (no Twilio / SMTP configured)
+DEMO_PROVIDER_ID = "demo"
+
+def build_email(to_email: str, subject: str, body: str, idempotency_key: Optional[str] = None):
+    msg = MIMEMultipart()
+    msg['From'] = settings.smtp_from or settings.smtp_username
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    # Every attempt at one delivery carries the same Message-ID, so a repeat can be traced;
+    # mail servers do not drop repeats on it
+    if idempotency_key:
+        msg['Message-ID'] = f"<{hashlib.sha1(idempotency_key.encode()).hexdigest()}@coastal-alert>"
+    else:
+        msg['Message-ID'] = make_msgid(domain="coastal-alert")
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+def _smtp_connect():
+    server = smtplib.SMTP(settings.smtp_host, settings.smtp_port or 587, timeout=settings.smtp_timeout)
+    if settings.smtp_starttls:
+        server.starttls()
+    server.login(settings.smtp_username, settings.smtp_password)
+    return server
 
 class Notifier:
-    def send_sms(self, to: str, message: str):
-        sid = settings.twilio_account_sid
-        token = settings.twilio_auth_token
-        from_num = settings.twilio_phone_number
-        
-        if sid and token and from_num:
+    def __init__(self):
+        self.smtp_pool = SMTPPool(
+            _smtp_connect,
+            max_size=settings.smtp_pool_size,
+            idle_timeout=settings.smtp_idle_timeout,
+            max_messages=settings.smtp_max_messages_per_session,
+        )
+        self._sms_sender = None
+        self._sms_lock = threading.Lock()
+
+    @property
+    def sms_sender(self):
+        """The shared SMS sender, or None when Twilio is not configured."""
+        if self._sms_sender is None:
+            sid = settings.twilio_account_sid
+            token = settings.twilio_auth_token
+            from_num = settings.twilio_phone_number
+            if not (sid and token and from_num):
+                return None
+            with self._sms_lock:
+                if self._sms_sender is None:
+                    client = TwilioClient(
+                        sid, token, from_num,
+                        base_url=settings.twilio_api_base,
+                        pool_size=settings.sms_concurrency,
+                        timeout=settings.sms_timeout,
+                    )
+                    self._sms_sender = SMSSender(
+                        client,
+                        rate_per_second=settings.sms_rate_per_second,
+                        burst=settings.sms_burst,
+                        concurrency=settings.sms_concurrency,
+                        max_retries=settings.sms_max_retries,
+                    )
+        return self._sms_sender
+
+    def deliver_sms(self, to: str, message: str) -> str:
+        """Send one SMS and return the provider's message id; raises SMSError on failure."""
+        sender = self.sms_sender
+        if sender:
             try:
-                from twilio.rest import Client
-                client = Client(sid, token)
-                msg = client.messages.create(
-                    body=message,
-                    from_=from_num,
-                    to=to
-                )
-                print(f"SMS sent successfully to {to}: {msg.sid}")
-                return True
-            except Exception as e:
-                print(f"Twilio error: {e}")
-                return False
+                msg_sid = sender.send(to, message)
+            except SMSError as e:
+                logger.warning("sms.failed", sample=True, to=to, error=str(e))
+                raise
+            logger.info("sms.sent", sample=True, to=to, sid=msg_sid)
+            return msg_sid
         else:
-            print(f"[DEMO] SMS to {to}: {message}")
-            return True
+            logger.info("sms.demo", sample=True, to=to, body=message)
+            return DEMO_PROVIDER_ID
 
-    def send_email(self, to_email: str, subject: str, body: str):
+    def deliver_email(self, to_email: str, subject: str, body: str, idempotency_key: Optional[str] = None) -> str:
+        """Send one email and return its Message-ID; raises on failure."""
         if settings.smtp_host and settings.smtp_username and settings.smtp_password:
+            msg = build_email(to_email, subject, body, idempotency_key)
             try:
-                msg = MIMEMultipart()
-                msg['From'] = settings.smtp_from or settings.smtp_username
-                msg['To'] = to_email
-                msg['Subject'] = subject
-                msg.attach(MIMEText(body, 'plain'))
-                
-                server = smtplib.SMTP(settings.smtp_host, settings.smtp_port or 587)
-                server.starttls()
-                server.login(settings.smtp_username, settings.smtp_password)
-                server.send_message(msg)
-                server.quit()
-                print(f"Email sent successfully to {to_email}")
-                return True
+                self.smtp_pool.send(msg)
             except Exception as e:
-                print(f"Email error: {e}")
-                return False
+                logger.warning("email.failed", sample=True, to=to_email, error=str(e))
+                raise
+            logger.info("email.sent", sample=True, to=to_email, message_id=msg['Message-ID'])
+            return msg['Message-ID']
         else:
-            print(f"[DEMO] EMAIL to {to_email}: {subject}\n{body}")
-            return True
+            logger.info("email.demo", sample=True, to=to_email, subject=subject, body=body)
+            return DEMO_PROVIDER_ID
+
+    def warm(self):
+        """Connect to the configured providers before the first alert needs them."""
+        if settings.smtp_host and settings.smtp_username and settings.smtp_password:
+            self.smtp_pool.warm()
+        sender = self.sms_sender
+        if sender:
+            sender.client.warm()
+
+    def stats(self):
+        sender = self._sms_sender
+        return {"smtp": self.smtp_pool.stats(), "sms": sender.stats() if sender else None}
+
+    def close(self):
+        self.smtp_pool.close()
+        if self._sms_sender:
+            self._sms_sender.close()
 
 notifier = Notifier()
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""
+Keyset pagination, column projection and streamed encoding for the list endpoints.
+
+Pages are ordered newest first on ``(created_at, id)``. The cursor is the
+last row's key, so each page is an index range scan however deep the client
+has paged, unlike OFFSET. ``fields=`` selects only the named columns; the
+key columns are always included so the next cursor can be built.
+
+A page is sent as it is read. ``page_bounds`` first reads just the keys to
+find the page's last row (so X-Next-Cursor can go out with the headers) and
+limits the query to the rows up to it. ``stream_page`` then fetches the
+selected columns as tuples ``STREAM_BATCH`` rows at a time and encodes each
+batch with orjson, as one JSON array or as NDJSON. No ORM objects or Pydantic
+models are built, and memory stays at one batch whatever ``limit`` is.
+
+Key values are bound as text in the format the database returned them.
+SQLite stores ``CURRENT_TIMESTAMP`` as "YYYY-MM-DD HH:MM:SS", and binding a
+datetime would compare it against a microsecond-suffixed string.
+"""
+import base64
+import json
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import String, and_, bindparam, or_
+
+KEY_FIELDS = ("id", "created_at")
+MEDIA_TYPES = {"json": "application/json", "ndjson": "application/x-ndjson"}
+STREAM_BATCH = 1000  # rows fetched and encoded per chunk
+
+
+def encode_cursor(created_at, row_id: int) -> str:
+    raw = json.dumps([str(created_at), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return str(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str]) -> List[str]:
+    """The columns to load: everything by default, else the requested ones plus the key."""
+    if not fields:
+        return list(allowed)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {unknown}. Available fields: {list(allowed)}")
+    return [f for f in allowed if f in requested or f in KEY_FIELDS]
+
+
+def time_value(value: datetime) -> str:
+    """A datetime filter value in the text form stored by the database (naive UTC)."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return str(value)
+
+
+def check_format(fmt: str) -> str:
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
+    return fmt
+
+
+def page_bounds(query, model, cursor: Optional[str], limit: int):
+    """Restrict ``query`` to one page. Returns (the query, next cursor or None)."""
+    created_col, id_col = model.created_at, model.id
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        key = bindparam("cursor_created_at", created_at, type_=String)
+        query = query.filter(or_(created_col < key, and_(created_col == key, id_col < row_id)))
+    # The page's last key and whether a row follows it, read from the (created_at, id) index alone
+    keys = (
+        query.with_entities(created_col, id_col)
+        .order_by(created_col.desc(), id_col.desc())
+        .offset(limit - 1)
+        .limit(2)
+        .all()
+    )
+    if len(keys) < 2:
+        return query, None
+    last_created_at, last_id = keys[0]
+    # Bounding by key rather than LIMIT means a row inserted meanwhile cannot push one past the cursor
+    last = bindparam("last_created_at", str(last_created_at), type_=String)
+    query = query.filter(or_(created_col > last, and_(created_col == last, id_col >= last_id)))
+    return query, encode_cursor(last_created_at, last_id)
+
+
+def encode_rows(session_factory, query, model, fields: List[str], fmt: str) -> Iterator[bytes]:
+    """The page's rows as a JSON array or NDJSON, one chunk per ``STREAM_BATCH`` rows."""
+    columns = [getattr(model, f) for f in fields]
+    db = session_factory()
+    try:
+        rows = iter(
+            query.with_session(db)
+            .with_entities(*columns)
+            .order_by(model.created_at.desc(), model.id.desc())
+            .yield_per(STREAM_BATCH)
+        )
+        opened = False
+        while True:
+            batch = list(islice(rows, STREAM_BATCH))
+            if not batch:
+                break
+            if fmt == "ndjson":
+                yield b"".join(orjson.dumps(dict(zip(fields, row)), option=orjson.OPT_APPEND_NEWLINE) for row in batch)
+                continue
+            # Encode the batch as one array and splice its elements into the response's array
+            items = orjson.dumps([dict(zip(fields, row)) for row in batch])[1:-1]
+            yield (b"," if opened else b"[") + items
+            opened = True
+        if fmt == "json":
+            yield b"]" if opened else b"[]"
+    finally:
+        db.close()
+
+
+def stream_page(session_factory, query, model, fields: List[str], next_cursor: Optional[str], fmt: str):
+    """A chunked response with the rows of a page from ``page_bounds``, read in a session of its own."""
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return StreamingResponse(
+        encode_rows(session_factory, query, model, fields, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers=headers,
+    )
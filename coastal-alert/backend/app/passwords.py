@@ -0,0 +1,84 @@
+"""
+Password hashing, checked off the event loop.
+
+bcrypt is slow on purpose: about a quarter of a second of CPU per check. A
+burst of logins run on the threadpool would hold the interpreter (and the
+threads that sync endpoints need) for seconds, delaying alert requests.
+``password_hasher.verify`` therefore sends each check to a small process pool
+of ``AUTH_HASH_WORKERS`` processes. Logins beyond that wait their turn as
+futures, which cost nothing while waiting, so at most that many CPU cores
+ever go to logins.
+
+The pool is started on the first login (or by ``warm``), using ``spawn``
+so that the workers never inherit the server's threads or connections. They
+import only this module and the settings. With ``AUTH_HASH_WORKERS=0`` the
+checks run on the threadpool instead. passlib is imported by the first
+hash or check, not with the app.
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional
+
+from .config import settings
+
+
+@lru_cache(maxsize=None)
+def password_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def hash_password(password: str) -> str:
+    return password_context().hash(password)
+
+
+def check_password(password: str, hashed: Optional[str]) -> bool:
+    """Whether ``password`` matches; with no hash, spends the same time and returns False."""
+    context = password_context()
+    if not hashed:
+        context.dummy_verify()
+        return False
+    try:
+        return context.verify(password, hashed)
+    except ValueError:  # not a hash this context knows
+        return False
+
+
+def _prepare():
+    password_context()
+
+
+class PasswordHasher:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    async def verify(self, password: str, hashed: Optional[str]) -> bool:
+        return await asyncio.get_running_loop().run_in_executor(self._executor(), check_password, password, hashed)
+
+    async def warm(self):
+        """Start the worker processes and load passlib in them, so the first login does not wait."""
+        loop = asyncio.get_running_loop()
+        pool = self._executor()
+        await asyncio.gather(*(loop.run_in_executor(pool, _prepare) for _ in range(max(1, self.workers))))
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(settings.auth_hash_workers)
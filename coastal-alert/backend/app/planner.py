@@ -0,0 +1,124 @@
+"""
+Dry runs of an alert fan-out.
+
+A plan resolves recipients the way a real alert would (region tokens, radius
+or polygon, or everyone). It returns counts only: contacts, notifications per
+channel, SMS segments billed, and an estimate of how long the dispatcher
+would take to send them all. Nothing is queued or written.
+
+Counts come from the recipient index when it is loaded, and otherwise from
+one ``COUNT`` query. Area plans are the exception: they have to read the
+coordinates of the contacts in the covering cells. The optional recipient
+preview is a keyset page on contact id (``after=`` the last id seen), so even
+a plan for a million contacts only ever loads ``limit`` rows.
+
+The time estimate assumes each message takes ``PLAN_PROVIDER_LATENCY_MS`` at
+the provider. Throughput per channel is then the lowest of the SMS rate
+limit, the channel's connection limit and the dispatcher's concurrency. The
+two channels share the dispatcher, so the total is at least the larger
+channel's time and at least all messages at full dispatcher concurrency.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import geo, models, regions
+from .config import settings
+from .recipient_index import recipient_index
+from .templates import sms_segments, template_cache
+
+PREVIEW_FIELDS = ("id", "name", "phone", "email", "region")
+
+
+def count_recipients(db: Session, location: Optional[str], area: Optional[geo.Area] = None) -> Tuple[int, int, int]:
+    """(contacts, with a phone, with an email) that an alert would reach."""
+    if area is not None:
+        resolved = recipient_index.resolve_area(area)
+        contacts = resolved[1] if resolved is not None else geo.contacts_in_area(db, area)
+        return _tally(contacts)
+    resolved = recipient_index.resolve(location)
+    if resolved is not None:
+        return _tally(resolved[1])
+    contact = models.Contact
+    query = db.query(func.count(contact.id), func.count(contact.phone), func.count(contact.email))
+    if location:
+        query = query.filter(contact.id.in_(regions.contacts_in(location)))
+    total, phones, emails = query.one()
+    return total, phones, emails
+
+
+def _tally(contacts) -> Tuple[int, int, int]:
+    phones = emails = 0
+    for recipient in contacts:
+        phones += recipient.phone is not None
+        emails += recipient.email is not None
+    return len(contacts), phones, emails
+
+
+def preview(db: Session, location: Optional[str], area: Optional[geo.Area] = None,
+            after: int = 0, limit: int = 20) -> Tuple[List[Dict], Optional[int]]:
+    """One page of recipients in id order, and the id to pass as ``after`` for the next page."""
+    contact = models.Contact
+    query = db.query(*(getattr(contact, field) for field in PREVIEW_FIELDS))
+    if area is not None:
+        resolved = recipient_index.resolve_area(area)
+        contacts = resolved[1] if resolved is not None else geo.contacts_in_area(db, area)
+        # Ids in memory are cheap; only the page itself is loaded from the table
+        page_ids = sorted(c.id for c in contacts if c.id > after)[:limit + 1]
+        query = query.filter(contact.id.in_(page_ids))
+    else:
+        query = query.filter(contact.id > after)
+        if location:
+            query = query.filter(contact.id.in_(regions.contacts_in(location)))
+    rows = query.order_by(contact.id).limit(limit + 1).all()
+    page = [dict(zip(PREVIEW_FIELDS, row)) for row in rows[:limit]]
+    next_after = page[-1]["id"] if len(rows) > limit else None
+    return page, next_after
+
+
+def _rate(connections: int, latency: float, limit: Optional[float] = None) -> float:
+    rate = max(1, connections) / latency
+    return min(rate, limit) if limit else rate
+
+
+def estimate_seconds(sms: int, email: int) -> Dict[str, Optional[float]]:
+    """Rough seconds to send ``sms`` and ``email`` messages with the configured limits."""
+    latency = max(settings.plan_provider_latency_ms, 1.0) / 1000
+    slots = settings.dispatch_workers if settings.notifier_backend == "threads" else settings.dispatch_concurrency
+    sms_seconds = sms / _rate(min(settings.sms_concurrency, slots), latency, settings.sms_rate_per_second or None)
+    email_seconds = email / _rate(min(settings.smtp_pool_size, slots), latency)
+    total = max(sms_seconds, email_seconds, (sms + email) / _rate(slots, latency))
+    return {
+        "sms": round(sms_seconds, 1),
+        "email": round(email_seconds, 1),
+        "total": round(total, 1),
+    }
+
+
+def plan(db: Session, metric: str, severity: str, value: float, threshold: float, location: Optional[str],
+         area: Optional[geo.Area] = None, preview_limit: int = 0, after: int = 0) -> Dict:
+    """What an alert with this evaluation would send, without sending or storing anything."""
+    label = location or (area.label if area else None)
+    contacts, phones, emails = count_recipients(db, location, area)
+    sms_template = template_cache.get(metric, severity, label, "sms")
+    sms_body = template_cache.render(sms_template, value, threshold)
+    segments = sms_segments(sms_body)
+    result = {
+        "dry_run": True,
+        "location": label.replace('|', ', ') if label else "All Regions",
+        "area_contacts": contacts,
+        "notifications": phones + emails,
+        "channels": {
+            "sms": {"notifications": phones, "segments_per_message": segments, "segments": phones * segments},
+            "email": {"notifications": emails},
+        },
+        "estimated_seconds": estimate_seconds(phones, emails),
+        "assumed_provider_latency_ms": settings.plan_provider_latency_ms,
+        "sms_preview": sms_body,
+    }
+    if preview_limit > 0:
+        page, next_after = preview(db, location, area, after, preview_limit)
+        result["recipients"] = page
+        result["next_after"] = next_after
+    return result
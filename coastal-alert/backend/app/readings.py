@@ -0,0 +1,163 @@
+"""
+Batch sensor ingestion.
+
+Gateways post many readings at once, as a JSON array or as NDJSON (one
+object per line). The whole batch is checked against the alert rules in one
+pass. Every reading is stored in the time series with a single bulk insert,
+and the breaches with a second one into the alerts table. Breaching
+readings are grouped by (metric, location), so a gauge that reports ten
+breaches in one batch produces one notification round instead of ten. The
+caller does the fan-out for each group. Groups inside the cooldown of an
+earlier alert are stored flagged ``suppressed`` and are not fanned out.
+Readings that target a radius or polygon are grouped by that area as well.
+"""
+import json
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from . import geo, models, regions, schemas
+from .counters import counters, alert_deltas, ALERTS_SUPPRESSED
+from .suppression import Suppressor
+from .timeseries import timeseries, reading_row, age_error
+from .rules import RuleEngine
+
+
+def parse_batch(body: bytes, ndjson: bool) -> Iterator[tuple]:
+    """Yield (position, reading dict or error message). Positions are 1-based."""
+    if ndjson:
+        for line_num, line in enumerate(body.decode("utf-8-sig").splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                yield line_num, f"Invalid JSON: {e}"
+                continue
+            yield line_num, item if isinstance(item, dict) else "Expected a JSON object"
+        return
+    try:
+        payload = json.loads(body or b"[]")
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if isinstance(payload, dict):
+        payload = payload.get("readings")
+    if not isinstance(payload, list):
+        raise ValueError("Expected a JSON array of readings or {\"readings\": [...]}")
+    for position, item in enumerate(payload, start=1):
+        yield position, item if isinstance(item, dict) else "Expected a JSON object"
+
+
+class BreachGroup:
+    """Breaching readings for one metric and location (or area) within a batch."""
+
+    def __init__(self, metric: str, location: Optional[str], threshold: float, area: Optional[geo.Area] = None):
+        self.metric = metric
+        self.location = location
+        self.area = area
+        self.threshold = threshold
+        self.count = 0
+        self.max_value = None
+        self.severity = "HIGH"
+        self.alert_id: Optional[int] = None
+        self.row_indexes: List[int] = []
+        # Seconds left in the cooldown when suppressed, else None
+        self.suppressed_for: Optional[float] = None
+
+    def add(self, value: float, severity: str):
+        self.count += 1
+        if self.max_value is None or value > self.max_value:
+            self.max_value = value
+            self.severity = severity
+
+
+def store(db: Session, items, engine: RuleEngine, suppressor: Optional[Suppressor] = None,
+          max_errors: int = 1000, retention_days: int = 0) -> Tuple[Dict, List[BreachGroup]]:
+    """Validate, evaluate and bulk-insert a batch. The caller fans out and commits."""
+    report = {"received": 0, "stored": 0, "invalid": 0, "breaches": 0, "suppressed": 0, "errors": []}
+    series = []
+    rows = []
+    groups: Dict[tuple, BreachGroup] = {}
+    breach_rows: List[Tuple[BreachGroup, int]] = []
+    deltas: Dict[str, int] = {}
+
+    for position, item in items:
+        report["received"] += 1
+        error = None
+        if isinstance(item, str):
+            error = item
+        else:
+            try:
+                reading = schemas.AlertIn(**item)
+            except ValidationError as e:
+                error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            else:
+                error = age_error(reading.recorded_at, retention_days)
+            if not error:
+                # Observe first so compound rules see earlier readings in the same batch
+                engine.observe(reading.metric, reading.value, reading.location)
+                evaluation = engine.evaluate(reading.metric, reading.value, reading.location)
+                if evaluation is None:
+                    error = f"Unknown metric: {reading.metric}"
+        if error:
+            report["invalid"] += 1
+            if len(report["errors"]) < max_errors:
+                report["errors"].append({"position": position, "error": error})
+            continue
+
+        series.append(reading_row(reading.metric, reading.value, reading.location, reading.recorded_at))
+        severity, threshold = evaluation.severity, evaluation.threshold
+        if severity == "NORMAL":
+            continue
+        area = geo.area_from(reading)
+        key = (reading.metric, regions.location_key(reading.location), area.key if area else None)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = BreachGroup(reading.metric, reading.location, threshold, area)
+        group.add(reading.value, severity)
+        group.row_indexes.append(len(rows))
+        breach_rows.append((group, len(rows)))
+        rows.append({
+            "metric": reading.metric,
+            "value": reading.value,
+            "threshold": threshold,
+            "message": "",
+            "sent": False,
+            "severity": severity,
+            "suppressed": False,
+        })
+        for name, delta in alert_deltas(reading.metric, severity).items():
+            deltas[name] = deltas.get(name, 0) + delta
+
+    report["errors_truncated"] = report["invalid"] > len(report["errors"])
+    report["stored"] = timeseries.add(db, series)
+    if not rows:
+        return report, []
+
+    if suppressor is not None:
+        for group in groups.values():
+            group.suppressed_for = suppressor.check(
+                group.metric, group.location, group.severity, db=db, area_key=group.area.key if group.area else None
+            )
+            if group.suppressed_for is not None:
+                for row_index in group.row_indexes:
+                    rows[row_index]["suppressed"] = True
+                report["suppressed"] += group.count
+        if report["suppressed"]:
+            deltas[ALERTS_SUPPRESSED] = report["suppressed"]
+
+    result = db.execute(
+        insert(models.AlertLog).returning(models.AlertLog.id, sort_by_parameter_order=True),
+        rows,
+    )
+    ids = [alert_id for (alert_id,) in result]
+    counters.add(db, deltas)
+    report["breaches"] = len(breach_rows)
+
+    # Each group's alert is its highest reading
+    for group, row_index in breach_rows:
+        if rows[row_index]["value"] == group.max_value and group.alert_id is None:
+            group.alert_id = ids[row_index]
+    return report, list(groups.values())
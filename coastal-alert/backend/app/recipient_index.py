@@ -0,0 +1,271 @@
+"""
+In-process region -> recipient index for the alert hot path.
+
+The index is loaded from the contacts table at startup and then kept current
+by the contact create/update/delete handlers (write-through). Alert routing
+resolves recipients from memory in O(recipients): the token keys are kept
+sorted, so a location is a prefix scan, as in the database (see regions.py).
+The duplicate email/phone
+checks on contact writes also become dictionary lookups. Every change bumps
+``version``, so a reader holding an older result can tell that it is stale.
+Contacts with coordinates are also bucketed by geohash cell, with the cell
+keys kept sorted, so radius and polygon alerts resolve through a prefix scan
+plus a vectorised exact check (see geo.py).
+Until ``load`` has run, lookups return None and callers fall back to the
+database. ``load`` can run while contacts are being written (it runs in the
+background at start-up): changes made while it reads are replayed on top of
+what it read.
+"""
+import bisect
+import sys
+import threading
+from collections import namedtuple
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import geo, models, regions
+from .logs import get_logger
+
+logger = get_logger("recipients")
+
+Recipient = namedtuple("Recipient", ["id", "phone", "email"])
+
+# Geohash length of the in-memory cells (about 1.2 x 0.6 km)
+CELL_PRECISION = 6
+
+
+class RecipientIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self.version = 0
+        self._contacts: Dict[int, Recipient] = {}
+        self._tokens_of: Dict[int, frozenset] = {}
+        self._by_token: Dict[str, Set[int]] = {}
+        self._token_keys: List[str] = []  # sorted, for prefix scans
+        self._by_email: Dict[str, int] = {}
+        self._by_phone: Dict[str, int] = {}
+        self._cells: Dict[str, Dict[int, Tuple[float, float]]] = {}
+        self._cell_keys: List[str] = []  # sorted, for prefix scans
+        self._cell_of: Dict[int, str] = {}
+        self._loading = 0
+        self._replay: List[tuple] = []  # (contact_id, args or None for a removal) seen during a load
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self, db: Session, batch_size: int = 5000):
+        with self._lock:
+            if not self._loading:
+                self._replay = []
+            self._loading += 1
+        try:
+            self._load(db, batch_size)
+        finally:
+            with self._lock:
+                self._loading -= 1
+
+    def _load(self, db: Session, batch_size: int):
+        contacts: Dict[int, Recipient] = {}
+        tokens_of: Dict[int, frozenset] = {}
+        points: Dict[int, Tuple[float, float]] = {}
+        contact = models.Contact
+        query = db.query(contact.id, contact.phone, contact.email, contact.region, contact.latitude, contact.longitude)
+        for contact_id, phone, email, region, latitude, longitude in query.yield_per(batch_size):
+            contacts[contact_id] = Recipient(contact_id, phone, email)
+            tokens_of[contact_id] = frozenset(regions.region_tokens(region))
+            if latitude is not None and longitude is not None:
+                points[contact_id] = (latitude, longitude)
+        with self._lock:
+            self._contacts = {}
+            self._tokens_of = {}
+            self._by_token = {}
+            self._token_keys = []
+            self._by_email = {}
+            self._by_phone = {}
+            self._cells = {}
+            self._cell_keys = []
+            self._cell_of = {}
+            for contact_id, recipient in contacts.items():
+                self._add(recipient, tokens_of[contact_id], points.get(contact_id), sort=False)
+            self._cell_keys.sort()
+            self._token_keys.sort()
+            for contact_id, args in self._replay:
+                self._remove(contact_id)
+                if args is not None:
+                    self._add(*args)
+            self._loaded = True
+            self.version += 1
+        logger.info("recipient_index.loaded", contacts=len(contacts))
+
+    def upsert(self, contact_id: int, phone: Optional[str], email: Optional[str], region: Optional[str],
+               latitude: Optional[float] = None, longitude: Optional[float] = None):
+        tokens = frozenset(regions.region_tokens(region))
+        point = (latitude, longitude) if latitude is not None and longitude is not None else None
+        args = (Recipient(contact_id, phone, email), tokens, point)
+        with self._lock:
+            self._remove(contact_id)
+            self._add(*args)
+            self.version += 1
+            if self._loading:
+                self._replay.append((contact_id, args))
+
+    def remove(self, contact_id: int):
+        with self._lock:
+            self._remove(contact_id)
+            self.version += 1
+            if self._loading:
+                self._replay.append((contact_id, None))
+
+    def resolve(self, location: Optional[str]) -> Optional[Tuple[int, List[Recipient]]]:
+        """(version, recipients) for a location, or every contact when no location is given.
+
+        Returns None when the index is not loaded.
+        """
+        with self._lock:
+            if not self._loaded:
+                self._misses += 1
+                return None
+            self._hits += 1
+            if not location:
+                return self.version, list(self._contacts.values())
+            ids: Set[int] = set()
+            keys = self._token_keys
+            for prefix in regions.location_tokens(location):
+                position = bisect.bisect_left(keys, prefix)
+                while position < len(keys) and keys[position].startswith(prefix):
+                    ids.update(self._by_token[keys[position]])
+                    position += 1
+            contacts = self._contacts
+            return self.version, [contacts[contact_id] for contact_id in ids]
+
+    def resolve_area(self, area: geo.Area) -> Optional[Tuple[int, List[Recipient]]]:
+        """(version, recipients) inside a radius or polygon, or None when the index is not loaded."""
+        inside: List[int] = []
+        candidates: List[int] = []
+        points: List[Tuple[float, float]] = []
+        with self._lock:
+            if not self._loaded:
+                self._misses += 1
+                return None
+            self._hits += 1
+            version = self.version
+            keys = self._cell_keys
+            for prefix, rect in geo.cover(area, CELL_PRECISION):
+                # Cells wholly inside the area need no per-contact check
+                whole = area.covers_rect(rect)
+                position = bisect.bisect_left(keys, prefix)
+                while position < len(keys) and keys[position].startswith(prefix):
+                    cell = self._cells[keys[position]]
+                    if whole:
+                        inside.extend(cell)
+                    else:
+                        candidates.extend(cell)
+                        points.extend(cell.values())
+                    position += 1
+        inside.extend(candidates[i] for i in geo.select(area, points))
+        contacts = self._contacts
+        return version, [contacts[contact_id] for contact_id in inside if contact_id in contacts]
+
+    def find_email(self, email: str) -> Optional[int]:
+        with self._lock:
+            return self._by_email.get(email)
+
+    def find_phone(self, phone: str) -> Optional[int]:
+        with self._lock:
+            return self._by_phone.get(phone)
+
+    def __len__(self) -> int:
+        return len(self._contacts)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "loaded": self._loaded,
+                "version": self.version,
+                "contacts": len(self._contacts),
+                "tokens": len(self._by_token),
+                "located": len(self._cell_of),
+                "cells": len(self._cells),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else None,
+                "approx_bytes": self._approx_bytes(),
+            }
+
+    def _add(self, recipient: Recipient, tokens: frozenset, point: Optional[Tuple[float, float]] = None,
+             sort: bool = True):
+        contact_id = recipient.id
+        self._contacts[contact_id] = recipient
+        self._tokens_of[contact_id] = tokens
+        for token in tokens:
+            ids = self._by_token.get(token)
+            if ids is None:
+                ids = self._by_token[token] = set()
+                if sort:
+                    bisect.insort(self._token_keys, token)
+                else:
+                    self._token_keys.append(token)
+            ids.add(contact_id)
+        if recipient.email:
+            self._by_email[recipient.email] = contact_id
+        if recipient.phone:
+            self._by_phone[recipient.phone] = contact_id
+        if point is not None:
+            key = geo.encode(point[0], point[1], CELL_PRECISION)
+            cell = self._cells.get(key)
+            if cell is None:
+                cell = self._cells[key] = {}
+                if sort:
+                    bisect.insort(self._cell_keys, key)
+                else:
+                    self._cell_keys.append(key)
+            cell[contact_id] = point
+            self._cell_of[contact_id] = key
+
+    def _remove(self, contact_id: int):
+        recipient = self._contacts.pop(contact_id, None)
+        if recipient is None:
+            return
+        for token in self._tokens_of.pop(contact_id, ()):
+            ids = self._by_token.get(token)
+            if ids is not None:
+                ids.discard(contact_id)
+                if not ids:
+                    del self._by_token[token]
+                    del self._token_keys[bisect.bisect_left(self._token_keys, token)]
+        if recipient.email and self._by_email.get(recipient.email) == contact_id:
+            del self._by_email[recipient.email]
+        if recipient.phone and self._by_phone.get(recipient.phone) == contact_id:
+            del self._by_phone[recipient.phone]
+        key = self._cell_of.pop(contact_id, None)
+        if key is not None:
+            cell = self._cells[key]
+            del cell[contact_id]
+            if not cell:
+                del self._cells[key]
+                del self._cell_keys[bisect.bisect_left(self._cell_keys, key)]
+
+    def _approx_bytes(self) -> int:
+        # Containers plus the strings they own; the token frozensets share their strings
+        size = sum(sys.getsizeof(d) for d in (
+            self._contacts, self._tokens_of, self._by_token, self._token_keys, self._by_email, self._by_phone,
+            self._cells, self._cell_keys, self._cell_of,
+        ))
+        for recipient in self._contacts.values():
+            size += sys.getsizeof(recipient) + sys.getsizeof(recipient.phone or "") + sys.getsizeof(recipient.email or "")
+        for token, ids in self._by_token.items():
+            size += sys.getsizeof(token) + sys.getsizeof(ids)
+        for tokens in self._tokens_of.values():
+            size += sys.getsizeof(tokens)
+        for key, cell in self._cells.items():
+            size += sys.getsizeof(key) + sys.getsizeof(cell) + len(cell) * 3 * sys.getsizeof(0.0)
+        return size
+
+
+recipient_index = RecipientIndex()
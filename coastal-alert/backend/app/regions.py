@@ -0,0 +1,127 @@
+"""
+Region routing through an indexed token table.
+
+A contact's free-text region ("Mumbai, Maharashtra") is split on commas,
+pipes, slashes and semicolons. Each part is lower-cased and stored in
+``contact_regions`` together with every run of consecutive words in it
+("andaman", "nicobar", "andaman and nicobar", ...). An alert location
+matches a contact when its normalised form is a prefix of one of those
+tokens, so "mumbai", "mum" and "mumbai, mah" all reach "Mumbai,
+Maharashtra". Each location is an indexed range scan,
+``token >= loc AND token < loc + U+FFFF``, instead of the old
+``ILIKE '%loc%'`` table scan. The results are the same as before for any
+location that starts at a word boundary of the region. Fragments from the
+middle of a word ("umbai") no longer match.
+"""
+import re
+from typing import Iterable, List, Set
+
+from sqlalchemy import and_, false, insert, or_, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+_PART_SEPARATORS = re.compile(r"[,|/;]")
+_WHITESPACE = re.compile(r"\s+")
+
+# A region part longer than this is free text, not a place name
+MAX_WORDS_PER_PART = 8
+
+# Sorts after any character a token can continue with, closing a prefix range
+PREFIX_END = "\uffff"
+
+
+def normalize(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+def region_tokens(region: str) -> Set[str]:
+    if not region:
+        return set()
+    tokens = set()
+    whole = normalize(region)
+    if whole:
+        tokens.add(whole)
+    for part in _PART_SEPARATORS.split(region):
+        words = normalize(part).split(" ")[:MAX_WORDS_PER_PART]
+        for start in range(len(words)):
+            for end in range(start + 1, len(words) + 1):
+                token = " ".join(words[start:end])
+                if token:
+                    tokens.add(token)
+    return tokens
+
+
+def location_tokens(location: str) -> List[str]:
+    """The lookup keys for an alert location; several locations are separated by '|'."""
+    if not location:
+        return []
+    return sorted({normalize(loc) for loc in location.split("|") if normalize(loc)})
+
+
+def location_key(location: str) -> str:
+    """One key for every spelling of the same location(s); "" means all regions."""
+    return "|".join(location_tokens(location))
+
+
+def matches(region: str, location: str) -> bool:
+    """In-memory equivalent of the indexed lookup, for data that is not in the database."""
+    tokens = region_tokens(region)
+    return any(token.startswith(loc) for loc in location_tokens(location) for token in tokens)
+
+
+def assign(contact: models.Contact):
+    """Bring a contact's token rows in line with its region; flushed with the contact."""
+    wanted = region_tokens(contact.region)
+    current = {row.token: row for row in contact.region_tokens}
+    for token, row in current.items():
+        if token not in wanted:
+            contact.region_tokens.remove(row)
+    for token in wanted - current.keys():
+        contact.region_tokens.append(models.ContactRegion(token=token))
+
+
+def contacts_in(location: str):
+    """A subquery of contact ids whose region matches any of the given locations."""
+    token = models.ContactRegion.token
+    return (
+        select(models.ContactRegion.contact_id)
+        .where(or_(false(), *(and_(token >= loc, token < loc + PREFIX_END) for loc in location_tokens(location))))
+        .distinct()
+    )
+
+
+def insert_tokens(db: Session, contacts: Iterable[tuple]) -> int:
+    """Bulk-insert token rows for (contact_id, region) pairs that have none yet."""
+    rows = [
+        {"contact_id": contact_id, "token": token}
+        for contact_id, region in contacts
+        for token in region_tokens(region)
+    ]
+    if rows:
+        db.execute(insert(models.ContactRegion), rows)
+    return len(rows)
+
+
+def backfill(db: Session, batch_size: int = 1000) -> int:
+    """Create tokens for contacts saved before the token table existed."""
+    done = 0
+    last_id = 0
+    while True:
+        batch = (
+            db.query(models.Contact.id, models.Contact.region)
+            .filter(
+                models.Contact.id > last_id,
+                models.Contact.region.isnot(None),
+                ~models.Contact.id.in_(select(models.ContactRegion.contact_id)),
+            )
+            .order_by(models.Contact.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            return done
+        insert_tokens(db, batch)
+        db.commit()
+        done += len(batch)
+        last_id = batch[-1][0]
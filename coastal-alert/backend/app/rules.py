@@ -0,0 +1,203 @@
+"""
+Alert rules: per-metric and per-region severity bands, kept in the database.
+
+Each rule row names a metric, an optional region and a list of bands such as
+``[{"severity": "HIGH", "above": 3.5}, {"severity": "CRITICAL", "above": 5.25}]``.
+It can also carry conditions on other metrics ("and wave_height above 4")
+that must hold, judged by the latest reading of those metrics for the same
+region. ``load`` compiles the enabled rows into a lookup of metric ->
+region -> rules with the bands sorted high to low. ``evaluate`` is then a
+couple of dict lookups and comparisons. Region rules replace the global
+rules for their metric in that region. When several rules apply, the most
+severe result wins. The API handlers call ``load`` after every change, and
+the new rule set replaces the old one in a single assignment.
+
+``observe`` keeps only readings some condition can use: metrics that a
+condition names, for the regions whose rules name them (every region for a
+global rule). Readings older than the condition window are swept out.
+"""
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models, regions
+from .config import settings
+
+SEVERITY_RANK = {"NORMAL": 0, "HIGH": 1, "CRITICAL": 2}
+
+# Thresholds the system shipped with; seeded as global rules on first start
+DEFAULT_THRESHOLDS = {
+    "water_level": 3.5,
+    "wind_speed": 120.0,
+    "rainfall_24h": 100.0,
+    "wave_height": 5.0,
+    "storm_surge": 2.0
+}
+CRITICAL_MULTIPLIER = 1.5
+
+# Sweep expired condition readings every this many observations
+SWEEP_EVERY = 1000
+
+Evaluation = namedtuple("Evaluation", ["severity", "threshold", "rule_id"])
+CompiledRule = namedtuple("CompiledRule", ["id", "bands", "conditions", "threshold"])
+
+
+def default_rules() -> List[Dict]:
+    return [
+        {
+            "name": f"{metric} default",
+            "metric": metric,
+            "region": None,
+            "bands": [
+                {"severity": "HIGH", "above": threshold},
+                {"severity": "CRITICAL", "above": threshold * CRITICAL_MULTIPLIER},
+            ],
+            "conditions": [],
+            "enabled": True,
+        }
+        for metric, threshold in DEFAULT_THRESHOLDS.items()
+    ]
+
+
+def seed_default_rules(db: Session) -> int:
+    if db.query(models.AlertRule.id).first() is not None:
+        return 0
+    rows = default_rules()
+    db.add_all(models.AlertRule(**row) for row in rows)
+    db.commit()
+    return len(rows)
+
+
+def compile_rule(rule: models.AlertRule) -> CompiledRule:
+    bands = tuple(sorted(
+        ((float(band["above"]), band["severity"]) for band in rule.bands or ()),
+        reverse=True,
+    ))
+    conditions = tuple((c["metric"], float(c["above"])) for c in rule.conditions or ())
+    threshold = bands[-1][0] if bands else None
+    return CompiledRule(rule.id, bands, conditions, threshold)
+
+
+class RuleEngine:
+    def __init__(self, condition_window: float):
+        self.condition_window = condition_window
+        self.version = 0
+        self._rules: Dict[str, Dict[str, Tuple[CompiledRule, ...]]] = {}
+        self._latest: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        # Condition metric -> regions whose readings count; None means every region
+        self._watched: Dict[str, Optional[FrozenSet[str]]] = {}
+        self._observed = 0
+        self._lock = threading.Lock()
+
+    def load(self, db: Session):
+        compiled: Dict[str, Dict[str, List[CompiledRule]]] = {}
+        for rule in db.query(models.AlertRule).filter(models.AlertRule.enabled == True).order_by(models.AlertRule.id):
+            region = regions.normalize(rule.region or "")
+            compiled.setdefault(rule.metric, {}).setdefault(region, []).append(compile_rule(rule))
+        rules = {metric: {region: tuple(items) for region, items in by_region.items()} for metric, by_region in compiled.items()}
+        watched = self._watch(rules)
+        with self._lock:
+            self._rules = rules
+            self._watched = watched
+            self._latest = {key: latest for key, latest in self._latest.items() if self._wanted(key[0], key[1])}
+            self.version += 1
+
+    @staticmethod
+    def _watch(rules) -> Dict[str, Optional[FrozenSet[str]]]:
+        regions_by_metric: Dict[str, Optional[Set[str]]] = {}
+        for by_region in rules.values():
+            for region, items in by_region.items():
+                for rule in items:
+                    for metric, _ in rule.conditions:
+                        if not region:
+                            # A global rule judges its conditions in whatever region the reading names
+                            regions_by_metric[metric] = None
+                        elif regions_by_metric.get(metric, ()) is not None:
+                            regions_by_metric.setdefault(metric, set()).add(region)
+        return {metric: None if names is None else frozenset(names) for metric, names in regions_by_metric.items()}
+
+    def _wanted(self, metric: str, token: str) -> bool:
+        if metric not in self._watched:
+            return False
+        names = self._watched[metric]
+        # A reading without a location stands for every region
+        return names is None or not token or token in names
+
+    def metrics(self) -> List[str]:
+        return list(self._rules)
+
+    def condition_metrics(self) -> List[str]:
+        """Metrics that some rule's conditions refer to."""
+        return sorted({
+            metric
+            for by_region in self._rules.values()
+            for items in by_region.values()
+            for rule in items
+            for metric, _ in rule.conditions
+        })
+
+    def thresholds(self) -> Dict[str, float]:
+        """The lowest global band per metric, i.e. the classic single threshold."""
+        result = {}
+        for metric, by_region in self._rules.items():
+            levels = [rule.threshold for rule in by_region.get("", ()) if rule.threshold is not None and not rule.conditions]
+            if levels:
+                result[metric] = min(levels)
+        return result
+
+    def observe(self, metric: str, value: float, location: Optional[str], at: Optional[float] = None):
+        """Remember a reading so compound conditions on this metric can be judged."""
+        if metric not in self._watched:
+            return
+        now = time.time()
+        at = now if at is None else at
+        if now - at > self.condition_window:
+            return
+        with self._lock:
+            self._observed += 1
+            if self._observed % SWEEP_EVERY == 0:
+                self._sweep(now)
+            for token in regions.location_tokens(location) or [""]:
+                if self._wanted(metric, token):
+                    self._latest[(metric, token)] = (value, at)
+
+    def _sweep(self, now: float):
+        cutoff = now - self.condition_window
+        self._latest = {key: latest for key, latest in self._latest.items() if latest[1] >= cutoff}
+
+    def evaluate(self, metric: str, value: float, location: Optional[str] = None) -> Optional[Evaluation]:
+        """Severity of a reading, or None when no rule covers the metric."""
+        by_region = self._rules.get(metric)
+        if by_region is None:
+            return None
+        best = None
+        for token in regions.location_tokens(location) or [""]:
+            for rule in by_region.get(token) or by_region.get("", ()):
+                result = self._apply(rule, value, token)
+                if best is None or SEVERITY_RANK[result.severity] > SEVERITY_RANK[best.severity]:
+                    best = result
+        if best is None:
+            return Evaluation("NORMAL", None, None)
+        return best
+
+    def _apply(self, rule: CompiledRule, value: float, token: str) -> Evaluation:
+        if rule.conditions and not self._conditions_hold(rule.conditions, token):
+            return Evaluation("NORMAL", rule.threshold, rule.id)
+        for above, severity in rule.bands:
+            if value > above:
+                return Evaluation(severity, rule.threshold, rule.id)
+        return Evaluation("NORMAL", rule.threshold, rule.id)
+
+    def _conditions_hold(self, conditions, token: str) -> bool:
+        now = time.time()
+        for metric, above in conditions:
+            latest = self._latest.get((metric, token)) or self._latest.get((metric, ""))
+            if latest is None or now - latest[1] > self.condition_window or latest[0] <= above:
+                return False
+        return True
+
+
+rule_engine = RuleEngine(settings.rule_condition_window)
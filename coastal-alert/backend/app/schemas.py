@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr, validator
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field, validator
+from typing import List, Optional
 from datetime import datetime
+from . import geo
 
 # User schemas
 class UserBase(BaseModel):
@@ -48,6 +49,14 @@ class ContactCreate(BaseModel):
     phone: Optional[str] = None
     email: Optional[str] = None
     region: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+
+    @validator('longitude', always=True)
+    def validate_position(cls, v, values):
+        if (v is None) != (values.get('latitude') is None):
+            raise ValueError('Give both latitude and longitude, or neither')
+        return v
 
 class ContactOut(ContactCreate):
     id: int
@@ -58,10 +67,73 @@ class ContactOut(ContactCreate):
         from_attributes = True
 
 # Alert schemas
+class GeoRadius(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    radius_km: float = Field(..., gt=0, le=2000)
+
+class GeoPolygon(BaseModel):
+    """A GeoJSON Polygon or MultiPolygon geometry; positions are [longitude, latitude]."""
+    type: str
+    coordinates: list
+
+    @validator('coordinates')
+    def validate_geometry(cls, v, values):
+        geo.parse_geometry({"type": values.get("type"), "coordinates": v})
+        return v
+
 class AlertIn(BaseModel):
     metric: str
     value: float
     location: Optional[str] = None
+    recorded_at: Optional[datetime] = None  # when the sensor took the reading; defaults to now
+    # Notify the contacts inside an area instead of those in the location's regions (see geo.py)
+    radius: Optional[GeoRadius] = None
+    polygon: Optional[GeoPolygon] = None
+
+    @validator('polygon')
+    def validate_single_area(cls, v, values):
+        if v is not None and values.get('radius') is not None:
+            raise ValueError('Give either radius or polygon, not both')
+        return v
+
+# Alert rule schemas
+class RuleBand(BaseModel):
+    severity: str
+    above: float
+
+    @validator('severity')
+    def validate_severity(cls, v):
+        v = v.upper()
+        if v not in ("HIGH", "CRITICAL"):
+            raise ValueError('severity must be HIGH or CRITICAL')
+        return v
+
+class RuleCondition(BaseModel):
+    metric: str
+    above: float
+
+class AlertRuleIn(BaseModel):
+    name: Optional[str] = None
+    metric: str
+    region: Optional[str] = None
+    bands: List[RuleBand]
+    conditions: List[RuleCondition] = []
+    enabled: bool = True
+
+    @validator('bands')
+    def validate_bands(cls, v):
+        if not v:
+            raise ValueError('At least one severity band is required')
+        return v
+
+class AlertRuleOut(AlertRuleIn):
+    id: int
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
 
 class AlertLogOut(BaseModel):
     id: int
@@ -70,6 +142,8 @@ class AlertLogOut(BaseModel):
     threshold: float
     message: str
     sent: bool
+    severity: Optional[str] = None
+    suppressed: Optional[bool] = None
     created_at: datetime
     
     class Config:
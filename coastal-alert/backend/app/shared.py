@@ -0,0 +1,321 @@
+"""
+State shared between processes in multi-worker mode (``SHARED_STATE=true``).
+
+Each API worker and dispatcher process keeps its own in-memory copies: the
+compiled rules, the recipient index, the /api/stats counters and the latest
+readings that compound rules look at. The database is the source of truth.
+Writers call ``coordinator.bump(db, "rules")`` or ``"contacts"`` in the same
+transaction as their change. Every process then runs a poll loop that:
+
+- reloads the rules or the recipient index when their version has moved, and
+  clears the verified-token cache when a user has changed
+- refreshes the counters and feeds new readings of condition metrics to the
+  rule engine
+- relays /api/stream events through the ``stream_events`` table
+- renews or takes over the leader lease
+
+Scheduled jobs (readings roll-up and retention, counter reconciliation,
+re-queueing deliveries whose dispatcher died) run only in the process
+holding the lease, passed to them as ``when=coordinator.leads``. A leader
+that stops renewing is replaced once the lease expires. Changes made by
+another process therefore show up after one poll interval.
+
+With shared state off, none of this runs and ``leads`` is always true.
+"""
+import asyncio
+import json
+import os
+import socket
+import time
+from typing import Dict, Optional, Union
+
+from sqlalchemy import Connection, delete, func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+from .auth import token_cache
+from .config import settings
+from .counters import counters
+from .database import ReadSessionLocal, SessionLocal
+from .dispatcher import dispatcher
+from .events import bus
+from .logs import get_logger
+from .recipient_index import recipient_index
+from .rules import rule_engine
+from .timeseries import timeseries
+
+VERSION_PREFIX = "version."
+READINGS_DIRTY_PREFIX = "readings.dirty."
+LEADER = "scheduler"
+
+# Leader housekeeping runs at most this often (seconds)
+MAINTENANCE_INTERVAL = 30.0
+# Relayed stream events are deleted after this many seconds
+EVENT_RETENTION = 60.0
+# New readings fed to the rule engine per poll
+READINGS_PER_POLL = 10000
+
+logger = get_logger("shared")
+
+
+class Coordinator:
+    def __init__(self, enabled: bool, poll_interval: float, lease_seconds: float, dispatch_lease: float):
+        self.enabled = enabled
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.dispatch_lease = dispatch_lease
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+        self._leader = False
+        self._lease_renewed = 0.0
+        self._maintained = 0.0
+        self._versions: Dict[str, int] = {}
+        self._last_event_id: Optional[int] = None
+        self._last_reading_id: Optional[int] = None
+        self._polls = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def leads(self) -> bool:
+        """Whether this process should run the scheduled jobs."""
+        return self._leader or not self.enabled
+
+    def bump(self, db: Union[Session, Connection], name: str):
+        """Mark ``name`` ("rules", "contacts" or "users") as changed for the other processes; the caller commits."""
+        if not self.enabled:
+            return
+        state = models.SharedState
+        key = VERSION_PREFIX + name
+        result = db.execute(update(state).where(state.name == key).values(value=state.value + 1))
+        if result.rowcount == 0:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(state).values(name=key, value=1))
+            except IntegrityError:
+                db.execute(update(state).where(state.name == key).values(value=state.value + 1))
+
+    async def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"  # uvicorn forks workers after import
+        bus.use_outbox()
+        await asyncio.to_thread(self._prime)
+        await asyncio.to_thread(self.poll)
+        self._task = asyncio.create_task(self._run())
+        logger.info("coordinator.started", holder=self.holder, leader=self._leader)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        self._task = None
+        await asyncio.to_thread(self._release)
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "holder": self.holder,
+            "leader": self.leads(),
+            "polls": self._polls,
+            "versions": {name[len(VERSION_PREFIX):]: version for name, version in self._versions.items()},
+        }
+
+    def _prime(self):
+        # Start relaying after what is already there, and replay recent readings for compound rules
+        db = ReadSessionLocal()
+        try:
+            self._versions = self._read_versions(db)
+            self._last_event_id = db.query(func.max(models.StreamEvent.id)).scalar() or 0
+            reading = models.Reading
+            since = int(time.time() - rule_engine.condition_window)
+            first = (
+                db.query(func.min(reading.id))
+                .filter(reading.metric.in_(rule_engine.condition_metrics()), reading.ts >= since)
+                .scalar()
+            )
+            self._last_reading_id = first - 1 if first else db.query(func.max(reading.id)).scalar() or 0
+        finally:
+            db.close()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await asyncio.to_thread(self.poll)
+            except Exception as e:
+                logger.error("coordinator.poll_failed", error=str(e))
+
+    def poll(self):
+        self._polls += 1
+        self._renew_lease()
+        self._sync_state()
+        self._relay_events()
+        self._hand_over_dirty_readings()
+        if self._leader and time.monotonic() - self._maintained >= MAINTENANCE_INTERVAL:
+            self._maintained = time.monotonic()
+            self._maintain()
+
+    def _read_versions(self, db: Session) -> Dict[str, int]:
+        state = models.SharedState
+        return dict(db.query(state.name, state.value).filter(state.name.like(VERSION_PREFIX + "%")))
+
+    def _sync_state(self):
+        db = ReadSessionLocal()
+        try:
+            versions = self._read_versions(db)
+            changed = {name for name, version in versions.items() if self._versions.get(name) != version}
+            self._versions = versions
+            if VERSION_PREFIX + "rules" in changed:
+                rule_engine.load(db)
+            if VERSION_PREFIX + "contacts" in changed and recipient_index.loaded:
+                recipient_index.load(db)
+            if VERSION_PREFIX + "users" in changed:
+                token_cache.clear()
+            counters.refresh(db)
+            self._observe_readings(db)
+        finally:
+            db.close()
+
+    def _observe_readings(self, db: Session):
+        # Compound rules judge the latest reading of other metrics, wherever it was received
+        wanted = rule_engine.condition_metrics()
+        reading = models.Reading
+        if not wanted:
+            self._last_reading_id = db.query(func.max(reading.id)).scalar() or 0
+            return
+        rows = (
+            db.query(reading.id, reading.metric, reading.value, reading.location, reading.ts)
+            .filter(reading.id > self._last_reading_id, reading.metric.in_(wanted))
+            .order_by(reading.id)
+            .limit(READINGS_PER_POLL)
+            .all()
+        )
+        for reading_id, metric, value, location, ts in rows:
+            rule_engine.observe(metric, value, location, at=ts)
+        if rows:
+            self._last_reading_id = rows[-1][0]
+
+    def _relay_events(self):
+        outgoing = bus.drain()
+        if outgoing:
+            now = time.time()
+            db = SessionLocal()
+            try:
+                db.execute(insert(models.StreamEvent), [
+                    {"type": event_type, "data": json.dumps(data, default=str), "created_at": now}
+                    for event_type, data in outgoing
+                ])
+                db.commit()
+            finally:
+                db.close()
+        db = ReadSessionLocal()
+        try:
+            rows = (
+                db.query(models.StreamEvent.id, models.StreamEvent.type, models.StreamEvent.data)
+                .filter(models.StreamEvent.id > self._last_event_id)
+                .order_by(models.StreamEvent.id)
+                .all()
+            )
+        finally:
+            db.close()
+        for event_id, event_type, data in rows:
+            bus.deliver(event_type, json.loads(data))
+        if rows:
+            self._last_event_id = rows[-1][0]
+
+    def _hand_over_dirty_readings(self):
+        # Readings stored here mark minutes dirty locally, but only the leader rolls them up.
+        # Each dirty minute is a row of its own, so the leader recomputes only those minutes.
+        state = models.SharedState
+        if self._leader:
+            db = SessionLocal()
+            try:
+                stored = [
+                    minute for minute, in
+                    db.query(state.value).filter(state.name.like(READINGS_DIRTY_PREFIX + "%")).with_for_update()
+                ]
+                if stored:
+                    db.execute(delete(state).where(state.name.like(READINGS_DIRTY_PREFIX + "%"), state.value.in_(stored)))
+                db.commit()
+            finally:
+                db.close()
+            timeseries.mark_dirty(stored)
+            return
+        dirty = timeseries.take_dirty()
+        if not dirty:
+            return
+        names = {READINGS_DIRTY_PREFIX + str(minute): minute for minute in dirty}
+        db = SessionLocal()
+        try:
+            present = {name for name, in db.query(state.name).filter(state.name.in_(names))}
+            missing = [{"name": name, "value": minute} for name, minute in names.items() if name not in present]
+            if missing:
+                db.execute(insert(state), missing)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Handed over on the next poll instead
+            timeseries.mark_dirty(dirty)
+            raise
+        finally:
+            db.close()
+
+    def _renew_lease(self):
+        now = time.time()
+        if self._leader and now - self._lease_renewed < self.lease_seconds / 3:
+            return
+        lease = models.LeaderLease
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                update(lease)
+                .where(lease.name == LEADER)
+                .where((lease.holder == self.holder) | (lease.expires_at < now))
+                .values(holder=self.holder, expires_at=now + self.lease_seconds)
+            )
+            leader = result.rowcount == 1
+            if not leader and db.query(lease.name).filter(lease.name == LEADER).first() is None:
+                db.execute(insert(lease).values(name=LEADER, holder=self.holder, expires_at=now + self.lease_seconds))
+                leader = True
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            leader = False
+        finally:
+            db.close()
+        if leader != self._leader:
+            logger.info("coordinator.leader" if leader else "coordinator.follower", holder=self.holder)
+            self._maintained = 0.0
+        self._leader = leader
+        if leader:
+            self._lease_renewed = now
+
+    def _maintain(self):
+        dispatcher.recover(older_than=self.dispatch_lease)
+        db = SessionLocal()
+        try:
+            db.execute(delete(models.StreamEvent).where(models.StreamEvent.created_at < time.time() - EVENT_RETENTION))
+            db.commit()
+        finally:
+            db.close()
+
+    def _release(self):
+        if not self._leader:
+            return
+        lease = models.LeaderLease
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(lease).where(lease.name == LEADER, lease.holder == self.holder).values(expires_at=0)
+            )
+            db.commit()
+        finally:
+            db.close()
+        self._leader = False
+
+
+coordinator = Coordinator(
+    enabled=settings.shared_state,
+    poll_interval=settings.shared_state_poll_interval,
+    lease_seconds=settings.leader_lease_seconds,
+    dispatch_lease=settings.dispatch_lease_seconds,
+)
@@ -0,0 +1,200 @@
+"""
+Twilio SMS over one shared, keep-alive HTTP session.
+
+TwilioClient talks to the Messages REST endpoint directly with a pooled
+``requests.Session``, so every SMS reuses an open TLS connection. Point
+``base_url`` at a local server to run against a fake Twilio. SMSSender adds
+a token bucket that keeps the whole process under the configured
+messages-per-second limit, and caps the requests in flight at
+``concurrency``. It retries with jittered exponential backoff only when
+Twilio cannot have accepted the message: a 429 or 503 answer, or a
+connection that was never opened. The Messages API has no idempotency key,
+so a timeout or another 5xx after the request went out may still have sent
+the text. Those errors are raised with ``uncertain`` set, never retried
+here, and the dispatcher leaves the delivery for an operator to retry.
+``requests`` is imported when the first client is built, not with the app.
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Optional
+
+# Answers that mean the request was turned away unprocessed, and ones that may follow a send
+RETRY_STATUSES = {429, 503}
+UNCERTAIN_STATUSES = {500, 502, 504}
+
+
+class SMSError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False,
+                 retry_after: float = 0.0, uncertain: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+        # True when Twilio may have accepted the message despite the error
+        self.uncertain = uncertain
+
+
+def status_error(resp) -> SMSError:
+    return SMSError(
+        f"Twilio returned {resp.status_code}: {resp.text[:200]}",
+        status=resp.status_code,
+        retryable=resp.status_code in RETRY_STATUSES,
+        retry_after=parse_retry_after(resp),
+        uncertain=resp.status_code in UNCERTAIN_STATUSES,
+    )
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    # Full jitter keeps a burst of throttled senders from retrying in lockstep
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket:
+    """Token bucket shared by all sending threads and coroutines."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def _take(self) -> float:
+        """Take a token if one is available, else return how long to wait for one."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class TwilioClient:
+    def __init__(
+        self,
+        account_sid: str,
+        auth_token: str,
+        from_number: str,
+        base_url: str = "https://api.twilio.com",
+        pool_size: int = 8,
+        timeout: float = 10.0,
+    ):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.from_number = from_number
+        self.timeout = timeout
+        self.url = f"{base_url.rstrip('/')}/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self.session = requests.Session()
+        self.session.auth = (account_sid, auth_token)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def send(self, to: str, body: str) -> str:
+        """Post one message and return its SID."""
+        import requests
+        from urllib3.exceptions import NewConnectionError
+
+        try:
+            resp = self.session.post(
+                self.url,
+                data={"To": to, "From": self.from_number, "Body": body},
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            reason = getattr(e.args[0], "reason", None) if e.args else None
+            unsent = isinstance(e, requests.ConnectTimeout) or isinstance(reason, NewConnectionError)
+            raise SMSError(f"Twilio request failed: {e}", retryable=unsent, uncertain=not unsent)
+        if resp.status_code >= 400:
+            raise status_error(resp)
+        return resp.json().get("sid", "")
+
+    def warm(self):
+        """Open a keep-alive connection to the API; any response will do."""
+        self.session.get(self.url.split("/2010-04-01/")[0] + "/", timeout=self.timeout)
+
+    def close(self):
+        self.session.close()
+
+
+class SMSSender:
+    def __init__(
+        self,
+        client: TwilioClient,
+        rate_per_second: float = 10.0,
+        burst: int = 10,
+        concurrency: int = 8,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 20.0,
+    ):
+        self.client = client
+        self.bucket = TokenBucket(rate_per_second, burst)
+        self.concurrency = max(1, concurrency)
+        # At most ``concurrency`` requests in flight; backoff sleeps do not hold a slot
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._lock = threading.Lock()
+        self._stats = {"sent": 0, "failed": 0, "retries": 0, "throttled": 0}
+
+    def send(self, to: str, body: str) -> str:
+        """Send one SMS, waiting for a rate-limit token and retrying errors that cannot have sent it."""
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                with self._slots:
+                    sid = self.client.send(to, body)
+            except SMSError as e:
+                if e.status == 429:
+                    self._count("throttled")
+                if not e.retryable or attempt >= self.max_retries:
+                    self._count("failed")
+                    raise
+                time.sleep(max(backoff_delay(attempt, self.backoff_base, self.backoff_cap), e.retry_after))
+                attempt += 1
+                self._count("retries")
+                continue
+            self._count("sent")
+            return sid
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, concurrency=self.concurrency, rate_per_second=self.bucket.rate)
+
+    def close(self):
+        self.client.close()
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+
+def parse_retry_after(resp) -> float:
+    try:
+        return min(float(resp.headers.get("Retry-After", 0)), 60.0)
+    except ValueError:
+        return 0.0
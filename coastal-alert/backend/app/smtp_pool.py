@@ -0,0 +1,252 @@
+"""
+A small pool of authenticated SMTP sessions.
+
+Opening a session costs a TCP connect, STARTTLS and AUTH, which dwarfs the
+cost of sending one message. The pool keeps up to ``max_size`` sessions open
+and hands them out for many messages each. A session that has been idle for a
+while is checked with NOOP before reuse. Sessions idle past ``idle_timeout``
+are closed, and each session is recycled after ``max_messages`` sends.
+
+A message is sent in two steps. The envelope (MAIL FROM, RCPT TO) commits the
+server to nothing, so a session that died before or during it is replaced and
+the message tried once more. Once DATA has started, a dropped connection or a
+timeout may come after the server queued the message, and mail servers do not
+drop repeats. That failure is raised as ``SendUncertain`` and not retried.
+"""
+import smtplib
+import threading
+import time
+from collections import deque
+from email.message import Message
+from typing import Callable, Deque, Dict, Optional
+
+
+class SendUncertain(smtplib.SMTPException):
+    """The connection failed after DATA began; the server may or may not have queued the message."""
+    retryable = False
+    uncertain = True
+
+
+def envelope(msg: Message):
+    """(sender, [recipient]) for a message built by build_email."""
+    return msg["From"], [msg["To"]]
+
+
+class _Session:
+    __slots__ = ("smtp", "created", "last_used", "messages")
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.messages = 0
+
+
+class SMTPPool:
+    def __init__(
+        self,
+        connect: Callable[[], smtplib.SMTP],
+        max_size: int = 4,
+        idle_timeout: float = 60.0,
+        max_messages: int = 100,
+        check_after: float = 5.0,
+    ):
+        self._connect = connect
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.max_messages = max(1, max_messages)
+        # Sessions used within this many seconds are trusted without a NOOP
+        self.check_after = check_after
+        self._idle: Deque[_Session] = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._reaper: Optional[threading.Thread] = None
+        self._closed = False
+        self._stats = {
+            "opened": 0,
+            "reused": 0,
+            "reconnects": 0,
+            "closed_idle": 0,
+            "closed_recycled": 0,
+            "closed_broken": 0,
+            "messages_sent": 0,
+            "errors": 0,
+        }
+
+    def send(self, msg: Message):
+        """Send one message, retrying once on a fresh session if the old one died before DATA."""
+        sender, recipients = envelope(msg)
+        for attempt in range(2):
+            session = self._acquire()
+            try:
+                self._envelope(session.smtp, sender, recipients)
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # SMTPException is an OSError, so refusals are caught first
+                self._reject(session)
+                raise
+            except (smtplib.SMTPServerDisconnected, OSError):
+                self._discard(session)
+                with self._lock:
+                    self._stats["reconnects"] += 1
+                if attempt:
+                    with self._lock:
+                        self._stats["errors"] += 1
+                    raise
+                continue
+            except Exception:
+                self._reject(session)
+                raise
+            try:
+                code, reply = session.smtp.data(msg.as_bytes())
+                if code != 250:
+                    raise smtplib.SMTPDataError(code, reply)
+            except smtplib.SMTPDataError:
+                self._reject(session)
+                raise
+            except (smtplib.SMTPServerDisconnected, OSError) as e:
+                self._discard(session)
+                with self._lock:
+                    self._stats["errors"] += 1
+                raise SendUncertain(f"connection lost during DATA: {e}") from e
+            session.messages += 1
+            with self._lock:
+                self._stats["messages_sent"] += 1
+            self._release(session)
+            return
+
+    @staticmethod
+    def _envelope(smtp: smtplib.SMTP, sender: str, recipients):
+        smtp.ehlo_or_helo_if_needed()
+        code, reply = smtp.mail(sender)
+        if code != 250:
+            raise smtplib.SMTPSenderRefused(code, reply, sender)
+        refused = {}
+        for recipient in recipients:
+            code, reply = smtp.rcpt(recipient)
+            if code not in (250, 251):
+                refused[recipient] = (code, reply)
+        if refused:
+            raise smtplib.SMTPRecipientsRefused(refused)
+
+    def _reject(self, session: _Session):
+        # The server refused this message; reset the transaction and keep the session
+        try:
+            session.smtp.rset()
+        except (smtplib.SMTPException, OSError):
+            self._discard(session)
+        else:
+            self._release(session)
+        with self._lock:
+            self._stats["errors"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            idle = len(self._idle)
+            stats = dict(self._stats)
+        opened = stats["opened"]
+        stats.update(
+            idle=idle,
+            max_size=self.max_size,
+            messages_per_session=round(stats["messages_sent"] / opened, 2) if opened else 0.0,
+        )
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            sessions = list(self._idle)
+            self._idle.clear()
+        for session in sessions:
+            self._quit(session)
+
+    def warm(self):
+        """Open one session ahead of the first send."""
+        self._slots.acquire()
+        try:
+            session = self._open()
+        except Exception:
+            self._slots.release()
+            raise
+        self._release(session)
+
+    def _acquire(self) -> _Session:
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    session = self._idle.pop() if self._idle else None
+                if session is None:
+                    return self._open()
+                idle_for = time.monotonic() - session.last_used
+                if idle_for > self.idle_timeout:
+                    self._quit(session)
+                    with self._lock:
+                        self._stats["closed_idle"] += 1
+                    continue
+                if idle_for > self.check_after and not self._alive(session):
+                    self._quit(session)
+                    with self._lock:
+                        self._stats["closed_broken"] += 1
+                    continue
+                with self._lock:
+                    self._stats["reused"] += 1
+                return session
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, session: _Session):
+        session.last_used = time.monotonic()
+        if session.messages >= self.max_messages or self._closed:
+            self._quit(session)
+            with self._lock:
+                self._stats["closed_recycled"] += 1
+        else:
+            with self._lock:
+                self._idle.append(session)
+        self._slots.release()
+
+    def _discard(self, session: _Session):
+        self._quit(session)
+        with self._lock:
+            self._stats["closed_broken"] += 1
+        self._slots.release()
+
+    def _open(self) -> _Session:
+        session = _Session(self._connect())
+        with self._lock:
+            self._stats["opened"] += 1
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, name="smtp-pool-reaper", daemon=True)
+                self._reaper.start()
+        return session
+
+    def _reap(self):
+        # Close sessions the server would otherwise drop on us while idle
+        while not self._closed:
+            time.sleep(max(1.0, self.idle_timeout / 2))
+            now = time.monotonic()
+            expired = []
+            with self._lock:
+                while self._idle and now - self._idle[0].last_used > self.idle_timeout:
+                    expired.append(self._idle.popleft())
+                self._stats["closed_idle"] += len(expired)
+            for session in expired:
+                self._quit(session)
+
+    @staticmethod
+    def _alive(session: _Session) -> bool:
+        try:
+            return session.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    @staticmethod
+    def _quit(session: _Session):
+        try:
+            session.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            try:
+                session.smtp.close()
+            except OSError:
+                pass
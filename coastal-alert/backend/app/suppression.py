@@ -0,0 +1,199 @@
+"""
+Cooldown-based suppression of repeat alerts.
+
+A gauge that stays over threshold keeps reporting breaches. Only the first
+one in each cooldown window notifies anyone. State is keyed on (metric,
+region, severity) and records when that combination last notified. A reading
+is suppressed while the same or a higher severity has notified within
+``cooldown`` seconds. An escalation (HIGH -> CRITICAL) therefore notifies
+straight away, while a drop back to HIGH stays quiet. The state is in memory,
+and entries older than ``ttl`` are swept out as new readings arrive.
+Suppressed readings are still written to the alerts table, flagged
+``suppressed``, but nothing is queued for them.
+
+In multi-process mode the windows live in the ``suppression_windows`` table
+instead (SharedSuppressor), so a repeat is caught whichever worker receives
+it. Opening a window is a compare-and-set in the caller's transaction: of two
+workers racing on the same breach only one notifies, and an alert that rolls
+back leaves no window behind.
+
+Radius and polygon alerts (see geo.py) are keyed on their area as well, so
+two different areas in the same region do not suppress each other.
+"""
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models, regions
+from .config import settings
+from .database import ReadSessionLocal, SessionLocal
+
+SEVERITY_RANK = {"HIGH": 1, "CRITICAL": 2}
+
+# Sweep expired entries every this many checks
+SWEEP_EVERY = 1000
+
+
+def region_key(location: Optional[str], area_key: Optional[str] = None) -> str:
+    """The region part of the state key; a radius or polygon alert is its own region."""
+    region = regions.location_key(location)
+    return f"{region}@{area_key}" if area_key else region
+
+class Suppressor:
+    def __init__(self, cooldown: float, ttl: float):
+        self.cooldown = cooldown
+        self.ttl = max(ttl, cooldown)
+        self._lock = threading.Lock()
+        self._last: Dict[Tuple[str, str, str], float] = {}
+        self._checks = 0
+        self._suppressed = 0
+        self._escalations = 0
+
+    def check(self, metric: str, location: Optional[str], severity: str, now: Optional[float] = None,
+              db: Optional[Session] = None, area_key: Optional[str] = None) -> Optional[float]:
+        """Record a breach. Returns None if it should notify, else the seconds left in the cooldown."""
+        if self.cooldown <= 0:
+            return None
+        now = time.monotonic() if now is None else now
+        region = region_key(location, area_key)
+        with self._lock:
+            self._checks += 1
+            if self._checks % SWEEP_EVERY == 0:
+                self._sweep(now)
+            last = {other: self._last.get((metric, region, other)) for other in SEVERITY_RANK}
+            remaining, notified_lower = self._remaining(last, severity, now)
+            if remaining:
+                self._suppressed += 1
+                return remaining
+            if notified_lower:
+                self._escalations += 1
+            self._last[(metric, region, severity)] = now
+            return None
+
+    def _remaining(self, last: Dict[str, Optional[float]], severity: str, now: float) -> Tuple[float, bool]:
+        """(seconds left in the longest window at this severity or above, whether a lower one is open)."""
+        rank = SEVERITY_RANK.get(severity, 0)
+        remaining = 0.0
+        notified_lower = False
+        for other, other_rank in SEVERITY_RANK.items():
+            at = last.get(other)
+            if at is None or now - at >= self.cooldown:
+                continue
+            if other_rank >= rank:
+                remaining = max(remaining, self.cooldown - (now - at))
+            else:
+                notified_lower = True
+        return remaining, notified_lower
+
+    def reset(self):
+        with self._lock:
+            self._last.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "cooldown_seconds": self.cooldown,
+                "active_windows": sum(1 for last in self._last.values() if time.monotonic() - last < self.cooldown),
+                "tracked_keys": len(self._last),
+                "checks": self._checks,
+                "suppressed": self._suppressed,
+                "escalations": self._escalations,
+            }
+
+    def _sweep(self, now: float):
+        expired = [key for key, last in self._last.items() if now - last >= self.ttl]
+        for key in expired:
+            del self._last[key]
+
+
+class SharedSuppressor(Suppressor):
+    """The same policy with its state in the database, on wall-clock time, for multi-process mode."""
+
+    def check(self, metric: str, location: Optional[str], severity: str, now: Optional[float] = None,
+              db: Optional[Session] = None, area_key: Optional[str] = None) -> Optional[float]:
+        if self.cooldown <= 0:
+            return None
+        if db is None:
+            db = SessionLocal()
+            try:
+                result = self.check(metric, location, severity, now, db, area_key)
+                db.commit()
+                return result
+            finally:
+                db.close()
+        now = time.time() if now is None else now
+        region = region_key(location, area_key)
+        window = models.SuppressionWindow
+        with self._lock:
+            self._checks += 1
+            sweep = self._checks % SWEEP_EVERY == 0
+        if sweep:
+            db.execute(delete(window).where(window.notified_at < now - self.ttl))
+        last = dict(
+            db.query(window.severity, window.notified_at).filter(window.metric == metric, window.region == region)
+        )
+        remaining, notified_lower = self._remaining(last, severity, now)
+        if not remaining and not self._claim(db, metric, region, severity, last.get(severity), now):
+            # Another worker opened the window between our read and write
+            remaining = self.cooldown
+        with self._lock:
+            if remaining:
+                self._suppressed += 1
+            elif notified_lower:
+                self._escalations += 1
+        return remaining or None
+
+    def _claim(self, db: Session, metric: str, region: str, severity: str, previous: Optional[float], now: float) -> bool:
+        window = models.SuppressionWindow
+        if previous is None:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(window).values(metric=metric, region=region, severity=severity, notified_at=now))
+                return True
+            except IntegrityError:
+                return False
+        result = db.execute(
+            update(window)
+            .where(window.metric == metric, window.region == region, window.severity == severity,
+                   window.notified_at == previous)
+            .values(notified_at=now)
+        )
+        return result.rowcount == 1
+
+    def reset(self):
+        db = SessionLocal()
+        try:
+            db.execute(delete(models.SuppressionWindow))
+            db.commit()
+        finally:
+            db.close()
+
+    def stats(self):
+        window = models.SuppressionWindow
+        db = ReadSessionLocal()
+        try:
+            tracked, active = db.query(
+                func.count(window.metric),
+                func.count(window.metric).filter(window.notified_at >= time.time() - self.cooldown),
+            ).one()
+        finally:
+            db.close()
+        with self._lock:
+            return {
+                "cooldown_seconds": self.cooldown,
+                "active_windows": active,
+                "tracked_keys": tracked,
+                # These three count this process's checks only
+                "checks": self._checks,
+                "suppressed": self._suppressed,
+                "escalations": self._escalations,
+            }
+
+
+suppressor = (SharedSuppressor if settings.shared_state else Suppressor)(
+    settings.alert_cooldown_seconds, settings.suppression_ttl_seconds
+)
@@ -0,0 +1,137 @@
+"""
+Alert message templates, built once per (metric, severity, location, channel).
+
+A template is a ``str.format`` pattern with the fixed text already joined
+together. Only the reading's numbers are filled in per alert. Templates live
+in an LRU cache and have a stable id, which is a hash of their key, so the
+same id refers to the same text in every process. Each alert renders each
+channel once into an ``alert_messages`` row. Its deliveries point at that row
+instead of each carrying its own copy of the text.
+
+SMS bodies use a short form and are cut to ``sms_max_segments`` segments.
+Segments are 160 GSM-7 characters, or 70 when the text needs UCS-2, and
+fewer per part once the message is split. A long location list therefore
+cannot turn one SMS into several billed ones.
+"""
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Optional, Tuple
+
+from .config import settings
+
+GSM_BASIC = set(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM_EXTENDED = set("^{}\\[~]|€")  # sent as an escape plus the character
+
+Template = namedtuple("Template", ["id", "channel", "subject", "body"])
+
+
+def sms_units(text: str) -> Tuple[int, bool]:
+    """(length in encoding units, fits GSM-7)."""
+    units = 0
+    for ch in text:
+        if ch in GSM_BASIC:
+            units += 1
+        elif ch in GSM_EXTENDED:
+            units += 2
+        else:
+            return len(text), False
+    return units, True
+
+
+def sms_segments(text: str) -> int:
+    units, gsm = sms_units(text)
+    single, multi = (160, 153) if gsm else (70, 67)
+    if units <= single:
+        return 1
+    return -(-units // multi)
+
+
+def fit_sms(text: str, max_segments: int) -> str:
+    """Cut ``text`` so it is sent in at most ``max_segments`` segments."""
+    if max_segments <= 0 or sms_segments(text) <= max_segments:
+        return text
+    _, gsm = sms_units(text)
+    single, multi = (160, 153) if gsm else (70, 67)
+    budget = (single if max_segments == 1 else multi * max_segments) - 3
+    used = 0
+    for end, ch in enumerate(text):
+        used += (2 if ch in GSM_EXTENDED else 1) if gsm else 1
+        if used > budget:
+            return text[:end].rstrip() + "..."
+    return text
+
+
+def _escape(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def build(metric: str, severity: str, location: Optional[str], channel: str) -> Template:
+    title = metric.replace('_', ' ').title()
+    place = _escape(location.replace('|', ', ') if location else 'Coastal Region')
+    key = f"{metric}\x00{severity}\x00{location or ''}\x00{channel}"
+    template_id = hashlib.sha1(key.encode()).hexdigest()[:12]
+    if channel == "sms":
+        body = f"[{severity}] {title} {{value:.2f}} (limit {{threshold:.2f}}) at {place}. Take immediate precautions!"
+        return Template(template_id, channel, None, body)
+    body = f"COASTAL THREAT ALERT [{severity}]\\n"
+    body += f"Metric: {title}\\n"
+    body += "Current: {value:.2f} (Threshold: {threshold:.2f})\\n"
+    body += "{extra}"
+    body += f"Location: {place}\\n"
+    body += "Take immediate precautions!"
+    subject = f"[{severity}] Coastal Threat Alert - {title}"
+    return Template(template_id, channel, subject, body)
+
+
+class TemplateCache:
+    def __init__(self, maxsize: int, sms_max_segments: int):
+        self.maxsize = max(1, maxsize)
+        self.sms_max_segments = sms_max_segments
+        self._templates: "OrderedDict[tuple, Template]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, metric: str, severity: str, location: Optional[str], channel: str) -> Template:
+        key = (metric, severity, location or "", channel)
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                self._hits += 1
+                return template
+            self._misses += 1
+        template = build(metric, severity, location, channel)
+        with self._lock:
+            self._templates[key] = template
+            if len(self._templates) > self.maxsize:
+                self._templates.popitem(last=False)
+                self._evictions += 1
+        return template
+
+    def render(self, template: Template, value: float, threshold: float, count: int = 1) -> str:
+        extra = f"Readings over threshold: {count}\\n" if count > 1 else ""
+        body = template.body.format(value=value, threshold=threshold, extra=extra)
+        if template.channel == "sms":
+            body = fit_sms(body, self.sms_max_segments)
+        return body
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._templates),
+                "maxsize": self.maxsize,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else None,
+            }
+
+
+template_cache = TemplateCache(settings.template_cache_size, settings.sms_max_segments)
@@ -0,0 +1,271 @@
+"""
+Time-series store for raw sensor readings.
+
+Every reading goes into the compact ``readings`` table, which holds unix
+seconds plus a day ``bucket`` used to drop old data a whole day at a time.
+The ``alerts`` table only records breaches and the notifications they
+caused. A background job folds the raw rows into per-minute rollups and the
+minute rollups into per-hour rollups (count, min, max, sum per metric).
+Range queries then read whichever resolution keeps the answer small.
+Minutes are rolled up once they have closed. Readings that arrive late mark
+their minute dirty, and the next pass recomputes just those minutes and their
+hours. Readings older than the raw retention window are refused at ingest:
+their neighbours have been pruned, so recomputing their minute would replace a
+full rollup with one built from the late reading alone. In multi-process mode
+only the leader rolls up, so the other processes hand their dirty marks over
+through the database (see shared.py).
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from . import models, regions
+from .database import SessionLocal
+from .logs import get_logger
+
+logger = get_logger("readings")
+
+BUCKET_SECONDS = 86400
+MINUTE = 60
+HOUR = 3600
+RESOLUTIONS = {"minute": MINUTE, "hour": HOUR}
+
+# Widest window served from each resolution when resolution=auto
+RAW_MAX_SPAN = 6 * HOUR
+MINUTE_MAX_SPAN = 7 * 86400
+
+
+def to_ts(value: Optional[datetime]) -> int:
+    if value is None:
+        return int(time.time())
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def reading_row(metric: str, value: float, location: Optional[str], recorded_at: Optional[datetime] = None) -> Dict:
+    ts = to_ts(recorded_at)
+    return {
+        "metric": metric,
+        "value": value,
+        "location": regions.location_key(location) or None,
+        "ts": ts,
+        "bucket": ts // BUCKET_SECONDS,
+    }
+
+
+def retention_start(retention_days: int, now: Optional[int] = None) -> Optional[int]:
+    """Oldest reading time that ``prune`` keeps, or None when raw readings are kept forever."""
+    if retention_days <= 0:
+        return None
+    now = int(time.time()) if now is None else now
+    return (now // BUCKET_SECONDS - retention_days) * BUCKET_SECONDS
+
+
+def age_error(recorded_at: Optional[datetime], retention_days: int) -> Optional[str]:
+    """Why a reading cannot be stored because it is older than the raw retention window, if it is."""
+    oldest = retention_start(retention_days)
+    if recorded_at is None or oldest is None or to_ts(recorded_at) >= oldest:
+        return None
+    return f"recorded_at is older than the {retention_days}-day readings retention window"
+
+
+def bucket_ranges(starts: Iterable[int], width: int) -> List[Tuple[int, int]]:
+    """Merge bucket starts into [start, end) ranges of adjacent buckets."""
+    ranges: List[Tuple[int, int]] = []
+    for start in sorted(set(starts)):
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], start + width)
+        else:
+            ranges.append((start, start + width))
+    return ranges
+
+
+def choose_resolution(span: int) -> str:
+    if span <= RAW_MAX_SPAN:
+        return "raw"
+    if span <= MINUTE_MAX_SPAN:
+        return "minute"
+    return "hour"
+
+
+class TimeSeries:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirty: Set[int] = set()  # minute starts with readings not yet rolled up
+        self._task = None
+
+    def add(self, db: Session, rows: List[Dict]) -> int:
+        """Insert readings in the caller's transaction."""
+        if not rows:
+            return 0
+        db.execute(insert(models.Reading), rows)
+        self.mark_dirty(row["ts"] for row in rows)
+        return len(rows)
+
+    def mark_dirty(self, timestamps: Iterable[int]):
+        minutes = {ts - ts % MINUTE for ts in timestamps}
+        with self._lock:
+            self._dirty |= minutes
+
+    def take_dirty(self) -> Set[int]:
+        """Minutes that got readings since the last call (or roll-up), clearing the marks."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def query(self, db: Session, metric: str, since: int, until: int, resolution: str = "auto",
+              location: Optional[str] = None, limit: int = 2000) -> Dict:
+        if resolution == "auto":
+            # Rollups are per metric only; a location filter needs the raw rows
+            resolution = "raw" if location else choose_resolution(until - since)
+        if resolution == "raw":
+            query = db.query(models.Reading.ts, models.Reading.value, models.Reading.location).filter(
+                models.Reading.metric == metric,
+                models.Reading.ts >= since,
+                models.Reading.ts < until,
+            )
+            if location:
+                query = query.filter(models.Reading.location == regions.location_key(location))
+            rows = query.order_by(models.Reading.ts).limit(limit + 1).all()
+            points = [{"t": ts, "value": value, "location": loc} for ts, value, loc in rows[:limit]]
+        else:
+            width = RESOLUTIONS[resolution]
+            rollup = models.ReadingRollup
+            rows = (
+                db.query(rollup.start, rollup.count, rollup.min_value, rollup.max_value, rollup.sum_value)
+                .filter(
+                    rollup.resolution == width,
+                    rollup.metric == metric,
+                    rollup.start >= since - since % width,
+                    rollup.start < until,
+                )
+                .order_by(rollup.start)
+                .limit(limit + 1)
+                .all()
+            )
+            points = [
+                {"t": start, "count": count, "min": low, "max": high, "avg": total / count if count else None}
+                for start, count, low, high, total in rows[:limit]
+            ]
+        return {
+            "metric": metric,
+            "resolution": resolution,
+            "since": since,
+            "until": until,
+            "truncated": len(rows) > limit,
+            "points": points,
+        }
+
+    def roll_up(self, db: Session, now: Optional[int] = None, retention_days: int = 0) -> int:
+        """Recompute closed minute and hour buckets that have new data. Returns rows written."""
+        now = int(time.time()) if now is None else now
+        dirty = self.take_dirty()
+        # Past the retention window the raw readings are gone, so those rollups are final
+        oldest = retention_start(retention_days, now)
+        kept = {minute for minute in dirty if oldest is None or minute >= oldest}
+        try:
+            written = self._roll(db, MINUTE, kept, now)
+            written += self._roll(db, HOUR, {minute - minute % HOUR for minute in kept}, now)
+            db.commit()
+        except Exception:
+            db.rollback()
+            self.mark_dirty(dirty)
+            raise
+        return written
+
+    def _roll(self, db: Session, width: int, dirty: Set[int], now: int) -> int:
+        rollup = models.ReadingRollup
+        source_ts = models.Reading.ts if width == MINUTE else rollup.start
+        source_filter = () if width == MINUTE else (rollup.resolution == MINUTE,)
+
+        # Resume at the last bucket written (it may have been partial), or at the oldest data
+        start = db.query(func.max(rollup.start)).filter(rollup.resolution == width).scalar()
+        if start is None:
+            start = db.query(func.min(source_ts)).filter(*source_filter).scalar()
+            if start is None:
+                return 0
+        start -= start % width
+        end = now - now % width
+        # Earlier buckets are only recomputed where late readings landed
+        ranges = bucket_ranges((bucket for bucket in dirty if bucket < start), width)
+        if start < end:
+            ranges.append((start, end))
+        return sum(self._rebuild(db, width, low, high) for low, high in ranges)
+
+    def _rebuild(self, db: Session, width: int, start: int, end: int) -> int:
+        """Replace the ``width`` rollups in [start, end) with ones computed from their source rows."""
+        rollup = models.ReadingRollup
+        if width == MINUTE:
+            source = models.Reading
+            source_ts = source.ts
+            columns = (func.count(source.id), func.min(source.value), func.max(source.value), func.sum(source.value))
+            source_filter = ()
+        else:
+            source = rollup
+            source_ts = rollup.start
+            columns = (func.sum(rollup.count), func.min(rollup.min_value), func.max(rollup.max_value), func.sum(rollup.sum_value))
+            source_filter = (rollup.resolution == MINUTE,)
+
+        bucket = (source_ts // width) * width
+        rows = (
+            select(bucket, source.metric, *columns)
+            .where(source_ts >= start, source_ts < end, *source_filter)
+            .group_by(bucket, source.metric)
+        )
+        db.execute(delete(rollup).where(rollup.resolution == width, rollup.start >= start, rollup.start < end))
+        values = [
+            {"resolution": width, "start": bucket_start, "metric": metric, "count": count,
+             "min_value": low, "max_value": high, "sum_value": total}
+            for bucket_start, metric, count, low, high, total in db.execute(rows)
+        ]
+        if values:
+            db.execute(insert(rollup), values)
+        return len(values)
+
+    def prune(self, db: Session, retention_days: int) -> int:
+        """Drop raw readings older than the retention window, a whole day bucket at a time."""
+        if retention_days <= 0:
+            return 0
+        cutoff = retention_start(retention_days) // BUCKET_SECONDS
+        result = db.execute(delete(models.Reading).where(models.Reading.bucket < cutoff))
+        db.commit()
+        return result.rowcount
+
+    def start(self, interval: float, retention_days: int, when: Optional[Callable[[], bool]] = None):
+        """Roll up and prune every ``interval`` seconds, skipping rounds where ``when()`` is false."""
+        if self._task is None and interval > 0:
+            self._task = asyncio.create_task(self._run_forever(interval, retention_days, when))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run_forever(self, interval: float, retention_days: int, when: Optional[Callable[[], bool]]):
+        while True:
+            await asyncio.sleep(interval)
+            if when is not None and not when():
+                continue
+            try:
+                await asyncio.to_thread(self._run_once, retention_days)
+            except Exception as e:
+                logger.error("readings.rollup_failed", error=str(e))
+
+    def _run_once(self, retention_days: int):
+        db = SessionLocal()
+        try:
+            self.roll_up(db, retention_days=retention_days)
+            pruned = self.prune(db, retention_days)
+            if pruned:
+                logger.info("readings.pruned", readings=pruned, retention_days=retention_days)
+        finally:
+            db.close()
+
+
+timeseries = TimeSeries()
@@ -0,0 +1,71 @@
+"""
+A dispatcher process for multi-worker deployments.
+
+    SHARED_STATE=true python -m app.worker
+
+It sends the deliveries that API workers queue, sharing the queue with any
+other dispatcher processes through the database (see dispatcher.py), and
+takes its turn at the scheduled jobs when it holds the leader lease (see
+shared.py). Run the API with ``SHARED_STATE=true RUN_DISPATCHER=false`` so
+that only these processes send. Apply migrations first with
+``python -m app.migrations`` (or start the API, which applies them). SIGINT or SIGTERM finishes the batches in
+flight and exits.
+"""
+import asyncio
+import signal
+
+from .async_notifier import async_notifier
+from .config import settings
+from .counters import counters
+from .database import SessionLocal
+from .dispatcher import dispatcher
+from .events import bus
+from .logs import configure_logging, get_logger
+from .notifier import notifier
+from .shared import coordinator
+from .timeseries import timeseries
+
+logger = get_logger("worker")
+
+
+async def run():
+    loop = asyncio.get_running_loop()
+    stopping = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    bus.bind(loop)
+    db = SessionLocal()
+    try:
+        counters.load(db)
+    finally:
+        db.close()
+    await coordinator.start()
+    await dispatcher.start()
+    try:
+        await dispatcher.warm()
+    except Exception as e:
+        logger.error("worker.warm_failed", error=str(e))
+    counters.start_reconciler(settings.counters_reconcile_interval, when=coordinator.leads)
+    timeseries.start(settings.readings_rollup_interval, settings.readings_retention_days, when=coordinator.leads)
+    logger.info("worker.started", holder=coordinator.holder, shared_state=settings.shared_state)
+
+    await stopping.wait()
+    logger.info("worker.stopping", holder=coordinator.holder)
+    timeseries.stop()
+    counters.stop_reconciler()
+    await dispatcher.stop()
+    await coordinator.stop()
+    await async_notifier.aclose()
+    notifier.close()
+
+
+def main():
+    configure_logging()
+    if not settings.shared_state:
+        logger.warning("worker.not_shared", hint="set SHARED_STATE=true, or this process competes with the API's dispatcher")
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
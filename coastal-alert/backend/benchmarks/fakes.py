@@ -0,0 +1,206 @@
+"""
+Local stand-ins for Twilio and an SMTP relay, for benchmarks.
+
+Both run on one asyncio loop, have a configurable latency per message and
+error rate, and count what they receive. FakeTwilio speaks just enough
+HTTP/1.1 (keep-alive, Content-Length bodies) for httpx and requests. Each
+response is written in a single write, because splitting headers and body
+across two small writes makes the client wait for delayed ACKs. FakeSMTP
+accepts EHLO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA, RSET, NOOP and QUIT
+without TLS. Point the app at it with ``SMTP_STARTTLS=false``.
+
+Run standalone with ``python -m benchmarks.fakes --sms-port 8025 --smtp-port 2525``.
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+
+class FakeProvider:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.stats = {"received": 0, "accepted": 0, "rejected": 0, "connections": 0}
+        self.first_at: Optional[float] = None
+        self.last_at: Optional[float] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def _delay(self):
+        latency = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            await asyncio.sleep(latency / 1000)
+
+    def _record(self, accepted: bool):
+        now = time.perf_counter()
+        self.first_at = self.first_at or now
+        self.last_at = now
+        self.stats["received"] += 1
+        self.stats["accepted" if accepted else "rejected"] += 1
+
+    def _fail(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+    async def start(self, host: str, port: int):
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def snapshot(self) -> Dict:
+        return dict(self.stats)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        raise NotImplementedError
+
+
+class FakeTwilio(FakeProvider):
+    async def _handle(self, reader, writer):
+        self.stats["connections"] += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n")[1:]:
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length = int(value.strip())
+                if length:
+                    await reader.readexactly(length)
+                await self._delay()
+                if self._fail():
+                    self._record(False)
+                    status, body = "503 Service Unavailable", {"code": 20503, "message": "Injected failure"}
+                else:
+                    self._record(True)
+                    status, body = "201 Created", {"sid": f"SM{random.getrandbits(128):032x}", "status": "queued"}
+                payload = json.dumps(body).encode()
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\nConnection: keep-alive\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class FakeSMTP(FakeProvider):
+    async def _handle(self, reader, writer):
+        self.stats["connections"] += 1
+
+        async def reply(text: str):
+            writer.write(text.encode() + b"\r\n")
+            await writer.drain()
+
+        try:
+            await reply("220 fake-smtp ready")
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip()
+                verb = command.split(" ", 1)[0].upper()
+                if verb in ("EHLO", "HELO"):
+                    await reply("250-fake-smtp\r\n250-AUTH PLAIN LOGIN\r\n250-8BITMIME\r\n250 SIZE 10485760")
+                elif verb == "AUTH":
+                    parts = command.split()
+                    if len(parts) >= 2 and parts[1].upper() == "LOGIN":
+                        await reply("334 VXNlcm5hbWU6")
+                        await reader.readline()
+                        await reply("334 UGFzc3dvcmQ6")
+                        await reader.readline()
+                    elif len(parts) == 2:
+                        await reply("334 ")
+                        await reader.readline()
+                    await reply("235 2.7.0 Authentication successful")
+                elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                    await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    await reader.readuntil(b"\r\n.\r\n")
+                    await self._delay()
+                    if self._fail():
+                        self._record(False)
+                        await reply("451 4.3.0 Injected failure")
+                    else:
+                        self._record(True)
+                        await reply("250 2.0.0 Queued")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class FakeProviders:
+    """Both fakes on a background event loop thread, for use from synchronous code."""
+
+    def __init__(self, sms: FakeTwilio, smtp: FakeSMTP, host: str = "127.0.0.1"):
+        self.sms = sms
+        self.smtp = smtp
+        self.host = host
+        self.sms_port = 0
+        self.smtp_port = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="fake-providers", daemon=True)
+
+    def start(self, sms_port: int = 0, smtp_port: int = 0):
+        self._thread.start()
+        self.sms_port = self._call(self.sms.start(self.host, sms_port))
+        self.smtp_port = self._call(self.smtp.start(self.host, smtp_port))
+        return self
+
+    def stop(self):
+        self._call(self.sms.stop())
+        self._call(self.smtp.stop())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    def delivered(self) -> int:
+        return self.sms.stats["accepted"] + self.smtp.stats["accepted"]
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+
+async def _serve(args):
+    sms = FakeTwilio(args.latency_ms, args.jitter_ms, args.sms_error_rate)
+    smtp = FakeSMTP(args.latency_ms, args.jitter_ms, args.smtp_error_rate)
+    sms_port = await sms.start(args.host, args.sms_port)
+    smtp_port = await smtp.start(args.host, args.smtp_port)
+    print(f"Fake Twilio on http://{args.host}:{sms_port}, fake SMTP on {args.host}:{smtp_port}")
+    while True:
+        await asyncio.sleep(10)
+        print(f"sms={sms.snapshot()} smtp={smtp.snapshot()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fake Twilio and SMTP servers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--sms-port", type=int, default=8025)
+    parser.add_argument("--smtp-port", type=int, default=2525)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--sms-error-rate", type=float, default=0.0)
+    parser.add_argument("--smtp-error-rate", type=float, default=0.0)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
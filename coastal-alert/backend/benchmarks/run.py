@@ -0,0 +1,362 @@
+"""
+End-to-end benchmark: seeded database, real server, fake providers.
+
+Steps:
+
+1. start the fake Twilio and SMTP servers (see fakes.py)
+2. seed a fresh SQLite database with N contacts (see seed.py)
+3. time ``import app.main`` in a fresh interpreter, listing the slowest imports
+4. start the app under uvicorn in a subprocess, pointed at both fakes, and
+   time how long it takes to answer /api/health/live and /api/health/ready
+5. trigger alerts to every contact, timing the API response, the first
+   delivery reaching a provider, and the whole fan-out
+6. measure p50/p95/p99 latency of the read endpoints
+7. log in as a seeded admin in a burst, timing the logins and /api/stats
+   while they run, then time /api/auth/me with the token (the verified-token
+   cache; compare against ``--auth-cache-ttl 0``)
+8. write a JSON report with the settings, results and the git commit
+
+    cd backend
+    python -m benchmarks.run --contacts 100000 --latency-ms 20 --error-rate 0.01
+
+Reports go to ``benchmarks/results/`` by default, one file per run, so runs
+can be compared over time. Peak memory is the server's VmHWM, which is only
+available on Linux.
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+from .fakes import FakeProviders, FakeSMTP, FakeTwilio
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+API_ENDPOINTS = ("/api/contacts?limit=100", "/api/stats", "/api/alerts/logs?limit=100")
+ADMIN_EMAIL = "admin@bench.example"
+ADMIN_PASSWORD = "bench-password"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_summary(samples: List[float]) -> Dict:
+    ms = [s * 1000 for s in samples]
+    return {
+        "count": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3) if ms else None,
+        "p50_ms": round(percentile(ms, 50), 3) if ms else None,
+        "p95_ms": round(percentile(ms, 95), 3) if ms else None,
+        "p99_ms": round(percentile(ms, 99), 3) if ms else None,
+        "max_ms": round(max(ms), 3) if ms else None,
+    }
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def server_env(args, db_path: str, providers: FakeProviders) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "TWILIO_ACCOUNT_SID": "ACbenchmark",
+        "TWILIO_AUTH_TOKEN": "benchmark",
+        "TWILIO_PHONE_NUMBER": "+15550000000",
+        "TWILIO_API_BASE": f"http://{providers.host}:{providers.sms_port}",
+        "SMS_RATE_PER_SECOND": "0",
+        "SMS_CONCURRENCY": str(args.sms_concurrency),
+        "SMTP_HOST": providers.host,
+        "SMTP_PORT": str(providers.smtp_port),
+        "SMTP_USERNAME": "bench",
+        "SMTP_PASSWORD": "bench",
+        "SMTP_FROM": "alerts@bench.example",
+        "SMTP_STARTTLS": "false",
+        "SMTP_POOL_SIZE": str(args.smtp_pool_size),
+        "ALERT_COOLDOWN_SECONDS": "0",
+        "DELIVERY_MAX_ATTEMPTS": str(args.max_attempts),
+        "LOG_SAMPLE_RATE": str(args.log_sample_rate),
+        "LOG_LEVEL": "WARNING" if args.quiet else "INFO",
+        "AUTH_TOKEN_CACHE_TTL": str(args.auth_cache_ttl),
+        "AUTH_HASH_WORKERS": str(args.hash_workers),
+    })
+    return env
+
+
+def measure_import(app_dir: str, env: Dict[str, str], top: int = 10) -> Dict:
+    """Milliseconds to import the app in a fresh interpreter, and the slowest packages it pulls in."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=app_dir, env=env, capture_output=True, text=True, check=True,
+    )
+    wall = time.perf_counter() - started
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        # A package's first import includes its submodules; app.main includes everything
+        if cumulative.strip().isdigit() and ("." not in name or name == "app.main"):
+            modules.append((int(cumulative) / 1000, name))
+    modules.sort(reverse=True)
+    return {
+        "wall_ms": round(wall * 1000, 1),
+        "slowest_ms": {name: round(ms, 1) for ms, name in modules[:top]},
+    }
+
+
+def wait_for(client: httpx.Client, server: subprocess.Popen, path: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            if client.get(path).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"Server did not answer {path}")
+
+
+def run_alert(client: httpx.Client, providers: FakeProviders, value: float, location: Optional[str], timeout: float) -> Dict:
+    providers.sms.first_at = providers.smtp.first_at = None
+    started = time.perf_counter()
+    response = client.post("/api/alerts", json={"metric": "water_level", "value": value, "location": location})
+    accepted = time.perf_counter() - started
+    body = response.json()
+    result = {"status_code": response.status_code, "accept_ms": round(accepted * 1000, 3)}
+    alert_id = body.get("alert_id")
+    if not alert_id:
+        result["error"] = body
+        return result
+    status = {}
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        status = client.get(f"/api/alerts/{alert_id}/status").json()
+        if status.get("done"):
+            break
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    first = [t for t in (providers.sms.first_at, providers.smtp.first_at) if t is not None]
+    total = status.get("total", 0)
+    result.update(
+        alert_id=alert_id,
+        notifications=total,
+        sent=status.get("sent", 0),
+        failed=status.get("failed", 0),
+        retry=status.get("retry", 0),
+        completed=bool(status.get("done")),
+        first_delivery_ms=round((min(first) - started) * 1000, 3) if first else None,
+        end_to_end_ms=round(elapsed * 1000, 3),
+        notifications_per_second=round(total / elapsed, 1) if elapsed else None,
+    )
+    return result
+
+
+def measure_endpoint(base_url: str, path: str, requests: int, concurrency: int,
+                     headers: Optional[Dict[str, str]] = None, login: bool = False) -> Dict:
+    """Latency of ``requests`` GETs of ``path``, or admin logins with ``login``."""
+    samples: List[float] = []
+    errors = 0
+    with httpx.Client(base_url=base_url, timeout=60, headers=headers,
+                      limits=httpx.Limits(max_connections=concurrency)) as client:
+        def one(_):
+            started = time.perf_counter()
+            if login:
+                response = client.post("/api/auth/login", data={"username": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+            else:
+                response = client.get(path)
+            return time.perf_counter() - started, response.status_code == 200
+
+        wall = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for elapsed, ok in pool.map(one, range(requests)):
+                samples.append(elapsed)
+                errors += not ok
+        wall = time.perf_counter() - wall
+    return {**latency_summary(samples), "errors": errors, "requests_per_second": round(requests / wall, 1)}
+
+
+def measure_auth(base_url: str, args) -> Dict:
+    """A login burst with /api/stats timed alongside it, then authenticated requests."""
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        logins = pool.submit(measure_endpoint, base_url, "/api/auth/login", args.logins, args.concurrency, login=True)
+        during = pool.submit(measure_endpoint, base_url, "/api/stats", args.logins, 4)
+        result = {"login": logins.result(), "stats_during_logins": during.result()}
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        token = client.post("/api/auth/login", data={"username": ADMIN_EMAIL, "password": ADMIN_PASSWORD}).json()["access_token"]
+    result["me"] = measure_endpoint(base_url, "/api/auth/me", args.api_requests, args.concurrency,
+                                    headers={"Authorization": f"Bearer {token}"})
+    return result
+
+
+def run(args) -> Dict:
+    workdir = tempfile.mkdtemp(prefix="coastal-bench-")
+    db_path = os.path.join(workdir, "bench.db")
+    providers = FakeProviders(
+        FakeTwilio(args.latency_ms, args.jitter_ms, args.error_rate),
+        FakeSMTP(args.latency_ms, args.jitter_ms, args.error_rate),
+    ).start()
+    env = server_env(args, db_path, providers)
+    server = None
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "keep")},
+    }
+    try:
+        print(f"Seeding {args.contacts} contacts...")
+        seeded = subprocess.run(
+            [sys.executable, "-m", "benchmarks.seed", "--contacts", str(args.contacts),
+             "--admin-email", ADMIN_EMAIL, "--admin-password", ADMIN_PASSWORD],
+            cwd=args.app_dir, env={**env, "PYTHONPATH": os.pathsep.join([BACKEND_DIR, args.app_dir])},
+            capture_output=True, text=True, check=True,
+        )
+        report["seed"] = json.loads(seeded.stdout.strip().splitlines()[-1])
+        report["import"] = measure_import(args.app_dir, env)
+
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        log = open(os.path.join(workdir, "server.log"), "w")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning", "--no-access-log"],
+            cwd=args.app_dir, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        with httpx.Client(base_url=base_url, timeout=120) as client:
+            started = time.perf_counter()
+            wait_for(client, server, "/api/health/live", args.startup_timeout)
+            report["live_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            wait_for(client, server, "/api/health/ready", args.startup_timeout)
+            report["startup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            report["server_startup"] = client.get("/api/health/ready").json()
+
+            print(f"Triggering {args.alerts} alerts...")
+            alerts = [
+                run_alert(client, providers, 10.0 + i, args.location, args.alert_timeout)
+                for i in range(args.alerts)
+            ]
+            report["alerts"] = alerts
+            done = [a for a in alerts if a.get("completed")]
+            report["alerts_summary"] = {
+                "completed": len(done),
+                "accept_ms": latency_summary([a["accept_ms"] / 1000 for a in alerts]),
+                "end_to_end_ms": latency_summary([a["end_to_end_ms"] / 1000 for a in done]),
+                "notifications_per_second": round(statistics.fmean(a["notifications_per_second"] for a in done), 1) if done else None,
+            }
+
+            print(f"Measuring API latency ({args.api_requests} requests x {len(API_ENDPOINTS)} endpoints)...")
+            report["api"] = {
+                path.split("?")[0]: measure_endpoint(base_url, path, args.api_requests, args.concurrency)
+                for path in API_ENDPOINTS
+            }
+
+            print(f"Measuring logins ({args.logins}) and authenticated requests...")
+            report["auth"] = measure_auth(base_url, args)
+        report["server"] = {"peak_rss_mb": peak_rss_mb(server.pid)}
+        report["providers"] = {"sms": providers.sms.snapshot(), "smtp": providers.smtp.snapshot()}
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        providers.stop()
+        if args.keep:
+            print(f"Kept work directory {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark alert fan-out and API latency")
+    parser.add_argument("--contacts", type=int, default=10000)
+    parser.add_argument("--alerts", type=int, default=3)
+    parser.add_argument("--location", default=None, help="Target region; default is every contact")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Fake provider latency per message")
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of sends the fakes reject")
+    parser.add_argument("--max-attempts", type=int, default=1, help="DELIVERY_MAX_ATTEMPTS for the server")
+    parser.add_argument("--sms-concurrency", type=int, default=64)
+    parser.add_argument("--smtp-pool-size", type=int, default=16)
+    parser.add_argument("--api-requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--logins", type=int, default=50, help="Admin logins in the login burst")
+    parser.add_argument("--auth-cache-ttl", type=float, default=60.0, help="AUTH_TOKEN_CACHE_TTL (0 disables the cache)")
+    parser.add_argument("--hash-workers", type=int, default=2, help="AUTH_HASH_WORKERS (0 checks on the threadpool)")
+    parser.add_argument("--alert-timeout", type=float, default=600.0)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--log-sample-rate", type=float, default=0.001)
+    parser.add_argument("--quiet", action="store_true", help="Server logs warnings only")
+    parser.add_argument("--app-dir", default=BACKEND_DIR, help="Directory containing the app package")
+    parser.add_argument("--output", help="Report path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--keep", action="store_true", help="Keep the database and server log")
+    args = parser.parse_args()
+
+    report = run(args)
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Import {report['import']['wall_ms']} ms, live after {report['live_ms']} ms, "
+          f"ready after {report['startup_ms']} ms")
+    summary = report["alerts_summary"]
+    print(f"Alerts: {summary['completed']}/{args.alerts} completed, "
+          f"end-to-end p50 {summary['end_to_end_ms']['p50_ms']} ms, {summary['notifications_per_second']} notifications/s")
+    for path, stats in report["api"].items():
+        print(f"{path}: p50 {stats['p50_ms']} ms, p99 {stats['p99_ms']} ms, {stats['requests_per_second']} req/s")
+    auth = report["auth"]
+    print(f"Logins: p50 {auth['login']['p50_ms']} ms, {auth['login']['requests_per_second']} /s; "
+          f"/api/stats meanwhile p99 {auth['stats_during_logins']['p99_ms']} ms; "
+          f"/api/auth/me p50 {auth['me']['p50_ms']} ms, p99 {auth['me']['p99_ms']} ms")
+    print(f"Peak server memory: {report['server']['peak_rss_mb']} MB")
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
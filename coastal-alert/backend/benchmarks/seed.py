@@ -0,0 +1,97 @@
+"""
+Seed a database with N synthetic contacts for benchmarks.
+
+Contacts go through the same bulk import path as ``POST /api/contacts/bulk``,
+so region tokens and counters are written exactly as in production. The
+target database is taken from ``DATABASE_URL``. ``--admin-email`` and
+``--admin-password`` also add an admin user to log in as.
+
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.seed --contacts 100000
+"""
+import argparse
+import io
+import json
+import time
+
+REGIONS = [
+    "Mumbai", "Goa", "Kochi", "Chennai", "Puri", "Vizag", "Kolkata", "Mangalore",
+    "Surat", "Kandla", "Pondicherry", "Tuticorin", "Paradip", "Karwar", "Ratnagiri", "Digha",
+]
+
+
+class ContactStream(io.RawIOBase):
+    """NDJSON contacts generated on the fly, so a million rows never sit in memory."""
+
+    def __init__(self, count: int, start: int = 0):
+        self._rows = self._generate(count, start)
+        self._buffer = b""
+
+    @staticmethod
+    def _generate(count: int, start: int):
+        for i in range(start, start + count):
+            yield (json.dumps({
+                "name": f"Bench Contact {i}",
+                "phone": f"+1{5550000000 + i}",
+                "email": f"contact{i}@bench.example",
+                "region": REGIONS[i % len(REGIONS)],
+            }) + "\n").encode()
+
+    def readable(self):
+        return True
+
+    def readinto(self, target) -> int:
+        while len(self._buffer) < len(target):
+            chunk = next(self._rows, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def seed(count: int, chunk_size: int = 5000) -> dict:
+    from app import bulk
+    from app.database import SessionLocal
+    from app.migrations import run_migrations
+
+    run_migrations()
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        report = bulk.import_contacts(db, io.BufferedReader(ContactStream(count)), "ndjson", chunk_size=chunk_size, max_errors=10)
+        report["seconds"] = round(time.perf_counter() - started, 3)
+        return report
+    finally:
+        db.close()
+
+
+def seed_admin(email: str, password: str):
+    from app import models
+    from app.database import SessionLocal
+    from app.passwords import hash_password
+
+    db = SessionLocal()
+    try:
+        db.add(models.User(name="Bench Admin", email=email, hashed_password=hash_password(password), is_admin=True))
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed synthetic contacts")
+    parser.add_argument("--contacts", type=int, default=10000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--admin-email")
+    parser.add_argument("--admin-password")
+    args = parser.parse_args()
+    report = seed(args.contacts, args.chunk_size)
+    if args.admin_email and args.admin_password:
+        seed_admin(args.admin_email, args.admin_password)
+    print(json.dumps({k: report[k] for k in ("rows", "inserted", "duplicates", "invalid", "seconds")}))
+
+
+if __name__ == "__main__":
+    main()
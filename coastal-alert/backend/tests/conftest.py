@@ -0,0 +1,20 @@
+import os
+import tempfile
+
+# Settings are read when the app is imported, so point it at a scratch database first
+_data_dir = tempfile.mkdtemp(prefix="coastal-alert-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_data_dir, 'alerts.db')}"
+os.environ["AUTH_HASH_WORKERS"] = "0"
+# Tests that send run a Dispatcher of their own against a fake notifier
+os.environ["RUN_DISPATCHER"] = "false"
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+
+    with TestClient(app) as c:
+        yield c
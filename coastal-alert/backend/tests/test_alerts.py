@@ -0,0 +1,49 @@
+import pytest
+
+
+@pytest.fixture(scope="module")
+def goa_only_metric(client):
+    """A metric whose only rule is scoped to Goa, so readings elsewhere match no rule."""
+    rule = {"metric": "tide_level", "region": "Goa", "bands": [{"severity": "HIGH", "above": 2.0}]}
+    r = client.post("/api/rules", json=rule)
+    assert r.status_code == 200, r.text
+    return rule["metric"]
+
+
+@pytest.mark.parametrize("location", [None, "Mumbai"])
+def test_alert_without_applicable_rule_is_normal(client, goa_only_metric, location):
+    r = client.post("/api/alerts", json={"metric": goa_only_metric, "value": 9.0, "location": location})
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["alert"] is False
+    assert body["severity"] == "NORMAL"
+    assert "not covered by any rule" in body["message"]
+
+
+def test_dry_run_without_applicable_rule_is_normal(client, goa_only_metric):
+    r = client.post("/api/alerts?dry_run=true", json={"metric": goa_only_metric, "value": 9.0, "location": "Mumbai"})
+    assert r.status_code == 200, r.text
+    assert r.json()["severity"] == "NORMAL"
+
+
+def test_test_alert_without_applicable_rule_logs_nothing(client, goa_only_metric):
+    r = client.post("/api/test/alert", json={"metric": goa_only_metric, "value": 9.0, "location": "Mumbai"})
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["severity"] == "NORMAL"
+    assert body["threshold"] is None
+    assert body["log_id"] is None
+    assert "None" not in body["message"]
+
+
+def test_alert_with_applicable_rule_still_fires(client, goa_only_metric):
+    r = client.post("/api/alerts", json={"metric": goa_only_metric, "value": 9.0, "location": "Goa"})
+    assert r.status_code == 200, r.text
+    assert r.json()["severity"] == "HIGH"
+
+
+def test_readings_default_window_includes_this_second(client):
+    r = client.post("/api/alerts", json={"metric": "water_level", "value": 0.5})
+    assert r.status_code == 200, r.text
+    points = client.get("/api/readings", params={"metric": "water_level", "resolution": "raw"}).json()["points"]
+    assert [p["value"] for p in points] == [0.5], "a reading stored this second is missing from the default window"
@@ -0,0 +1,31 @@
+import sqlite3
+import time
+
+import pytest
+
+from app.auth import create_access_token, verify_token
+from app.config import settings
+
+
+@pytest.fixture
+def write_lock(client):
+    """Another connection holding SQLite's write lock, as a long ingest would."""
+    writer = sqlite3.connect(settings.database_url[len("sqlite:///"):], isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    yield
+    writer.execute("ROLLBACK")
+    writer.close()
+
+
+def test_token_check_does_not_wait_for_writers(write_lock):
+    started = time.monotonic()
+    user, expires_at = verify_token(create_access_token({"sub": "nobody@example.com"}))
+    assert time.monotonic() - started < 1
+    assert user is None and expires_at > 0
+
+
+def test_login_does_not_wait_for_writers(client, write_lock):
+    started = time.monotonic()
+    resp = client.post("/api/auth/login", data={"username": "nobody@example.com", "password": "x"})
+    assert time.monotonic() - started < 1
+    assert resp.status_code == 401
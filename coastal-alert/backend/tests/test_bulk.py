@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+
+
+@pytest.fixture
+def existing(client):
+    r = client.post("/api/contacts", json={"name": "Already here", "phone": "+15550000001", "email": "here@bulk.test"})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def stored(*phones):
+    db = SessionLocal()
+    try:
+        return {p for p, in db.query(models.Contact.phone).filter(models.Contact.phone.in_(phones))}
+    finally:
+        db.close()
+
+
+def test_csv_import_reports_bad_and_duplicate_rows(client, existing, monkeypatch):
+    # Small chunks, so rows are checked against contacts stored by an earlier chunk too
+    monkeypatch.setattr(settings, "bulk_import_chunk_size", 2)
+    csv_text = "\n".join([
+        "Name,Phone,Email,Region,Latitude,Longitude",
+        "Valid One,+15550000010,,Goa,,",                # line 2
+        "No Contact,,,Goa,,",                           # line 3: neither phone nor email
+        "Same Phone,+15550000010,,Goa,,",               # line 4: repeats line 2
+        "Stored Email,+15550000011,here@bulk.test,,,",  # line 5: already in the database
+        "Half Position,+15550000012,,,15.5,",           # line 6: latitude without longitude
+        "Valid Two,+15550000013,two@bulk.test,,0,0",    # line 7: 0,0 is a real position
+        "Valid Three,,three@bulk.test,,,",              # line 8
+    ]) + "\n"
+    r = client.post("/api/contacts/bulk", files={"file": ("contacts.csv", csv_text, "text/csv")})
+    assert r.status_code == 200, r.text
+    report = r.json()
+    assert {k: report[k] for k in ("rows", "inserted", "duplicates", "invalid")} == {
+        "rows": 7, "inserted": 3, "duplicates": 2, "invalid": 2,
+    }
+    assert [e["line"] for e in report["errors"]] == [3, 4, 5, 6]
+    assert "earlier in file" in report["errors"][1]["error"]
+    assert "already exists" in report["errors"][2]["error"]
+    assert report["errors_truncated"] is False
+    assert stored("+15550000010", "+15550000011", "+15550000012", "+15550000013") == {"+15550000010", "+15550000013"}
+
+
+def test_ndjson_import_and_error_cap(client, monkeypatch):
+    monkeypatch.setattr(settings, "bulk_import_max_errors", 2)
+    lines = [
+        json.dumps({"name": "Json One", "phone": "+15550000020"}),
+        "{not json",
+        json.dumps(["not", "an", "object"]),
+        "",
+        json.dumps({"phone": "+15550000021"}),  # no name
+        json.dumps({"name": "Json Two", "phone": "+15550000022", "region": "Kerala"}),
+    ]
+    r = client.post("/api/contacts/bulk", files={"file": ("contacts.ndjson", "\n".join(lines), "application/x-ndjson")})
+    assert r.status_code == 200, r.text
+    report = r.json()
+    assert (report["rows"], report["inserted"], report["invalid"]) == (5, 2, 3)
+    assert [e["line"] for e in report["errors"]] == [2, 3]
+    assert report["errors_truncated"] is True
+    assert stored("+15550000020", "+15550000021", "+15550000022") == {"+15550000020", "+15550000022"}
+
+
+def test_import_needs_a_known_format(client):
+    r = client.post("/api/contacts/bulk", files={"file": ("contacts.txt", "name\n", "text/plain")})
+    assert r.status_code == 400
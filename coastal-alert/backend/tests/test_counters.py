@@ -0,0 +1,65 @@
+from app import models
+from app.counters import ALERTS_TOTAL, counters
+from app.database import SessionLocal
+
+NAME = "test.counter"
+
+
+def stored(name: str):
+    db = SessionLocal()
+    try:
+        return db.query(models.StatCounter.value).filter(models.StatCounter.name == name).scalar()
+    finally:
+        db.close()
+
+
+def test_deltas_apply_only_after_commit(client):
+    before = counters.get(NAME)
+    db = SessionLocal()
+    try:
+        counters.add(db, {NAME: 2})
+        counters.add(db, {NAME: 3, "test.untouched": 0})
+        assert counters.get(NAME) == before
+        db.commit()
+    finally:
+        db.close()
+    assert counters.get(NAME) == before + 5
+    assert stored(NAME) == before + 5
+    assert stored("test.untouched") is None
+
+
+def test_rolled_back_deltas_are_dropped(client):
+    before = counters.get(NAME)
+    db = SessionLocal()
+    try:
+        counters.add(db, {NAME: 7})
+        db.rollback()
+        # A later commit in the same session must not bring them back
+        db.commit()
+    finally:
+        db.close()
+    assert counters.get(NAME) == before
+    assert (stored(NAME) or 0) == before
+
+
+def test_alert_updates_stats(client):
+    before = client.get("/api/stats").json()
+    r = client.post("/api/alerts", json={"metric": "water_level", "value": 9.5, "location": "Counter Bay"})
+    assert r.status_code == 200, r.text
+    after = client.get("/api/stats").json()
+    assert after["total_alerts"] == before["total_alerts"] + 1
+    severity = r.json()["severity"]
+    assert after["alerts_by_severity"][severity] == before["alerts_by_severity"].get(severity, 0) + 1
+
+
+def test_reconcile_corrects_drift(client):
+    db = SessionLocal()
+    try:
+        actual = db.query(models.AlertLog).count()
+        db.query(models.StatCounter).filter(models.StatCounter.name == ALERTS_TOTAL).update({"value": actual + 40})
+        db.commit()
+        assert counters.reconcile(db) >= 1
+    finally:
+        db.close()
+    assert stored(ALERTS_TOTAL) == actual
+    assert counters.get(ALERTS_TOTAL) == actual
@@ -0,0 +1,232 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app import dispatcher as dispatcher_module
+from app import models
+from app.database import SessionLocal
+from app.dispatcher import Dispatcher
+from app.sms import SMSError, status_error
+from app.smtp_pool import SendUncertain
+
+
+class FakeNotifier:
+    """Stands in for AsyncNotifier: records every send and fails the recipients it is told to."""
+
+    def __init__(self):
+        self.sent = []
+        self.failures = {}
+
+    async def deliver_sms(self, to, message):
+        return self._send(to)
+
+    async def deliver_email(self, to_email, subject, body, idempotency_key=None):
+        return self._send(to_email)
+
+    def _send(self, to):
+        self.sent.append(to)
+        error = self.failures.get(to)
+        if error is not None:
+            raise error
+        return f"id-{to}-{len(self.sent)}"
+
+
+@pytest.fixture
+def notifier(client, monkeypatch):
+    fake = FakeNotifier()
+    monkeypatch.setattr(dispatcher_module, "async_notifier", fake)
+    return fake
+
+
+@pytest.fixture
+def alert_id(client):
+    db = SessionLocal()
+    try:
+        log = models.AlertLog(metric="water_level", value=9.0, threshold=4.0, message="", severity="HIGH")
+        db.add(log)
+        db.commit()
+        return log.id
+    finally:
+        db.close()
+
+
+def make_dispatcher(**overrides) -> Dispatcher:
+    options = dict(concurrency=4, batch_size=50, poll_interval=0.01, backend="async", thread_workers=1,
+                   max_attempts=3, retry_base=0.0, retry_cap=0.0)
+    options.update(overrides)
+    return Dispatcher(**options)
+
+
+def enqueue(d: Dispatcher, alert_id: int, *recipients: str) -> int:
+    db = SessionLocal()
+    try:
+        queued = d.enqueue(db, alert_id, [{"channel": "sms", "recipient": r, "message": "m"} for r in recipients])
+        db.commit()
+        return queued
+    finally:
+        db.close()
+
+
+def deliveries(alert_id: int):
+    db = SessionLocal()
+    try:
+        return {row.recipient: row for row in db.query(models.Delivery).filter(models.Delivery.alert_id == alert_id)}
+    finally:
+        db.close()
+
+
+def run(d: Dispatcher, alert_id: int, timeout: float = 5.0):
+    """Run the dispatcher until none of the alert's deliveries is due or being sent."""
+    async def main():
+        await d.start()
+        deadline = time.monotonic() + timeout
+        try:
+            while time.monotonic() < deadline:
+                now = datetime.now(timezone.utc)
+                rows = deliveries(alert_id).values()
+                if not any(
+                    row.status in ("pending", "in_progress")
+                    or (row.status == "retry" and row.next_attempt_at.replace(tzinfo=timezone.utc) <= now)
+                    for row in rows
+                ):
+                    return
+                await asyncio.sleep(0.02)
+            raise AssertionError("deliveries did not settle")
+        finally:
+            await d.stop()
+
+    asyncio.run(main())
+
+
+def test_successful_send_is_recorded(notifier, alert_id):
+    d = make_dispatcher()
+    enqueue(d, alert_id, "+100")
+    run(d, alert_id)
+    row = deliveries(alert_id)["+100"]
+    assert (row.status, row.attempts, row.last_error) == ("sent", 1, None)
+    assert row.provider_id.startswith("id-+100")
+    db = SessionLocal()
+    try:
+        assert db.get(models.AlertLog, alert_id).sent
+    finally:
+        db.close()
+
+
+def test_failure_before_send_is_retried_with_backoff(notifier, alert_id):
+    d = make_dispatcher(retry_base=60.0, retry_cap=600.0)
+    notifier.failures["+101"] = SMSError("throttled", status=429, retryable=True)
+    enqueue(d, alert_id, "+101")
+    started = datetime.now(timezone.utc)
+    run(d, alert_id)
+    row = deliveries(alert_id)["+101"]
+    assert (row.status, row.attempts) == ("retry", 1)
+    # Jittered between half and all of the base delay
+    due_in = row.next_attempt_at.replace(tzinfo=timezone.utc) - started
+    assert timedelta(seconds=29) <= due_in <= timedelta(seconds=61)
+    assert notifier.sent == ["+101"]
+
+
+def test_retries_stop_at_max_attempts(notifier, alert_id):
+    d = make_dispatcher(max_attempts=3)
+    notifier.failures["+102"] = SMSError("connection refused", retryable=True)
+    enqueue(d, alert_id, "+102")
+    run(d, alert_id)
+    row = deliveries(alert_id)["+102"]
+    assert (row.status, row.attempts, row.last_error) == ("failed", 3, "connection refused")
+    assert notifier.sent == ["+102"] * 3
+
+
+def test_permanent_error_fails_at_once(notifier, alert_id):
+    d = make_dispatcher()
+    notifier.failures["+103"] = SMSError("invalid number", status=400, retryable=False)
+    enqueue(d, alert_id, "+103")
+    run(d, alert_id)
+    row = deliveries(alert_id)["+103"]
+    assert (row.status, row.attempts) == ("failed", 1)
+    assert notifier.sent == ["+103"]
+
+
+def twilio_answer(status: int):
+    return status_error(SimpleNamespace(status_code=status, text="upstream error", headers={}))
+
+
+@pytest.mark.parametrize("error", [
+    SendUncertain("connection lost during DATA"),
+    twilio_answer(500),
+    twilio_answer(502),
+    twilio_answer(504),
+    SMSError("read timed out", uncertain=True),
+], ids=["smtp-data", "twilio-500", "twilio-502", "twilio-504", "twilio-timeout"])
+def test_send_that_may_have_gone_out_becomes_unknown(notifier, alert_id, error):
+    d = make_dispatcher()
+    notifier.failures["+104"] = error
+    enqueue(d, alert_id, "+104")
+    run(d, alert_id)
+    row = deliveries(alert_id)["+104"]
+    assert (row.status, row.attempts, row.next_attempt_at) == ("unknown", 1, None)
+    # Another pass never sends it again
+    run(make_dispatcher(), alert_id)
+    assert notifier.sent == ["+104"]
+
+
+def test_idempotency_key_never_resends(notifier, alert_id):
+    d = make_dispatcher()
+    assert enqueue(d, alert_id, "+105", "+105", "+106") == 2
+    run(d, alert_id)
+    assert enqueue(d, alert_id, "+105", "+106") == 0
+    run(d, alert_id)
+    assert sorted(notifier.sent) == ["+105", "+106"]
+    assert {row.idempotency_key for row in deliveries(alert_id).values()} == {
+        f"{alert_id}:sms:+105", f"{alert_id}:sms:+106",
+    }
+
+
+def set_in_progress(alert_id: int, recipient: str, claimed_at):
+    db = SessionLocal()
+    try:
+        db.query(models.Delivery).filter(
+            models.Delivery.alert_id == alert_id, models.Delivery.recipient == recipient
+        ).update({"status": "in_progress", "attempts": 1, "claimed_at": claimed_at})
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_recover_marks_interrupted_sends_unknown(notifier, alert_id):
+    d = make_dispatcher()
+    enqueue(d, alert_id, "+107", "+108")
+    now = datetime.now(timezone.utc)
+    set_in_progress(alert_id, "+107", now - timedelta(minutes=10))
+    set_in_progress(alert_id, "+108", now)
+    # With a lease only the stale claim is taken back
+    assert d.recover(older_than=300) == 1
+    rows = deliveries(alert_id)
+    assert (rows["+107"].status, rows["+107"].last_error) == ("unknown", "interrupted while sending")
+    assert rows["+108"].status == "in_progress"
+    # Without one (a single process starting up) every in_progress row is
+    assert d.recover() == 1
+    run(d, alert_id)
+    assert {row.status for row in deliveries(alert_id).values()} == {"unknown"}
+    assert notifier.sent == []
+
+
+def test_retry_endpoint_requeues_unknown_deliveries(client, notifier, alert_id):
+    d = make_dispatcher()
+    notifier.failures["+109"] = SendUncertain("connection lost during DATA")
+    enqueue(d, alert_id, "+109", "+110")
+    run(d, alert_id)
+    assert deliveries(alert_id)["+109"].status == "unknown"
+
+    del notifier.failures["+109"]
+    r = client.post(f"/api/alerts/{alert_id}/deliveries/retry")
+    assert r.status_code == 200, r.text
+    assert r.json() == {"alert_id": alert_id, "requeued": 1}
+    run(d, alert_id)
+    rows = deliveries(alert_id)
+    assert (rows["+109"].status, rows["+109"].attempts) == ("sent", 2)
+    assert sorted(notifier.sent) == ["+109", "+109", "+110"]
+
+    assert client.post("/api/alerts/999999/deliveries/retry").status_code == 404
@@ -0,0 +1,122 @@
+import json
+
+import pytest
+from sqlalchemy import insert, text
+
+from app import models, pagination
+from app.database import ReadSessionLocal, SessionLocal
+
+METRIC = "paging_gauge"
+NEWER, OLDER = "2026-03-02 08:00:00", "2026-03-01 08:00:00"
+
+
+@pytest.fixture(scope="module")
+def logs(client):
+    """Eight alert logs: five sharing the newer timestamp, three the older one. Returns ids newest first."""
+    db = SessionLocal()
+    try:
+        db.execute(insert(models.AlertLog), [
+            {"metric": METRIC, "value": float(i), "threshold": 1.0, "message": f"m{i}", "sent": False, "severity": "HIGH"}
+            for i in range(8)
+        ])
+        ids = [i for i, in db.query(models.AlertLog.id).filter(models.AlertLog.metric == METRIC).order_by(models.AlertLog.id)]
+        # Stored in the database's own text form, as CURRENT_TIMESTAMP writes it
+        stamp = text("UPDATE alerts SET created_at = :at WHERE metric = :metric AND id BETWEEN :low AND :high")
+        db.execute(stamp, {"at": OLDER, "metric": METRIC, "low": ids[0], "high": ids[2]})
+        db.execute(stamp, {"at": NEWER, "metric": METRIC, "low": ids[3], "high": ids[-1]})
+        db.commit()
+    finally:
+        db.close()
+    return ids[3:][::-1] + ids[:3][::-1]
+
+
+def fetch_all(client, limit, **params):
+    pages, cursor = [], None
+    # A cursor that does not move on would page forever
+    for _ in range(20):
+        query = {"metric": METRIC, "limit": limit, **params}
+        if cursor:
+            query["cursor"] = cursor
+        r = client.get("/api/alerts/logs", params=query)
+        assert r.status_code == 200, r.text
+        pages.append(r.json())
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+    raise AssertionError("paging did not end")
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 5, 8, 100])
+def test_pages_cover_every_row_once_across_equal_timestamps(client, logs, limit):
+    pages = fetch_all(client, limit)
+    assert [row["id"] for page in pages for row in page] == logs
+    assert all(len(page) == limit for page in pages[:-1])
+    # The last full page ends the listing without an empty page after it
+    assert len(pages) == -(-len(logs) // limit)
+
+
+def test_cursor_inside_a_run_of_equal_timestamps(client, logs):
+    first = client.get("/api/alerts/logs", params={"metric": METRIC, "limit": 2})
+    assert {row["created_at"] for row in first.json()} == {NEWER.replace(" ", "T")}
+    second = client.get("/api/alerts/logs", params={"metric": METRIC, "limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+    assert [row["id"] for row in second.json()] == logs[2:4]
+
+
+def test_fields_projection_keeps_the_key(client, logs):
+    r = client.get("/api/alerts/logs", params={"metric": METRIC, "limit": 3, "fields": "value, severity"})
+    assert r.status_code == 200, r.text
+    rows = r.json()
+    assert [set(row) for row in rows] == [{"id", "value", "severity", "created_at"}] * 3
+    # The projected page is the same page
+    assert [row["id"] for row in rows] == logs[:3]
+    assert "X-Next-Cursor" in r.headers
+
+
+@pytest.mark.parametrize("params", [{"fields": "value,password"}, {"cursor": "not-a-cursor"}])
+def test_bad_fields_and_cursors_are_rejected(client, params):
+    r = client.get("/api/alerts/logs", params=params)
+    assert r.status_code == 400
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    # Several encoded chunks per page, so the splicing between them is exercised
+    monkeypatch.setattr(pagination, "STREAM_BATCH", 3)
+
+
+@pytest.mark.parametrize("limit", [1, 3, 7, 100])
+def test_json_pages_spliced_from_batches(client, logs, small_batches, limit):
+    r = client.get("/api/alerts/logs", params={"metric": METRIC, "limit": limit})
+    assert r.headers["content-type"] == "application/json"
+    rows = json.loads(r.content)
+    assert [row["id"] for row in rows] == logs[:limit]
+
+
+def test_encoded_chunks(client, logs, small_batches):
+    db = ReadSessionLocal()
+    try:
+        query = db.query(models.AlertLog).filter(models.AlertLog.metric == METRIC)
+        chunks = list(pagination.encode_rows(ReadSessionLocal, query, models.AlertLog, ["id"], "json"))
+        assert len(chunks) == 4  # three batches and the closing bracket
+        assert json.loads(b"".join(chunks)) == [{"id": i} for i in logs]
+        empty = query.filter(models.AlertLog.id < 0)
+        assert b"".join(pagination.encode_rows(ReadSessionLocal, empty, models.AlertLog, ["id"], "json")) == b"[]"
+        assert b"".join(pagination.encode_rows(ReadSessionLocal, empty, models.AlertLog, ["id"], "ndjson")) == b""
+    finally:
+        db.close()
+
+
+def test_ndjson_matches_json(client, logs, small_batches):
+    params = {"metric": METRIC, "limit": 5}
+    as_json = client.get("/api/alerts/logs", params=params).json()
+    r = client.get("/api/alerts/logs", params={**params, "format": "ndjson"})
+    assert r.headers["content-type"] == "application/x-ndjson"
+    assert r.text.endswith("\n")
+    assert [json.loads(line) for line in r.text.splitlines()] == as_json
+    row = as_json[0]
+    assert (row["value"], row["sent"], row["suppressed"], row["created_at"]) == (7.0, False, False, NEWER.replace(" ", "T"))
+
+
+def test_unknown_format_is_rejected(client):
+    assert client.get("/api/alerts/logs", params={"format": "xml"}).status_code == 400
+    assert client.get("/api/contacts", params={"format": "csv"}).status_code == 400
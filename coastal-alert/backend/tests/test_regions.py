@@ -0,0 +1,57 @@
+import pytest
+
+from app import models, regions
+from app.recipient_index import RecipientIndex
+
+REGIONS = {
+    "Mumbai, Maharashtra": 1,
+    "Andaman and Nicobar Islands": 2,
+    "Goa": 3,
+    "Goalpara, Assam": 4,
+}
+CASES = [
+    ("Mumbai", {1}),
+    ("mum", {1}),
+    ("Mumbai, Mah", {1}),
+    ("maharashtra", {1}),
+    ("umbai", set()),
+    ("nicobar islands", {2}),
+    ("Goa", {3, 4}),
+    ("Goa|Mumbai", {1, 3, 4}),
+    ("Kerala", set()),
+]
+
+
+@pytest.fixture(scope="module")
+def stored(client):
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    ids = {}
+    for region, key in REGIONS.items():
+        contact = models.Contact(name=f"region-{key}", phone=f"+1999000{key}", region=region)
+        regions.assign(contact)
+        db.add(contact)
+        db.flush()
+        ids[contact.id] = key
+    db.commit()
+    yield db, ids
+    db.query(models.Contact).filter(models.Contact.id.in_(ids)).delete(synchronize_session=False)
+    db.commit()
+    db.close()
+
+
+@pytest.mark.parametrize("location,expected", CASES)
+def test_database_lookup(stored, location, expected):
+    db, ids = stored
+    found = db.query(models.Contact.id).filter(models.Contact.id.in_(regions.contacts_in(location)))
+    assert {ids[contact_id] for contact_id, in found if contact_id in ids} == expected
+
+
+@pytest.mark.parametrize("location,expected", CASES)
+def test_index_and_matches_agree(stored, location, expected):
+    db, ids = stored
+    index = RecipientIndex()
+    index.load(db)
+    assert {ids[recipient.id] for recipient in index.resolve(location)[1] if recipient.id in ids} == expected
+    assert {key for region, key in REGIONS.items() if regions.matches(region, location)} == expected
@@ -0,0 +1,138 @@
+import time
+
+import pytest
+
+from app import rules as rules_module
+from app.rules import rule_engine
+
+
+@pytest.fixture
+def rules(client):
+    """Create rules through the API (which reloads the engine) and delete them afterwards."""
+    created = []
+
+    def create(**rule):
+        r = client.post("/api/rules", json=rule)
+        assert r.status_code == 200, r.text
+        created.append(r.json()["id"])
+        return r.json()
+
+    yield create
+    for rule_id in created:
+        client.delete(f"/api/rules/{rule_id}")
+
+
+def severity(metric, value, location=None):
+    return rule_engine.evaluate(metric, value, location).severity
+
+
+def test_bands_pick_the_highest_band_passed(rules):
+    # Given out of order; compiled high to low
+    rules(metric="band_gauge", bands=[{"severity": "CRITICAL", "above": 3.0}, {"severity": "HIGH", "above": 2.0}])
+    assert rule_engine.evaluate("band_gauge", 1.9)[:2] == ("NORMAL", 2.0)
+    assert severity("band_gauge", 2.0) == "NORMAL"  # bands are strict
+    assert severity("band_gauge", 2.5) == "HIGH"
+    assert severity("band_gauge", 3.5) == "CRITICAL"
+
+
+def test_region_rule_replaces_the_global_one_there(rules):
+    rules(metric="band_gauge", bands=[{"severity": "HIGH", "above": 2.0}, {"severity": "CRITICAL", "above": 3.0}])
+    rules(metric="band_gauge", region="Goa", bands=[{"severity": "HIGH", "above": 5.0}])
+    assert severity("band_gauge", 3.5, "Goa") == "NORMAL"
+    assert severity("band_gauge", 3.5, "Kerala") == "CRITICAL"
+    # Several locations: the most severe result wins
+    assert severity("band_gauge", 3.5, "Goa|Kerala") == "CRITICAL"
+    assert severity("band_gauge", 5.5, "goa") == "HIGH"
+
+
+def test_compound_condition_needs_a_recent_reading_above_its_level(rules):
+    rules(metric="surge_gauge", bands=[{"severity": "HIGH", "above": 1.0}],
+          conditions=[{"metric": "swell_gauge", "above": 4.0}])
+    assert rule_engine.evaluate("surge_gauge", 2.0, "Goa").severity == "NORMAL"
+    assert rule_engine.evaluate("surge_gauge", 2.0, "Goa").threshold == 1.0
+
+    rule_engine.observe("swell_gauge", 5.0, "Goa")
+    assert severity("surge_gauge", 2.0, "Goa") == "HIGH"
+    assert severity("surge_gauge", 0.5, "Goa") == "NORMAL"
+    # The condition is judged per region
+    assert severity("surge_gauge", 2.0, "Kerala") == "NORMAL"
+
+    rule_engine.observe("swell_gauge", 3.0, "Goa")
+    assert severity("surge_gauge", 2.0, "Goa") == "NORMAL"
+
+    rule_engine.observe("swell_gauge", 5.0, "Goa", at=time.time() - rule_engine.condition_window - 1)
+    assert severity("surge_gauge", 2.0, "Goa") == "NORMAL"
+
+
+def test_reading_without_location_satisfies_conditions_everywhere(rules):
+    rules(metric="surge_gauge", bands=[{"severity": "HIGH", "above": 1.0}],
+          conditions=[{"metric": "tide_swell", "above": 4.0}])
+    rule_engine.observe("tide_swell", 6.0, None)
+    assert severity("surge_gauge", 2.0, "Kerala") == "HIGH"
+    assert severity("surge_gauge", 2.0) == "HIGH"
+
+
+def test_only_readings_a_condition_can_use_are_kept(rules):
+    rules(metric="surge_gauge", region="Goa", bands=[{"severity": "HIGH", "above": 1.0}],
+          conditions=[{"metric": "swell_gauge", "above": 4.0}])
+    rule_engine.observe("swell_gauge", 5.0, "Goa|Kerala|Sensor 17")
+    rule_engine.observe("swell_gauge", 5.0, None)
+    rule_engine.observe("tide_swell", 5.0, "Goa")
+    assert {key for key in rule_engine._latest if key[0] in ("swell_gauge", "tide_swell")} == {
+        ("swell_gauge", "goa"), ("swell_gauge", ""),
+    }
+
+
+def test_a_global_condition_keeps_every_region(rules):
+    rules(metric="surge_gauge", bands=[{"severity": "HIGH", "above": 1.0}],
+          conditions=[{"metric": "swell_gauge", "above": 4.0}])
+    rule_engine.observe("swell_gauge", 5.0, "Sensor 17|Sensor 18")
+    assert {("swell_gauge", "sensor 17"), ("swell_gauge", "sensor 18")} <= set(rule_engine._latest)
+
+
+def test_readings_are_dropped_when_no_rule_needs_them(client, rules):
+    rule = rules(metric="surge_gauge", bands=[{"severity": "HIGH", "above": 1.0}],
+                 conditions=[{"metric": "swell_gauge", "above": 4.0}])
+    rule_engine.observe("swell_gauge", 5.0, "Goa")
+    assert ("swell_gauge", "goa") in rule_engine._latest
+    client.delete(f"/api/rules/{rule['id']}")
+    assert not any(key[0] == "swell_gauge" for key in rule_engine._latest)
+
+
+def test_expired_readings_are_swept(rules, monkeypatch):
+    monkeypatch.setattr(rules_module, "SWEEP_EVERY", 2)
+    rules(metric="surge_gauge", bands=[{"severity": "HIGH", "above": 1.0}],
+          conditions=[{"metric": "swell_gauge", "above": 4.0}])
+    now = time.time()
+    rule_engine.observe("swell_gauge", 5.0, "Goa", at=now - rule_engine.condition_window - 1)
+    assert ("swell_gauge", "goa") not in rule_engine._latest
+    rule_engine.observe("swell_gauge", 5.0, "Goa", at=now - rule_engine.condition_window + 0.5)
+    time.sleep(0.6)
+    for n in range(2):
+        rule_engine.observe("swell_gauge", 5.0, f"Sensor {n}")
+    # Goa's reading had aged out of the window when the sweep ran
+    assert ("swell_gauge", "goa") not in rule_engine._latest
+    assert ("swell_gauge", "sensor 1") in rule_engine._latest
+
+
+def test_compound_rules_are_not_the_classic_threshold(rules):
+    rules(metric="combo_only", bands=[{"severity": "HIGH", "above": 1.0}],
+          conditions=[{"metric": "water_level", "above": 4.0}])
+    assert "combo_only" not in rule_engine.thresholds()
+    assert "water_level" in rule_engine.condition_metrics()
+
+
+def test_disabled_rules_are_ignored(client, rules):
+    rule = rules(metric="band_gauge", bands=[{"severity": "HIGH", "above": 2.0}])
+    assert severity("band_gauge", 2.5) == "HIGH"
+    r = client.put(f"/api/rules/{rule['id']}", json={**rule, "enabled": False})
+    assert r.status_code == 200, r.text
+    assert rule_engine.evaluate("band_gauge", 2.5) is None
+
+
+@pytest.mark.parametrize("rule", [
+    {"metric": "band_gauge", "bands": []},
+    {"metric": "band_gauge", "bands": [{"severity": "LOW", "above": 1.0}]},
+])
+def test_invalid_rules_are_rejected(client, rule):
+    assert client.post("/api/rules", json=rule).status_code == 422
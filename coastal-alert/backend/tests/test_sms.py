@@ -0,0 +1,59 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.sms import SMSError, SMSSender
+
+
+class FakeClient:
+    """Stands in for TwilioClient and records how many sends overlap."""
+
+    def __init__(self, delay=0.02, fail_first=0):
+        self.delay = delay
+        self.fail_first = fail_first
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def send(self, to, body):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            if call <= self.fail_first:
+                raise SMSError("busy", status=503, retryable=True, retry_after=0.3)
+            return f"SM{call}"
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def close(self):
+        pass
+
+
+def test_concurrent_sends_never_exceed_the_cap():
+    client = FakeClient()
+    sender = SMSSender(client, rate_per_second=10_000, burst=10_000, concurrency=3)
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        sids = list(pool.map(lambda n: sender.send(f"+1555000{n:04d}", "hi"), range(24)))
+    assert len(set(sids)) == 24
+    assert client.peak == 3
+    assert sender.stats()["concurrency"] == 3
+
+
+def test_retry_backoff_does_not_hold_a_slot():
+    client = FakeClient(delay=0.0, fail_first=1)
+    sender = SMSSender(client, rate_per_second=10_000, burst=10_000, concurrency=1)
+    first = threading.Thread(target=sender.send, args=("+15550000001", "hi"))
+    first.start()
+    time.sleep(0.05)
+    # The first send is sleeping before its retry, so the only slot is free
+    started = time.monotonic()
+    sender.send("+15550000002", "hi")
+    assert time.monotonic() - started < 0.1
+    first.join()
+    assert sender.stats()["retries"] == 1
@@ -0,0 +1,23 @@
+import pytest
+
+from app.config import settings
+from app.main import check_secret_key
+
+
+def test_shared_state_requires_secret_key(monkeypatch):
+    monkeypatch.setattr(settings, "shared_state", True)
+    monkeypatch.setattr(settings, "secret_key", None)
+    with pytest.raises(RuntimeError, match="SECRET_KEY"):
+        check_secret_key()
+
+
+def test_single_process_starts_without_secret_key(monkeypatch):
+    monkeypatch.setattr(settings, "shared_state", False)
+    monkeypatch.setattr(settings, "secret_key", None)
+    check_secret_key()
+
+
+def test_shared_state_with_secret_key_starts(monkeypatch):
+    monkeypatch.setattr(settings, "shared_state", True)
+    monkeypatch.setattr(settings, "secret_key", "k")
+    check_secret_key()
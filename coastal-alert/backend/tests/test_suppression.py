@@ -0,0 +1,95 @@
+import pytest
+
+from app import models, suppression
+from app.config import settings
+from app.database import SessionLocal
+from app.suppression import SharedSuppressor, Suppressor
+
+COOLDOWN = 600.0
+
+
+@pytest.fixture(params=["memory", "shared"])
+def suppressor(request, client):
+    kind = SharedSuppressor if request.param == "shared" else Suppressor
+    s = kind(COOLDOWN, 3600.0)
+    s.reset()
+    yield s
+    s.reset()
+
+
+def test_repeat_is_suppressed_until_the_cooldown_ends(suppressor):
+    assert suppressor.check("water_level", "Goa", "HIGH", now=1000.0) is None
+    assert suppressor.check("water_level", "goa", "HIGH", now=1100.0) == pytest.approx(500.0)
+    # Once the window has run out the next breach notifies and opens a new one
+    assert suppressor.check("water_level", "Goa", "HIGH", now=1600.0) is None
+    assert suppressor.check("water_level", "Goa", "HIGH", now=1700.0) == pytest.approx(500.0)
+    stats = suppressor.stats()
+    assert (stats["checks"], stats["suppressed"]) == (4, 2)
+
+
+def test_escalation_notifies_and_drop_back_stays_quiet(suppressor):
+    assert suppressor.check("water_level", "Goa", "HIGH", now=1000.0) is None
+    assert suppressor.check("water_level", "Goa", "CRITICAL", now=1010.0) is None
+    assert suppressor.check("water_level", "Goa", "HIGH", now=1020.0) == pytest.approx(590.0)
+    assert suppressor.check("water_level", "Goa", "CRITICAL", now=1020.0) == pytest.approx(590.0)
+    assert suppressor.stats()["escalations"] == 1
+
+
+def test_windows_are_per_metric_region_and_area(suppressor):
+    assert suppressor.check("water_level", "Goa", "HIGH", now=1000.0) is None
+    assert suppressor.check("wave_height", "Goa", "HIGH", now=1000.0) is None
+    assert suppressor.check("water_level", "Kerala", "HIGH", now=1000.0) is None
+    assert suppressor.check("water_level", "Goa", "HIGH", now=1000.0, area_key="r:15.5,73.8,10") is None
+    assert suppressor.check("water_level", "Goa", "HIGH", now=1000.0, area_key="r:15.5,73.8,10") is not None
+
+
+def test_reset_reopens_every_window(suppressor):
+    assert suppressor.check("water_level", "Goa", "HIGH", now=1000.0) is None
+    suppressor.reset()
+    assert suppressor.check("water_level", "Goa", "HIGH", now=1001.0) is None
+
+
+def test_zero_cooldown_never_suppresses(client):
+    s = Suppressor(0, 3600.0)
+    assert s.check("water_level", "Goa", "HIGH", now=1000.0) is None
+    assert s.check("water_level", "Goa", "HIGH", now=1000.0) is None
+
+
+def test_expired_windows_are_swept(monkeypatch):
+    monkeypatch.setattr(suppression, "SWEEP_EVERY", 2)
+    s = Suppressor(60.0, 120.0)
+    s.check("water_level", "Goa", "HIGH", now=0.0)
+    s.check("water_level", "Kerala", "HIGH", now=100.0)
+    assert s.stats()["tracked_keys"] == 2
+    s.check("water_level", "Kerala", "HIGH", now=200.0)
+    s.check("water_level", "Kerala", "HIGH", now=201.0)
+    # Goa's entry was past the TTL when the sweep ran
+    assert s.stats()["tracked_keys"] == 1
+
+
+def test_shared_window_rolls_back_with_the_alert(client):
+    s = SharedSuppressor(COOLDOWN, 3600.0)
+    s.reset()
+    db = SessionLocal()
+    try:
+        assert s.check("water_level", "Goa", "HIGH", now=1000.0, db=db) is None
+        db.rollback()
+    finally:
+        db.close()
+    assert s.check("water_level", "Goa", "HIGH", now=1001.0) is None
+    s.reset()
+
+
+def test_repeat_alert_is_logged_but_not_sent(client):
+    reading = {"metric": "water_level", "value": 9.0, "location": "Suppression Point"}
+    first = client.post("/api/alerts", json=reading).json()
+    assert first["alert"] is True and not first.get("suppressed")
+    second = client.post("/api/alerts", json=reading).json()
+    assert (second["alert"], second["suppressed"]) == (False, True)
+    assert 0 < second["retry_after"] <= settings.alert_cooldown_seconds
+    db = SessionLocal()
+    try:
+        assert db.get(models.AlertLog, second["alert_id"]).suppressed is True
+        assert db.query(models.Delivery).filter(models.Delivery.alert_id == second["alert_id"]).count() == 0
+    finally:
+        db.close()
@@ -0,0 +1,61 @@
+import pytest
+
+from app.templates import TemplateCache, fit_sms, sms_segments, sms_units
+
+
+@pytest.mark.parametrize("text, units, gsm", [
+    ("Tide at Goa", 11, True),
+    ("Limit {3.5} €", 16, True),      # { } and € are escaped GSM-7 characters
+    ("ज्वार चेतावनी", 13, False),      # anything outside GSM-7 is counted per character
+])
+def test_sms_units(text, units, gsm):
+    assert sms_units(text) == (units, gsm)
+
+
+@pytest.mark.parametrize("text, segments", [
+    ("a" * 160, 1), ("a" * 161, 2), ("a" * 306, 2), ("a" * 307, 3),
+    ("€" * 80, 1), ("€" * 81, 2),
+    ("ज" * 70, 1), ("ज" * 71, 2), ("ज" * 134, 2), ("ज" * 135, 3),
+])
+def test_sms_segments(text, segments):
+    assert sms_segments(text) == segments
+
+
+@pytest.mark.parametrize("text", ["short", "a" * 160, "€" * 80, "ज" * 70])
+def test_text_that_fits_is_unchanged(text):
+    assert fit_sms(text, 1) == text
+
+
+@pytest.mark.parametrize("text, max_segments", [
+    ("a" * 400, 1), ("a" * 400, 2),
+    ("€" * 200, 1),
+    ("ज" * 200, 1), ("ज" * 200, 2),
+    ("word " * 100, 1),
+])
+def test_long_text_is_cut_to_fit(text, max_segments):
+    cut = fit_sms(text, max_segments)
+    assert sms_segments(cut) <= max_segments
+    assert cut.endswith("...") and not cut[:-3].endswith(" ")
+    assert text.startswith(cut[:-3])
+
+
+@pytest.mark.parametrize("text, max_segments, kept", [
+    ("a" * 400, 1, 157), ("a" * 400, 2, 303),
+    ("€" * 200, 1, 78),
+    ("ज" * 200, 1, 67), ("ज" * 200, 2, 131),
+])
+def test_cut_keeps_as_much_as_fits(text, max_segments, kept):
+    assert fit_sms(text, max_segments) == text[:kept] + "..."
+
+
+def test_zero_segments_means_no_limit():
+    assert fit_sms("a" * 1000, 0) == "a" * 1000
+
+
+def test_rendered_sms_with_many_locations_fits_one_segment():
+    cache = TemplateCache(16, sms_max_segments=1)
+    location = "|".join(f"Coastal Village {n}" for n in range(40))
+    body = cache.render(cache.get("water_level", "CRITICAL", location, "sms"), 6.123, 3.5)
+    assert sms_segments(body) == 1
+    assert body.startswith("[CRITICAL] Water Level 6.12 (limit 3.50) at Coastal Village 0, ")
+    assert body.endswith("...")
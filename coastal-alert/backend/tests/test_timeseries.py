@@ -0,0 +1,84 @@
+import time
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import delete, func
+
+from app import models
+from app.database import SessionLocal
+from app.timeseries import BUCKET_SECONDS as DAY, HOUR, MINUTE, TimeSeries, reading_row
+
+METRIC = "history_gauge"
+RETENTION_DAYS = 30
+
+
+def at(ts: int) -> datetime:
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+@pytest.fixture
+def history(client):
+    """40 days of one reading a day, rolled up and pruned to the 30-day retention window."""
+    db = SessionLocal()
+    series = TimeSeries()
+    now = int(time.time())
+    series.add(db, [reading_row(METRIC, 1.0, None, at(now - days * DAY)) for days in range(1, 41)])
+    db.commit()
+    series.roll_up(db, now, RETENTION_DAYS)
+    series.prune(db, RETENTION_DAYS)
+    yield db, series, now
+    db.execute(delete(models.Reading).where(models.Reading.metric == METRIC))
+    db.execute(delete(models.ReadingRollup).where(models.ReadingRollup.metric == METRIC))
+    db.commit()
+    db.close()
+
+
+def rollups(db, width):
+    rollup = models.ReadingRollup
+    return dict(
+        db.query(rollup.start, rollup.count).filter(rollup.metric == METRIC, rollup.resolution == width)
+    )
+
+
+def test_history_survives_pruning(history):
+    db, series, now = history
+    assert db.query(func.count(models.Reading.id)).filter(models.Reading.metric == METRIC).scalar() < 40
+    assert len(rollups(db, MINUTE)) == 40
+    assert len(rollups(db, HOUR)) == 40
+
+
+def test_late_reading_past_retention_keeps_rollups(history):
+    db, series, now = history
+    before = rollups(db, MINUTE), rollups(db, HOUR)
+    series.add(db, [reading_row(METRIC, 5.0, None, at(now - 39 * DAY))])
+    db.commit()
+    series.roll_up(db, now, RETENTION_DAYS)
+    assert (rollups(db, MINUTE), rollups(db, HOUR)) == before
+
+
+def test_late_reading_recomputes_only_its_buckets(history):
+    db, series, now = history
+    minutes, hours = rollups(db, MINUTE), rollups(db, HOUR)
+    late = now - 5 * DAY
+    series.add(db, [reading_row(METRIC, 5.0, None, at(late))])
+    db.commit()
+    series.roll_up(db, now, RETENTION_DAYS)
+    minutes[late - late % MINUTE] += 1
+    hours[late - late % HOUR] += 1
+    assert rollups(db, MINUTE) == minutes
+    assert rollups(db, HOUR) == hours
+
+
+def test_readings_past_retention_are_refused(client):
+    recorded_at = at(int(time.time()) - 39 * DAY).isoformat()
+    r = client.post("/api/alerts", json={"metric": "water_level", "value": 0.5, "recorded_at": recorded_at})
+    assert r.status_code == 400
+    assert "retention" in r.json()["detail"]
+    r = client.post("/api/readings/batch", json=[
+        {"metric": "water_level", "value": 0.5, "recorded_at": recorded_at},
+        {"metric": "water_level", "value": 0.5},
+    ])
+    assert r.status_code == 200, r.text
+    report = r.json()
+    assert (report["stored"], report["invalid"]) == (1, 1)
+    assert "retention" in report["errors"][0]["error"]
@@ -1,8 +1,9 @@
 import React, { useState, useEffect } from 'react'
-import { alertsAPI } from './api'
+import { alertsAPI, streamAPI } from './api'
 
 export default function AlertHistory() {
   const [logs, setLogs] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const [loading, setLoading] = useState(false)
   const [limit, setLimit] = useState(50)
 
@@ -10,17 +11,47 @@ export default function AlertHistory() {
     loadLogs()
   }, [limit])
 
+  // New alert logs arrive over the event stream; replace the row if it was already shown
+  useEffect(() => {
+    const offAlert = streamAPI.subscribe('alert', log => {
+      setLogs(prev => [log, ...prev.filter(l => l.id !== log.id)])
+    })
+    // An alert counts as sent once its first notification is delivered
+    const offDelivery = streamAPI.subscribe('delivery', event => {
+      if (event.sent > 0) {
+        setLogs(prev => prev.map(l => (l.id === event.alert_id && !l.sent ? { ...l, sent: true } : l)))
+      }
+    })
+    const offDropped = streamAPI.subscribe('dropped', () => loadLogs())
+    return () => {
+      offAlert()
+      offDelivery()
+      offDropped()
+    }
+  }, [limit])
+
   async function loadLogs() {
     setLoading(true)
     try {
-      const data = await alertsAPI.getLogs(limit)
-      setLogs(data)
+      const page = await alertsAPI.getLogs(limit)
+      setLogs(page.items)
+      setNextCursor(page.nextCursor)
     } catch (error) {
       console.error('Failed to load logs:', error)
     }
     setLoading(false)
   }
 
+  async function loadMoreLogs() {
+    try {
+      const page = await alertsAPI.getLogs(limit, nextCursor)
+      setLogs(prev => [...prev, ...page.items])
+      setNextCursor(page.nextCursor)
+    } catch (error) {
+      console.error('Failed to load more logs:', error)
+    }
+  }
+
   function getSeverityFromValue(metric, value, threshold) {
     if (value > threshold * 1.5) return 'CRITICAL'
     if (value > threshold) return 'HIGH'
@@ -72,7 +103,7 @@ export default function AlertHistory() {
             </thead>
             <tbody>
               {logs.map(log => {
-                const severity = getSeverityFromValue(log.metric, log.value, log.threshold)
+                const severity = log.severity || getSeverityFromValue(log.metric, log.value, log.threshold)
                 return (
                   <tr key={log.id} className={log.sent ? 'alert-sent' : ''}>
                     <td>{new Date(log.created_at).toLocaleString()}</td>
@@ -89,6 +120,8 @@ export default function AlertHistory() {
                     <td>
                       {log.sent ? (
                         <span className="status-badge status-sent">Sent</span>
+                      ) : log.suppressed ? (
+                        <span className="status-badge status-suppressed">Suppressed</span>
                       ) : (
                         <span className="status-badge status-normal">Normal</span>
                       )}
@@ -104,6 +137,10 @@ export default function AlertHistory() {
         </div>
       )}
 
+      {nextCursor && !loading && (
+        <button onClick={loadMoreLogs} className="btn-secondary">Load older alerts</button>
+      )}
+
       <div className="history-stats">
         <p>Total records shown: {logs.length}</p>
         <p>Alerts triggered: {logs.filter(l => l.sent).length}</p>
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react'
-import { alertsAPI, systemAPI } from './api'
+import { alertsAPI, systemAPI, streamAPI } from './api'
 import { COASTAL_REGIONS } from './constants'
 
 export default function AlertSimulator({ onAlertSent }) {
@@ -11,12 +11,37 @@ export default function AlertSimulator({ onAlertSent }) {
   })
   const [selectedStates, setSelectedStates] = useState([])
   const [result, setResult] = useState(null)
+  const [progress, setProgress] = useState(null)
   const [loading, setLoading] = useState(false)
 
   useEffect(() => {
     loadThresholds()
   }, [])
 
+  // Notifications are sent in the background; refresh the status when the server reports progress
+  useEffect(() => {
+    if (!result?.alert_id) return
+    let cancelled = false
+
+    async function refresh() {
+      try {
+        const data = await alertsAPI.getStatus(result.alert_id)
+        if (!cancelled) setProgress(data)
+      } catch (error) {
+        console.error('Failed to load delivery status:', error)
+      }
+    }
+
+    refresh()
+    const off = streamAPI.subscribe('delivery', event => {
+      if (event.alert_id === result.alert_id) refresh()
+    })
+    return () => {
+      cancelled = true
+      off()
+    }
+  }, [result?.alert_id])
+
   async function loadThresholds() {
     try {
       const data = await systemAPI.getThresholds()
@@ -30,6 +55,7 @@ export default function AlertSimulator({ onAlertSent }) {
     e.preventDefault()
     setLoading(true)
     setResult(null)
+    setProgress(null)
     
     // Join selected states with pipe separator for backend processing
     const location = selectedStates.length > 0 ? selectedStates.join('|') : ''
@@ -217,7 +243,7 @@ export default function AlertSimulator({ onAlertSent }) {
                   </p>
                   <p><strong>Target Location:</strong> {result.location}</p>
                   <div className="alert-stats">
-                    <p><strong>Contacts Notified:</strong> {result.sent_to} 
+                    <p><strong>Contacts Targeted:</strong> {result.area_contacts} 
                       {result.area_contacts === 0 
                         ? ` (No contacts found in ${result.location})` 
                         : result.location === 'All Regions'
@@ -225,12 +251,26 @@ export default function AlertSimulator({ onAlertSent }) {
                           : ` of ${result.total_contacts} contacts in ${result.location}`
                       }
                     </p>
-                    {result.notifications_sent > 0 && (
-                      <p><strong>Notifications Sent:</strong> {result.notifications_sent} (SMS + Email combined)</p>
+                    {result.notifications_queued > 0 && (
+                      <p><strong>Notifications Queued:</strong> {result.notifications_queued} (SMS + Email combined)</p>
+                    )}
+                    {progress && progress.total > 0 && (
+                      <p><strong>Delivery:</strong> {progress.sent} sent, {progress.failed} failed
+                        {!progress.done && `, ${progress.pending + progress.in_progress} in progress`}
+                        {progress.retry > 0 && `, ${progress.retry} awaiting retry`}
+                      </p>
                     )}
                   </div>
                   <pre className="alert-message">{result.message}</pre>
                 </>
+              ) : result.suppressed ? (
+                <>
+                  <p className={`severity-badge ${getSeverityClass(result.severity)}`}>
+                    {result.severity} ALERT SUPPRESSED
+                  </p>
+                  <p><strong>Target Location:</strong> {result.location}</p>
+                  <p>{result.message}</p>
+                </>
               ) : (
                 <>
                   <p className="status-normal">No Alert - Value within safe limits</p>
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react'
-import { contactsAPI, alertsAPI, systemAPI, authAPI } from './api'
+import { contactsAPI, alertsAPI, systemAPI, authAPI, streamAPI } from './api'
 import Dashboard from './Dashboard'
 import ContactManager from './ContactManager'
 import AlertSimulator from './AlertSimulator'
@@ -46,6 +46,17 @@ export default function App() {
     }
   }
 
+  // Stats are pushed by the server as they change; a dropped notice means we fell behind
+  useEffect(() => {
+    if (!isAuthenticated) return
+    const offStats = streamAPI.subscribe('stats', data => setStats(prev => ({ ...prev, ...data })))
+    const offDropped = streamAPI.subscribe('dropped', () => loadStats())
+    return () => {
+      offStats()
+      offDropped()
+    }
+  }, [isAuthenticated])
+
   const handleLogin = (userData) => {
     setUser(userData)
     setIsAuthenticated(true)
@@ -56,6 +67,7 @@ export default function App() {
 
   const handleLogout = async () => {
     await authAPI.logout()
+    streamAPI.close()
     setUser(null)
     setIsAuthenticated(false)
     setActiveTab('dashboard')
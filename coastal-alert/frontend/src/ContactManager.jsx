@@ -4,6 +4,7 @@ import { COASTAL_REGIONS, MAJOR_COASTAL_CITIES } from './constants'
 
 export default function ContactManager() {
   const [contacts, setContacts] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const [formData, setFormData] = useState({
     name: '',
     phone: '',
@@ -15,6 +16,8 @@ export default function ContactManager() {
   const [editingId, setEditingId] = useState(null)
   const [loading, setLoading] = useState(false)
   const [errors, setErrors] = useState({})
+  const [importReport, setImportReport] = useState(null)
+  const [importing, setImporting] = useState(false)
 
   useEffect(() => {
     loadContacts()
@@ -23,14 +26,25 @@ export default function ContactManager() {
   async function loadContacts() {
     setLoading(true)
     try {
-      const data = await contactsAPI.getAll()
-      setContacts(data)
+      const page = await contactsAPI.getPage({ limit: 100 })
+      setContacts(page.items)
+      setNextCursor(page.nextCursor)
     } catch (error) {
       console.error('Failed to load contacts:', error)
     }
     setLoading(false)
   }
 
+  async function loadMoreContacts() {
+    try {
+      const page = await contactsAPI.getPage({ limit: 100, cursor: nextCursor })
+      setContacts(prev => [...prev, ...page.items])
+      setNextCursor(page.nextCursor)
+    } catch (error) {
+      console.error('Failed to load more contacts:', error)
+    }
+  }
+
   function validateForm() {
     const newErrors = {}
     
@@ -139,6 +153,23 @@ export default function ContactManager() {
     setEditingId(contact.id)
   }
 
+  async function handleImport(e) {
+    const file = e.target.files[0]
+    e.target.value = ''
+    if (!file) return
+    setImporting(true)
+    setImportReport(null)
+    try {
+      const report = await contactsAPI.importFile(file)
+      setImportReport(report)
+      loadContacts()
+    } catch (error) {
+      console.error('Failed to import contacts:', error)
+      setImportReport({ failed: true, message: error.response?.data?.detail || 'Import failed' })
+    }
+    setImporting(false)
+  }
+
   function handleCancel() {
     setFormData({ name: '', phone: '', email: '', region: '' })
     setSelectedState('')
@@ -268,7 +299,31 @@ export default function ContactManager() {
       </div>
 
       <div className="contacts-list-section">
-        <h3>Registered Contacts ({contacts.length})</h3>
+        <h3>Registered Contacts ({contacts.length}{nextCursor ? '+' : ''})</h3>
+        <div className="bulk-actions">
+          <label className="btn-secondary btn-small">
+            {importing ? 'Importing...' : 'Import CSV / NDJSON'}
+            <input type="file" accept=".csv,.ndjson,.jsonl" onChange={handleImport} disabled={importing} hidden />
+          </label>
+          <a className="btn-secondary btn-small" href={contactsAPI.exportUrl('csv')}>Export CSV</a>
+        </div>
+        {importReport && (
+          importReport.failed ? (
+            <div className="error-alert">{importReport.message}</div>
+          ) : (
+            <div className="import-report">
+              <p>Imported {importReport.inserted} of {importReport.rows} rows
+                ({importReport.duplicates} duplicates, {importReport.invalid} invalid)</p>
+              {importReport.errors.length > 0 && (
+                <ul>
+                  {importReport.errors.slice(0, 20).map(err => (
+                    <li key={err.line}>Line {err.line}: {err.error}</li>
+                  ))}
+                </ul>
+              )}
+            </div>
+          )
+        )}
         {loading ? (
           <p>Loading contacts...</p>
         ) : contacts.length === 0 ? (
@@ -298,6 +353,9 @@ export default function ContactManager() {
             ))}
           </div>
         )}
+        {nextCursor && !loading && (
+          <button onClick={loadMoreContacts} className="btn-secondary">Load more</button>
+        )}
       </div>
     </div>
   )
@@ -35,15 +35,42 @@ api.interceptors.response.use(
 )
 
 export const contactsAPI = {
-  getAll: () => api.get('/contacts').then(r => r.data),
+  // Keyset-paged: pass the returned nextCursor back to get the following page
+  getPage: (params = {}) => api.get('/contacts', { params })
+    .then(r => ({ items: r.data, nextCursor: r.headers['x-next-cursor'] || null })),
   create: (data) => api.post('/contacts', data).then(r => r.data),
   update: (id, data) => api.put(`/contacts/${id}`, data).then(r => r.data),
-  delete: (id) => api.delete(`/contacts/${id}`).then(r => r.data)
+  delete: (id) => api.delete(`/contacts/${id}`).then(r => r.data),
+  importFile: (file) => {
+    const formData = new FormData()
+    formData.append('file', file)
+    return api.post('/contacts/bulk', formData, {
+      headers: { 'Content-Type': 'multipart/form-data' }
+    }).then(r => r.data)
+  },
+  exportUrl: (format = 'csv') => `${API_BASE}/contacts/export?format=${format}`
 }
 
 export const alertsAPI = {
   trigger: (data) => api.post('/alerts', data).then(r => r.data),
-  getLogs: (limit = 100) => api.get(`/alerts/logs?limit=${limit}`).then(r => r.data)
+  // Many readings in one request: [{ metric, value, location }, ...]
+  ingestBatch: (readings) => api.post('/readings/batch', readings).then(r => r.data),
+  getStatus: (alertId) => api.get(`/alerts/${alertId}/status`).then(r => r.data),
+  getDeliveries: (alertId) => api.get(`/alerts/${alertId}/deliveries`).then(r => r.data),
+  getLogs: (limit = 100, cursor = null) => api.get('/alerts/logs', { params: { limit, cursor } })
+    .then(r => ({ items: r.data, nextCursor: r.headers['x-next-cursor'] || null }))
+}
+
+export const rulesAPI = {
+  getAll: (metric) => api.get('/rules', { params: { metric } }).then(r => r.data),
+  create: (data) => api.post('/rules', data).then(r => r.data),
+  update: (id, data) => api.put(`/rules/${id}`, data).then(r => r.data),
+  delete: (id) => api.delete(`/rules/${id}`).then(r => r.data)
+}
+
+export const readingsAPI = {
+  // { metric, since, until, resolution: 'auto' | 'raw' | 'minute' | 'hour', location }
+  getRange: (params) => api.get('/readings', { params }).then(r => r.data)
 }
 
 export const systemAPI = {
@@ -52,6 +79,33 @@ export const systemAPI = {
   health: () => api.get('/health').then(r => r.data)
 }
 
+// One shared EventSource for the whole app; components subscribe to event types
+let source = null
+const listeners = {}
+
+export const streamAPI = {
+  // Returns an unsubscribe function. Types: alert, stats, delivery, contact, dropped
+  subscribe: (type, handler) => {
+    if (!source) {
+      source = new EventSource(`${API_BASE}/stream`)
+    }
+    if (!listeners[type]) {
+      listeners[type] = new Set()
+      source.addEventListener(type, event => {
+        const data = JSON.parse(event.data)
+        listeners[type].forEach(fn => fn(data))
+      })
+    }
+    listeners[type].add(handler)
+    return () => listeners[type].delete(handler)
+  },
+  close: () => {
+    if (source) source.close()
+    source = null
+    Object.keys(listeners).forEach(type => delete listeners[type])
+  }
+}
+
 export const authAPI = {
   login: (data) => {
     const formData = new FormData()
@@ -1,6 +1,15 @@
 @echo off
 REM Coastal Threat Alert System - Windows Startup Script
 REM This script starts both backend and frontend services
+REM
+REM Usage: start.bat [API workers] [dispatcher processes]
+REM More than one worker, or any dispatchers, switches on SHARED_STATE (see README).
+REM The processes must then share a SECRET_KEY; without one in backend\.env a key is generated for this run.
+
+set API_WORKERS=1
+set DISPATCHERS=0
+if not "%~1"=="" set API_WORKERS=%~1
+if not "%~2"=="" set DISPATCHERS=%~2
 
 echo ==========================================
 echo   Coastal Threat Alert System Startup
@@ -54,8 +63,29 @@ REM Kill any existing process on port 8000
 for /f "tokens=5" %%a in ('netstat -aon ^| findstr :8000 ^| findstr LISTENING') do taskkill /F /PID %%a >nul 2>&1
 
 REM Start backend
-echo Starting Backend API on http://localhost:8000
-start /B cmd /c "uvicorn app.main:app --reload --host 0.0.0.0 --port 8000"
+set MULTI=0
+if %API_WORKERS% gtr 1 set MULTI=1
+if %DISPATCHERS% gtr 0 set MULTI=1
+if %MULTI% equ 1 if "%SECRET_KEY%"=="" (
+    findstr /r /c:"^SECRET_KEY=." .env >nul 2>nul || (
+        for /f %%k in ('python -c "import secrets; print(secrets.token_urlsafe(32))"') do set SECRET_KEY=%%k
+        echo Note: no SECRET_KEY in backend\.env, so this run uses a generated one and logins end when it stops.
+        echo       Set SECRET_KEY in backend\.env to keep them across restarts.
+    )
+)
+if %MULTI% equ 0 (
+    echo Starting Backend API on http://localhost:8000
+    start /B cmd /c "uvicorn app.main:app --reload --host 0.0.0.0 --port 8000"
+) else (
+    set SHARED_STATE=true
+    python -m app.migrations
+    if %DISPATCHERS% gtr 0 (
+        set RUN_DISPATCHER=false
+        for /l %%i in (1,1,%DISPATCHERS%) do start /B cmd /c "python -m app.worker"
+    )
+    echo Starting Backend API on http://localhost:8000 with %API_WORKERS% workers and %DISPATCHERS% dispatchers
+    start /B cmd /c "uvicorn app.main:app --workers %API_WORKERS% --host 0.0.0.0 --port 8000"
+)
 
 REM Wait for backend to start
 echo Waiting for backend to start...
@@ -2,6 +2,23 @@
 
 # Coastal Threat Alert System - Startup Script
 # This script starts both backend and frontend services
+#
+# Usage: ./start.sh [--workers N] [--dispatchers M]
+#   --workers N      run N uvicorn API workers (default 1, with auto-reload)
+#   --dispatchers M  run M separate dispatcher processes that send the notifications
+# Either option switches on SHARED_STATE so the processes share state through the database.
+# The processes must then sign tokens with the same SECRET_KEY; if neither the environment
+# nor backend/.env sets one, a key is generated for this run.
+
+API_WORKERS=1
+DISPATCHERS=0
+while [[ $# -gt 0 ]]; do
+    case "$1" in
+        --workers) API_WORKERS="$2"; shift 2 ;;
+        --dispatchers) DISPATCHERS="$2"; shift 2 ;;
+        *) echo "Unknown option: $1"; echo "Usage: $0 [--workers N] [--dispatchers M]"; exit 1 ;;
+    esac
+done
 
 echo "=========================================="
 echo "  Coastal Threat Alert System Startup"
@@ -88,8 +105,31 @@ fi
 kill_port 8000
 
 # Start backend
-echo -e "${GREEN}Starting Backend API on http://localhost:8000${NC}"
-uvicorn app.main:app --reload --host 0.0.0.0 --port 8000 &
+DISPATCHER_PIDS=""
+if [ "$API_WORKERS" -gt 1 ] || [ "$DISPATCHERS" -gt 0 ]; then
+    # Multi-process mode: migrate once up front instead of racing in every worker
+    export SHARED_STATE=true
+    if [ -z "$SECRET_KEY" ] && ! grep -qE '^SECRET_KEY=.+' .env; then
+        SECRET_KEY=$($PYTHON_CMD -c "import secrets; print(secrets.token_urlsafe(32))")
+        export SECRET_KEY
+        echo -e "${YELLOW}Note: no SECRET_KEY in backend/.env, so this run uses a generated one and logins end when it stops.${NC}"
+        echo -e "${YELLOW}      Set SECRET_KEY in backend/.env to keep them across restarts.${NC}"
+    fi
+    $PYTHON_CMD -m app.migrations
+    if [ "$DISPATCHERS" -gt 0 ]; then
+        export RUN_DISPATCHER=false
+        for i in $(seq 1 "$DISPATCHERS"); do
+            $PYTHON_CMD -m app.worker &
+            DISPATCHER_PIDS="$DISPATCHER_PIDS $!"
+        done
+        echo "Dispatcher PIDs:$DISPATCHER_PIDS"
+    fi
+    echo -e "${GREEN}Starting Backend API on http://localhost:8000 ($API_WORKERS workers, $DISPATCHERS dispatchers)${NC}"
+    uvicorn app.main:app --workers "$API_WORKERS" --host 0.0.0.0 --port 8000 &
+else
+    echo -e "${GREEN}Starting Backend API on http://localhost:8000${NC}"
+    uvicorn app.main:app --reload --host 0.0.0.0 --port 8000 &
+fi
 BACKEND_PID=$!
 echo "Backend PID: $BACKEND_PID"
 
@@ -148,6 +188,7 @@ cleanup() {
     echo ""
     echo -e "${YELLOW}Shutting down services...${NC}"
     kill $BACKEND_PID 2>/dev/null
+    [ -n "$DISPATCHER_PIDS" ] && kill $DISPATCHER_PIDS 2>/dev/null
     kill $FRONTEND_PID 2>/dev/null
     kill_port 8000
     kill_port 3000